@@ -0,0 +1,52 @@
+"""Keyset pagination indexes for conversations and messages
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # updated_at was only set on update; give existing rows a sortable value
+    op.execute("UPDATE conversation SET updated_at = created_at WHERE updated_at IS NULL")
+    with op.batch_alter_table('conversation') as batch_op:
+        batch_op.alter_column(
+            'updated_at',
+            existing_type=sa.DateTime(timezone=True),
+            server_default=sa.text('(CURRENT_TIMESTAMP)'),
+            existing_nullable=True,
+        )
+
+    op.create_index(
+        'ix_conversation_user_id_updated_at_id',
+        'conversation',
+        ['user_id', 'updated_at', 'id'],
+        unique=False,
+    )
+    op.create_index(
+        'ix_message_conversation_id_created_at_id',
+        'message',
+        ['conversation_id', 'created_at', 'id'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_message_conversation_id_created_at_id', table_name='message')
+    op.drop_index('ix_conversation_user_id_updated_at_id', table_name='conversation')
+    with op.batch_alter_table('conversation') as batch_op:
+        batch_op.alter_column(
+            'updated_at',
+            existing_type=sa.DateTime(timezone=True),
+            server_default=None,
+            existing_nullable=True,
+        )
@@ -0,0 +1,66 @@
+"""Indexes for per-user access patterns
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the newest active subscription per user so the partial unique index can be built
+    subscription = sa.table(
+        'subscription',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('is_active', sa.Boolean),
+    )
+    latest_active = (
+        sa.select(sa.func.max(subscription.c.id))
+        .where(subscription.c.is_active == sa.true())
+        .group_by(subscription.c.user_id)
+    )
+    op.execute(
+        subscription.update()
+        .where(subscription.c.is_active == sa.true(), subscription.c.id.not_in(latest_active))
+        .values(is_active=False)
+    )
+
+    op.create_index(
+        'ix_avatar_user_id_provider_provider_id',
+        'avatar',
+        ['user_id', 'provider', 'provider_id'],
+        unique=False,
+    )
+    op.create_index('ix_product_user_id', 'product', ['user_id'], unique=False)
+    op.create_index('ix_conversation_avatar_id', 'conversation', ['avatar_id'], unique=False)
+    op.create_index(
+        'ix_subscription_user_id_created_at',
+        'subscription',
+        ['user_id', 'created_at'],
+        unique=False,
+    )
+    op.create_index(
+        'uq_subscription_user_id_active',
+        'subscription',
+        ['user_id'],
+        unique=True,
+        postgresql_where=sa.text('is_active'),
+        sqlite_where=sa.text('is_active = 1'),
+    )
+
+
+def downgrade():
+    op.drop_index('uq_subscription_user_id_active', table_name='subscription')
+    op.drop_index('ix_subscription_user_id_created_at', table_name='subscription')
+    op.drop_index('ix_conversation_avatar_id', table_name='conversation')
+    op.drop_index('ix_product_user_id', table_name='product')
+    op.drop_index('ix_avatar_user_id_provider_provider_id', table_name='avatar')
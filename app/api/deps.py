@@ -1,28 +1,20 @@
-from typing import Generator
+from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocket, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.security import get_current_user
-from app.db.session import SessionLocal
+from app.core.principal import Principal
+from app.core.security import authenticate_token, get_current_principal, get_current_user
+from app.db.session import get_db
 from app.models.user import User
+from app.services.entitlements import Entitlements, resolve_entitlements
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_db() -> Generator:
-    """
-    Dependency for getting a database session
-    """
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
-
 def get_current_active_user(
     current_user: User = Depends(get_current_user),
 ) -> User:
@@ -43,4 +35,43 @@ def get_current_active_superuser(
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def get_current_entitlements(
+    principal: Principal = Depends(get_current_principal),
+) -> Entitlements:
+    """
+    Dependency for the current user's subscription tier and features.
+    Resolved from the cached principal, once per request.
+    """
+    return resolve_entitlements(principal)
+
+async def authenticate_websocket(
+    websocket: WebSocket, db: AsyncSession, token: Optional[str]
+) -> Optional[Principal]:
+    """
+    Authenticate a WebSocket before accepting it, from `?token=` or a Bearer
+    header. Closes the socket and returns None if that fails.
+    """
+    # Browsers cannot set headers on WebSockets, so the token usually comes as ?token=
+    if not token:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+        return None
+
+    try:
+        principal = await authenticate_token(db, token)
+    except HTTPException as e:
+        code = (
+            status.WS_1013_TRY_AGAIN_LATER
+            if e.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+            else status.WS_1008_POLICY_VIOLATION
+        )
+        await websocket.close(code=code, reason=e.detail)
+        return None
+    if not principal.user["is_active"]:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Inactive user")
+        return None
+    return principal
@@ -3,11 +3,14 @@ from typing import Any
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.core.security import create_access_token, get_password_hash, verify_password
-from app.api.deps import get_db
+from app.core.passwords import password_hasher
+from app.core.principal import invalidate_principal
+from app.core.security import create_access_token
+from app.db.session import get_async_db
 from app.models.user import User
 from app.schemas.token import Token
 from app.schemas.user import UserCreate
@@ -15,14 +18,22 @@ from app.schemas.user import UserCreate
 router = APIRouter()
 
 @router.post("/login", response_model=Token)
-def login_access_token(
-    db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()
+async def login_access_token(
+    db: AsyncSession = Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = (
+        await db.execute(select(User).filter(User.email == form_data.username))
+    ).scalars().first()
+    valid = False
+    if user:
+        # bcrypt runs in the password hashing pool, not on the event loop
+        valid, new_hash = await password_hasher.verify_and_update(
+            form_data.password, user.hashed_password
+        )
+    if not user or not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -32,6 +43,11 @@ def login_access_token(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
+    if new_hash:
+        # The stored hash used a different cost factor; upgrade it transparently
+        user.hashed_password = new_hash
+        await db.commit()
+        invalidate_principal(user.id)
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     return {
         "access_token": create_access_token(
@@ -41,15 +57,17 @@ def login_access_token(
     }
 
 @router.post("/signup", response_model=Token)
-def create_user(
+async def create_user(
     *,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_in: UserCreate,
 ) -> Any:
     """
     Create new user
     """
-    user = db.query(User).filter(User.email == user_in.email).first()
+    user = (
+        await db.execute(select(User).filter(User.email == user_in.email))
+    ).scalars().first()
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -59,7 +77,7 @@ def create_user(
     # Create new user
     db_user = User(
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await password_hasher.hash(user_in.password),
         full_name=user_in.full_name,
         is_active=True,
         is_superuser=False,
@@ -68,8 +86,7 @@ def create_user(
         camera_mode=user_in.camera_mode,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -78,4 +95,4 @@ def create_user(
             db_user.id, expires_delta=access_token_expires
         ),
         "token_type": "bearer",
-    }
\ No newline at end of file
+    }
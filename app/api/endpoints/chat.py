@@ -1,44 +1,76 @@
-from typing import Any, Dict, List, Optional
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, status, WebSocket, WebSocketDisconnect
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_active_user
+from app.api.deps import authenticate_websocket, get_db, get_current_active_user
+from app.api.projections import ProjectionResponse, fieldset, row_dicts, schema_columns
 from app.core.config import settings
+from app.core.pagination import keyset_page
+from app.db.session import get_async_db
 from app.models.user import User
 from app.models.avatar import Avatar
 from app.models.conversation import Conversation, Message
-from app.models.product import Product
 from app.models.subscription import Subscription, SubscriptionType
 from app.schemas.conversation import (
     Conversation as ConversationSchema,
     ConversationCreate,
+    ConversationPage,
     ConversationWithMessages,
     Message as MessageSchema,
     MessageCreate,
+    MessagePage,
 )
+from app.services.chat import (
+    compose_reply,
+    find_mentioned_products,
+    find_mentioned_products_async,
+    stream_reply,
+)
+from app.services.dashboard import invalidate_dashboard
+from app.services.realtime import connection_manager
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/conversations", response_model=List[ConversationSchema])
+# Sort keys for keyset pagination (backed by composite indexes)
+CONVERSATION_KEY = (Conversation.updated_at, Conversation.id)
+MESSAGE_KEY = (Message.created_at, Message.id)
+
+@router.get("/conversations", response_model=ConversationPage)
 def get_conversations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
-    skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    fields: Optional[Tuple[str, ...]] = Depends(fieldset(ConversationSchema)),
 ) -> Any:
     """
-    Get all conversations for the current user.
+    Get the current user's conversations, most recently updated first.
+    Use `next_cursor` as `after` to load older conversations.
+    Pass `fields` (e.g. `id,title,updated_at`) to get only those fields.
     """
-    conversations = (
-        db.query(Conversation)
-        .filter(Conversation.user_id == current_user.id)
-        .order_by(Conversation.updated_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+    # The sort key is selected whatever the fields, for the cursors
+    columns = schema_columns(Conversation, ConversationSchema, fields, tuple(column.key for column in CONVERSATION_KEY))
+    rows, prev_cursor, next_cursor = keyset_page(
+        db.query(*columns).filter(Conversation.user_id == current_user.id),
+        CONVERSATION_KEY,
+        limit=limit,
+        descending=True,
+        before=before,
+        after=after,
     )
-    return conversations
+    return ProjectionResponse({
+        "items": row_dicts(rows, ConversationSchema, fields),
+        "prev_cursor": prev_cursor,
+        "next_cursor": next_cursor,
+    })
 
 @router.post("/conversations", response_model=ConversationSchema)
 def create_conversation(
@@ -74,19 +106,12 @@ def create_conversation(
 
     db.add(conversation)
     db.commit()
+    invalidate_dashboard(current_user.id)
     db.refresh(conversation)
 
     return conversation
 
-@router.get("/conversations/{conversation_id}", response_model=ConversationWithMessages)
-def get_conversation(
-    conversation_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user),
-) -> Any:
-    """
-    Get a specific conversation by ID with all messages.
-    """
+def get_owned_conversation(db: Session, conversation_id: int, user: User) -> Conversation:
     conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
 
     if not conversation:
@@ -96,25 +121,67 @@ def get_conversation(
         )
 
     # Check if user owns this conversation
-    if conversation.user_id != current_user.id:
+    if conversation.user_id != user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions to access this conversation",
         )
 
-    # Get all messages for this conversation
-    messages = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation.id)
-        .order_by(Message.created_at)
-        .all()
+    return conversation
+
+@router.get("/conversations/{conversation_id}", response_model=ConversationWithMessages)
+def get_conversation(
+    conversation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    messages_limit: int = Query(50, ge=1, le=200),
+) -> Any:
+    """
+    Get a specific conversation by ID with its latest messages.
+    Older messages are loaded from the messages endpoint with `messages_cursor` as `before`.
+    """
+    conversation = get_owned_conversation(db, conversation_id, current_user)
+
+    # Only the latest page of messages; long conversations grow without bound
+    messages, prev_cursor, _ = keyset_page(
+        db.query(Message).filter(Message.conversation_id == conversation.id),
+        MESSAGE_KEY,
+        limit=messages_limit,
+        from_end=True,
     )
 
-    # Create response with conversation and messages
-    result = ConversationWithMessages.model_validate(conversation)
-    result.messages = messages
+    # Validate via the base schema so the ORM `messages` relationship is never loaded
+    result = ConversationSchema.model_validate(conversation)
+    return ConversationWithMessages(
+        **result.model_dump(), messages=messages, messages_cursor=prev_cursor
+    )
 
-    return result
+@router.get("/conversations/{conversation_id}/messages", response_model=MessagePage)
+def get_messages(
+    conversation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Any:
+    """
+    Get a page of messages in chronological order.
+    Without a cursor the latest messages are returned; use `prev_cursor` as
+    `before` to scroll back through history and `next_cursor` as `after` to
+    catch up on newer messages.
+    """
+    conversation = get_owned_conversation(db, conversation_id, current_user)
+
+    messages, prev_cursor, next_cursor = keyset_page(
+        db.query(Message).filter(Message.conversation_id == conversation.id),
+        MESSAGE_KEY,
+        limit=limit,
+        before=before,
+        after=after,
+        from_end=True,
+    )
+    return {"items": messages, "prev_cursor": prev_cursor, "next_cursor": next_cursor}
 
 @router.post("/conversations/{conversation_id}/messages", response_model=MessageSchema)
 def create_message(
@@ -125,76 +192,62 @@ def create_message(
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Add a new message to a conversation.
+    Add a new message to a conversation and get the avatar's reply.
     """
-    # Check if conversation exists and belongs to the user
-    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-
-    if not conversation:
+    # Conversation and its avatar in one query
+    row = db.execute(
+        select(Conversation, Avatar)
+        .outerjoin(Avatar, Avatar.id == Conversation.avatar_id)
+        .where(Conversation.id == conversation_id)
+    ).first()
+
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found",
         )
 
+    conversation, avatar = row
     if conversation.user_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions to access this conversation",
         )
 
-    # Create user message
-    user_message = Message(
-        content=message_in.content,
-        is_user=True,
-        conversation_id=conversation.id,
-    )
-
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
-
-    # Get the avatar for this conversation
-    avatar = db.query(Avatar).filter(Avatar.id == conversation.avatar_id).first()
-
     # In a real implementation, we would call the appropriate API (AKOOL or Soul Machines)
     # to generate a response from the avatar. For this example, we'll create a mock response.
 
     # Check if any products are mentioned in the message
-    products = db.query(Product).filter(Product.user_id == current_user.id).all()
-    mentioned_product = None
-
-    for product in products:
-        if product.name.lower() in message_in.content.lower():
-            mentioned_product = product
-            break
+    mentioned_products, _ = find_mentioned_products(db, current_user.id, message_in.content)
 
     # Generate avatar response
-    response_content = f"I received your message: '{message_in.content}'. "
-
-    if mentioned_product:
-        response_content += f"I see you mentioned {mentioned_product.name}. "
-        if mentioned_product.description:
-            response_content += f"Here's some information about it: {mentioned_product.description}"
-    else:
-        response_content += "How can I assist you further?"
-
-    # Create avatar response message
-    avatar_message = Message(
-        content=response_content,
-        is_user=False,
-        conversation_id=conversation.id,
-    )
-
-    db.add(avatar_message)
+    response_content = compose_reply(message_in.content, mentioned_products)
+
+    # Both messages in one multi-row INSERT ... RETURNING. Their timestamps tie,
+    # so the ids (assigned in row order) keep the user's message first.
+    inserted = db.scalars(
+        insert(Message).returning(Message),
+        [
+            {"content": message_in.content, "is_user": True, "conversation_id": conversation.id},
+            {"content": response_content, "is_user": False, "conversation_id": conversation.id},
+        ],
+    ).all()
+    avatar_message = next(message for message in inserted if not message.is_user)
 
     # Update conversation's updated_at timestamp
-    conversation.updated_at = db.func.now()
-    db.add(conversation)
+    db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation.id)
+        .values(updated_at=func.now()),
+        execution_options={"synchronize_session": False},
+    )
 
+    # Serialize before committing; the commit expires the ORM objects
+    result = MessageSchema.model_validate(avatar_message)
     db.commit()
-    db.refresh(avatar_message)
+    invalidate_dashboard(current_user.id)
 
-    return avatar_message
+    return result
 
 @router.delete("/conversations/{conversation_id}", response_model=Dict[str, Any])
 def delete_conversation(
@@ -226,36 +279,141 @@ def delete_conversation(
     # Delete the conversation
     db.delete(conversation)
     db.commit()
+    invalidate_dashboard(current_user.id)
 
     return {"success": True, "message": "Conversation deleted successfully"}
 
-# WebSocket endpoint for real-time chat
-# Note: This is a simplified implementation. In a real application,
-# you would need to handle authentication, manage connections, etc.
+async def authorize_websocket(
+    websocket: WebSocket, db: AsyncSession, conversation_id: int, token: Optional[str]
+) -> Optional[Tuple[Conversation, Avatar]]:
+    """
+    Authenticate the socket and check it may use the conversation.
+    Closes the socket and returns None otherwise.
+    """
+    principal = await authenticate_websocket(websocket, db, token)
+    if principal is None:
+        return None
+
+    row = (
+        await db.execute(
+            select(Conversation, Avatar)
+            .join(Avatar, Avatar.id == Conversation.avatar_id)
+            .where(Conversation.id == conversation_id)
+        )
+    ).first()
+    if row is None or row.Conversation.user_id != principal.user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Conversation not found")
+        return None
+    return row.Conversation, row.Avatar
+
+def parse_client_frame(data: str) -> Dict[str, Any]:
+    # Clients send {"content": "..."} or {"type": "pong"}; plain text is taken as the content
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        return {"type": "message", "content": data.strip()}
+    return {
+        "type": payload.get("type") or "message",
+        "content": str(payload.get("content") or "").strip(),
+    }
+
+def message_frame(frame_type: str, message: Message) -> Dict[str, Any]:
+    return {"type": frame_type, "message": MessageSchema.model_validate(message).model_dump(mode="json")}
+
 @router.websocket("/ws/{conversation_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     conversation_id: int,
-    db: Session = Depends(get_db),
+    token: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
 ):
-    await websocket.accept()
-    try:
-        while True:
-            # Receive message from client
-            data = await websocket.receive_text()
+    """
+    Chat with the conversation's avatar, streaming its replies.
 
-            # In a real implementation, you would:
-            # 1. Verify the user has access to this conversation
-            # 2. Save the message to the database
-            # 3. Process the message (e.g., send to AKOOL or Soul Machines API)
-            # 4. Generate and save the response
-            # 5. Send the response back to the client
+    Authenticate with `?token=<access token>` (or a Bearer Authorization header).
+    Send `{"content": "..."}` for each message. Every socket open on the
+    conversation, on any worker, receives:
 
-            # For this example, we'll just echo the message back
-            await websocket.send_text(f"You said: {data}")
+    - `{"type": "message", "message": {...}}` once a user message is stored
+    - `{"type": "chunk", "content": "..."}` for each piece of the reply as it is generated
+    - `{"type": "done", "message": {...}, "mentions": [...]}` with the stored avatar
+      message and the products mentioned in the user's message (id, name, offsets)
 
-            # Send a mock avatar response
-            await websocket.send_text(f"Avatar response: I received your message '{data}'")
+    The sender gets `{"type": "error", "detail": "..."}` if its message failed.
+    The server sends `{"type": "ping"}` periodically; reply with `{"type": "pong"}`
+    (or any frame) or the socket is closed as idle.
+    """
+    authorized = await authorize_websocket(websocket, db, conversation_id, token)
+    if authorized is None:
+        return
+    conversation, avatar = authorized
+    connection = await connection_manager.connect(
+        websocket, user_id=conversation.user_id, conversation_id=conversation.id
+    )
+    # Provider conversation state, kept for the lifetime of the socket
+    session: Dict[Any, Any] = {}
+
+    try:
+        while True:
+            frame = parse_client_frame(await websocket.receive_text())
+            connection.touch()
+            if frame["type"] == "pong":
+                continue
+            content = frame["content"]
+            if frame["type"] != "message" or not content:
+                connection.send({"type": "error", "detail": "Message content is required"})
+                continue
+
+            # Store the user's message before replying so it survives a dropped connection
+            user_message = await db.scalar(
+                insert(Message)
+                .values(content=content, is_user=True, conversation_id=conversation.id)
+                .returning(Message)
+            )
+            await db.commit()
+            await connection_manager.send_to_conversation(
+                conversation.id, message_frame("message", user_message)
+            )
+
+            try:
+                mentioned_products, mentions = await find_mentioned_products_async(
+                    db, conversation.user_id, content
+                )
+                # Return the connection to the pool while the reply may wait on a provider
+                await db.commit()
+
+                chunks = []
+                async for chunk in stream_reply(avatar, content, mentioned_products, session):
+                    chunks.append(chunk)
+                    await connection_manager.send_to_conversation(
+                        conversation.id, {"type": "chunk", "content": chunk}
+                    )
+
+                # The complete reply is stored once, together with the conversation's new timestamp
+                avatar_message = await db.scalar(
+                    insert(Message)
+                    .values(content="".join(chunks), is_user=False, conversation_id=conversation.id)
+                    .returning(Message)
+                )
+                await db.execute(
+                    update(Conversation)
+                    .where(Conversation.id == conversation.id)
+                    .values(updated_at=func.now())
+                )
+                await db.commit()
+                invalidate_dashboard(conversation.user_id)
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Avatar reply failed in conversation {conversation.id}: {str(e)}")
+                connection.send({"type": "error", "detail": "The avatar could not reply, please try again"})
+                continue
+
+            done = message_frame("done", avatar_message)
+            done["mentions"] = [mention._asdict() for mention in mentions]
+            await connection_manager.send_to_conversation(conversation.id, done)
     except WebSocketDisconnect:
-        # Handle disconnect
         pass
+    finally:
+        await connection_manager.disconnect(connection)
@@ -1,16 +1,13 @@
-from typing import Any, Dict, List
+from typing import Any, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_active_user
+from app.api.deps import get_db, get_current_active_user, get_current_entitlements
+from app.core.principal import invalidate_principal
 from app.models.user import User
-from app.models.avatar import Avatar
-from app.models.subscription import Subscription, SubscriptionType
-from app.models.conversation import Conversation
-from app.schemas.avatar import Avatar as AvatarSchema
-from app.schemas.subscription import Subscription as SubscriptionSchema
-from app.schemas.conversation import Conversation as ConversationSchema
+from app.services.dashboard import load_dashboard
+from app.services.entitlements import Entitlements
 
 router = APIRouter()
 
@@ -18,49 +15,26 @@ router = APIRouter()
 def get_dashboard(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    entitlements: Entitlements = Depends(get_current_entitlements),
 ) -> Any:
     """
     Get dashboard data for the current user.
+    Avatars are summaries without their settings; load one from the studio for those.
     """
-    # Get user's avatars
-    avatars = db.query(Avatar).filter(Avatar.user_id == current_user.id).all()
-    
-    # Get user's active subscription
-    subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
-    
-    # Get user's recent conversations
-    recent_conversations = (
-        db.query(Conversation)
-        .filter(Conversation.user_id == current_user.id)
-        .order_by(Conversation.updated_at.desc())
-        .limit(5)
-        .all()
-    )
-    
-    # Determine available features based on subscription
-    available_features = {
-        "avatar_creation": True,  # Basic feature available to all
-        "avatar_customization": True,  # Basic feature available to all
-        "video_recording": subscription is not None,  # Requires any subscription
-        "live_interaction": subscription is not None and subscription.type == SubscriptionType.PREMIUM,  # Requires premium
-        "object_recognition": subscription is not None and subscription.type == SubscriptionType.PREMIUM,  # Requires premium
-        "memory": subscription is not None and subscription.type == SubscriptionType.PREMIUM,  # Requires premium
-    }
-    
+    # Avatar cards and recent conversations, cached per user
+    dashboard = load_dashboard(db, current_user.id)
+
     return {
         "user_preferences": {
             "language": current_user.language,
             "ui_theme": current_user.ui_theme,
             "camera_mode": current_user.camera_mode,
         },
-        "avatars": avatars,
-        "subscription": subscription,
-        "recent_conversations": recent_conversations,
-        "available_features": available_features,
+        "avatars": dashboard["avatars"],
+        # Active subscription and features come from the cached entitlements
+        "subscription": entitlements.subscription,
+        "recent_conversations": dashboard["recent_conversations"],
+        "available_features": entitlements.features,
     }
 
 @router.put("/preferences", response_model=Dict[str, Any])
@@ -91,6 +65,7 @@ def update_preferences(
         user.camera_mode = preferences["camera_mode"]
     
     db.commit()
+    invalidate_principal(user.id)
     db.refresh(user)
     
     return {
@@ -1,123 +1,62 @@
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_active_user
+from app.api.deps import get_db, get_current_active_user, get_current_entitlements
 from app.core.config import settings
 from app.models.user import User
 from app.models.avatar import Avatar
-from app.models.subscription import Subscription, SubscriptionType
 from app.schemas.avatar import Avatar as AvatarSchema, AvatarCreate
+from app.services.dashboard import invalidate_dashboard
+from app.services.entitlements import Entitlements
+from app.services.gallery import CatalogEntry, gallery_catalog
 
 router = APIRouter()
 
-# Mock data for pre-designed avatars (in a real app, this would come from AKOOL API)
-PREDESIGNED_AVATARS = [
-    {
-        "id": 1001,
-        "name": "Business Professional",
-        "description": "A professional avatar for business presentations and meetings.",
-        "image_url": "https://example.com/avatars/business.jpg",
-        "provider": "AKOOL",
-        "provider_id": "akool-001",
-        "is_predesigned": True,
-        "is_public": True,
-    },
-    {
-        "id": 1002,
-        "name": "Friendly Assistant",
-        "description": "A warm and friendly avatar for customer service.",
-        "image_url": "https://example.com/avatars/assistant.jpg",
-        "provider": "AKOOL",
-        "provider_id": "akool-002",
-        "is_predesigned": True,
-        "is_public": True,
-    },
-    {
-        "id": 1003,
-        "name": "Tech Expert",
-        "description": "A tech-savvy avatar for explaining complex concepts.",
-        "image_url": "https://example.com/avatars/tech.jpg",
-        "provider": "AKOOL",
-        "provider_id": "akool-003",
-        "is_predesigned": True,
-        "is_public": True,
-    },
-    {
-        "id": 1004,
-        "name": "Medical Professional",
-        "description": "A medical avatar for health-related content.",
-        "image_url": "https://example.com/avatars/medical.jpg",
-        "provider": "SOUL_MACHINES",
-        "provider_id": "sm-001",
-        "is_predesigned": True,
-        "is_public": True,
-    },
-    {
-        "id": 1005,
-        "name": "Educational Tutor",
-        "description": "An educational avatar for teaching and tutoring.",
-        "image_url": "https://example.com/avatars/education.jpg",
-        "provider": "SOUL_MACHINES",
-        "provider_id": "sm-002",
-        "is_predesigned": True,
-        "is_public": True,
-    },
-]
+
+def catalog_response(request: Request, entry: CatalogEntry) -> Response:
+    """
+    Serve a precomputed catalog entry, or 304 when the client's copy is current
+    """
+    headers = {
+        "ETag": entry.etag,
+        # The lists depend on the subscription tier, so only the user's own cache may keep them
+        "Cache-Control": f"private, max-age={settings.GALLERY_CACHE_MAX_AGE}",
+        "Vary": "Authorization",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if entry.etag in etags or "*" in etags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 @router.get("/", response_model=List[Dict[str, Any]])
 def get_gallery_avatars(
-    db: Session = Depends(get_db),
+    request: Request,
     current_user: User = Depends(get_current_active_user),
+    entitlements: Entitlements = Depends(get_current_entitlements),
     provider: Optional[str] = None,
 ) -> Any:
     """
     Get all available avatars for the gallery.
     Optionally filter by provider (AKOOL or SOUL_MACHINES).
+    Soul Machines avatars are only listed for premium subscribers. Responses
+    carry an ETag; send it back as If-None-Match to get 304 Not Modified.
     """
-    # Get user's active subscription to determine available avatars
-    subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
-    
-    # Filter avatars based on subscription
-    avatars = []
-    for avatar in PREDESIGNED_AVATARS:
-        # If provider filter is specified, apply it
-        if provider and avatar["provider"] != provider:
-            continue
-            
-        # If Soul Machines avatar, check for premium subscription
-        if avatar["provider"] == "SOUL_MACHINES":
-            if subscription and subscription.type == SubscriptionType.PREMIUM:
-                avatars.append(avatar)
-        else:
-            # AKOOL avatars available to all
-            avatars.append(avatar)
-    
-    return avatars
+    return catalog_response(request, gallery_catalog.list_entry(entitlements, provider))
 
 @router.get("/{avatar_id}", response_model=Dict[str, Any])
 def get_gallery_avatar(
+    request: Request,
     avatar_id: int,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    entitlements: Entitlements = Depends(get_current_entitlements),
 ) -> Any:
     """
     Get a specific pre-designed avatar by ID.
     """
-    # Get user's active subscription to determine available avatars
-    subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
-    
-    # Find the avatar in the pre-designed list
-    avatar = next((a for a in PREDESIGNED_AVATARS if a["id"] == avatar_id), None)
+    avatar = gallery_catalog.get(avatar_id)
     
     if not avatar:
         raise HTTPException(
@@ -126,13 +65,13 @@ def get_gallery_avatar(
         )
     
     # Check if user has access to this avatar
-    if avatar["provider"] == "SOUL_MACHINES" and (not subscription or subscription.type != SubscriptionType.PREMIUM):
+    if not entitlements.can_access_provider(avatar["provider"]):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Premium subscription required for this avatar",
         )
     
-    return avatar
+    return catalog_response(request, gallery_catalog.entry(avatar_id))
 
 @router.post("/select", response_model=AvatarSchema)
 def select_gallery_avatar(
@@ -140,19 +79,12 @@ def select_gallery_avatar(
     db: Session = Depends(get_db),
     avatar_id: int,
     current_user: User = Depends(get_current_active_user),
+    entitlements: Entitlements = Depends(get_current_entitlements),
 ) -> Any:
     """
     Select a pre-designed avatar from the gallery and add it to the user's avatars.
     """
-    # Get user's active subscription to determine available avatars
-    subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
-    
-    # Find the avatar in the pre-designed list
-    predesigned_avatar = next((a for a in PREDESIGNED_AVATARS if a["id"] == avatar_id), None)
+    predesigned_avatar = gallery_catalog.get(avatar_id)
     
     if not predesigned_avatar:
         raise HTTPException(
@@ -161,7 +93,7 @@ def select_gallery_avatar(
         )
     
     # Check if user has access to this avatar
-    if predesigned_avatar["provider"] == "SOUL_MACHINES" and (not subscription or subscription.type != SubscriptionType.PREMIUM):
+    if not entitlements.can_access_provider(predesigned_avatar["provider"]):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Premium subscription required for this avatar",
@@ -195,6 +127,7 @@ def select_gallery_avatar(
     
     db.add(new_avatar)
     db.commit()
+    invalidate_dashboard(current_user.id)
     db.refresh(new_avatar)
     
     return new_avatar
\ No newline at end of file
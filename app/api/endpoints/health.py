@@ -2,12 +2,20 @@ from typing import Any, Dict
 import time
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError, DBAPIError, DisconnectionError
 from sqlalchemy import text
 
 from app.api.deps import get_db
-from app.db.session import engine
+from app.core.passwords import password_hasher
+from app.db.session import engine, db_breaker, get_async_db, validation_mode
+from app.services.catalog import catalog_store
+from app.services.gallery import gallery_catalog
+from app.services.images import image_renderer
+from app.services.jobs import queue_stats
+from app.services.providers import provider_stats
+from app.services.realtime import connection_manager
 
 router = APIRouter()
 
@@ -83,6 +91,8 @@ def db_connection_stats() -> Any:
             stats = {
                 "engine_type": "SQLite",
                 "connection_pool": "Not applicable for SQLite",
+                "connection_validation": validation_mode,
+                "circuit_breaker": db_breaker.snapshot(),
                 "status": "ok",
             }
         else:
@@ -93,6 +103,8 @@ def db_connection_stats() -> Any:
                 "checkedin": engine.pool.checkedin(),
                 "checkedout": engine.pool.checkedout(),
                 "overflow": engine.pool.overflow(),
+                "connection_validation": validation_mode,
+                "circuit_breaker": db_breaker.snapshot(),
                 "status": "ok",
             }
         return stats
@@ -101,3 +113,65 @@ def db_connection_stats() -> Any:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get connection stats: {str(e)}"
         )
+
+@router.get("/db/circuit", response_model=Dict[str, Any])
+def db_circuit_state() -> Any:
+    """
+    Get the database circuit breaker state (closed, open or half_open).
+    Does not touch the database, so it stays cheap while the circuit is open.
+    """
+    return db_breaker.snapshot()
+
+@router.get("/passwords", response_model=Dict[str, Any])
+def password_hasher_stats() -> Any:
+    """
+    Get password hashing pool statistics (queue depth, rejections, bcrypt latency).
+    """
+    return password_hasher.metrics()
+
+@router.get("/realtime", response_model=Dict[str, Any])
+def realtime_stats() -> Any:
+    """
+    Get WebSocket statistics for this worker (open sockets, queued frames, evictions).
+    """
+    return connection_manager.stats()
+
+
+@router.get("/providers", response_model=Dict[str, Any])
+def avatar_provider_stats() -> Any:
+    """
+    Get avatar provider client statistics for this worker (in-flight requests,
+    retries, coalesced GETs, circuit breaker state). Does not call the providers.
+    """
+    return provider_stats()
+
+
+@router.get("/jobs", response_model=Dict[str, Any])
+async def job_queue_stats(db: AsyncSession = Depends(get_async_db)) -> Any:
+    """
+    Get background job counts per status and how long the oldest due job has waited.
+    """
+    return await queue_stats(db)
+
+
+@router.get("/images", response_model=Dict[str, Any])
+def image_variant_stats() -> Any:
+    """
+    Get image variant rendering statistics for this worker (formats, renders in progress, failures).
+    """
+    return image_renderer.metrics()
+
+
+@router.get("/catalog", response_model=Dict[str, Any])
+def catalog_stats() -> Any:
+    """
+    Get the version of the catalog file in use and how often it was reloaded.
+    """
+    return catalog_store.stats()
+
+@router.get("/gallery", response_model=Dict[str, Any])
+def gallery_catalog_stats() -> Any:
+    """
+    Get the gallery catalog's size and when it was last refreshed from AKOOL.
+    """
+    return gallery_catalog.stats()
@@ -0,0 +1,102 @@
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import authenticate_websocket, get_current_active_user
+from app.db.session import get_async_db
+from app.models.job import Job
+from app.models.user import User
+from app.schemas.job import Job as JobSchema
+from app.services.jobs import requeue_job
+from app.services.realtime import connection_manager
+
+router = APIRouter()
+
+async def get_own_job(db: AsyncSession, job_id: int, user_id: int) -> Job:
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found",
+        )
+    if job.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions to access this job",
+        )
+    return job
+
+@router.get("/", response_model=List[JobSchema])
+async def get_jobs(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+    limit: int = Query(20, ge=1, le=100),
+) -> Any:
+    """
+    Get the current user's most recent jobs.
+    """
+    jobs = await db.scalars(
+        select(Job)
+        .where(Job.user_id == current_user.id)
+        .order_by(Job.created_at.desc(), Job.id.desc())
+        .limit(limit)
+    )
+    return jobs.all()
+
+@router.get("/{job_id}", response_model=JobSchema)
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Get a job's status, and its result once it has succeeded.
+    """
+    return await get_own_job(db, job_id, current_user.id)
+
+@router.post("/{job_id}/retry", response_model=JobSchema)
+async def retry_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Queue a dead job again with a fresh set of attempts.
+    """
+    await get_own_job(db, job_id, current_user.id)
+    job = await requeue_job(db, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Only failed jobs can be retried",
+        )
+    return job
+
+@router.websocket("/ws")
+async def job_updates(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Receive `{"type": "job", "job": {...}}` when one of the user's jobs succeeds
+    or is dead-lettered. Authenticate with `?token=<access token>`. Answer the
+    server's `{"type": "ping"}` frames with `{"type": "pong"}`.
+    """
+    principal = await authenticate_websocket(websocket, db, token)
+    if principal is None:
+        return
+    # Nothing else is read from the database while the socket is open
+    await db.close()
+
+    connection = await connection_manager.connect(websocket, user_id=principal.user_id)
+    try:
+        while True:
+            await websocket.receive_text()
+            connection.touch()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await connection_manager.disconnect(connection)
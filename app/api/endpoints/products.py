@@ -1,9 +1,10 @@
-from typing import Any, Dict, List
-import os
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_db, get_current_active_user
+from app.api.projections import ProjectionResponse, fieldset, row_dicts, schema_columns
+from app.api.uploads import receive_upload, upload_request_body
 from app.core.config import settings
 from app.models.user import User
 from app.models.product import Product
@@ -12,6 +13,8 @@ from app.schemas.product import (
     ProductCreate,
     ProductUpdate,
 )
+from app.services.images import image_renderer, image_variants
+from app.services.product_matcher import product_deleted, product_saved
 
 router = APIRouter()
 
@@ -21,18 +24,20 @@ def get_products(
     current_user: User = Depends(get_current_active_user),
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[Tuple[str, ...]] = Depends(fieldset(ProductSchema)),
 ) -> Any:
     """
     Get all products for the current user.
+    Pass `fields` (e.g. `id,name,price,image_variants`) to get only those fields.
     """
-    products = (
-        db.query(Product)
+    rows = (
+        db.query(*schema_columns(Product, ProductSchema, fields))
         .filter(Product.user_id == current_user.id)
         .offset(skip)
         .limit(limit)
         .all()
     )
-    return products
+    return ProjectionResponse(row_dicts(rows, ProductSchema, fields))
 
 @router.post("/", response_model=ProductSchema)
 def create_product(
@@ -55,6 +60,7 @@ def create_product(
     db.add(product)
     db.commit()
     db.refresh(product)
+    product_saved(product)
     
     return product
 
@@ -111,6 +117,7 @@ def update_product(
         )
     
     # Update product attributes
+    renamed = product_in.name is not None and product_in.name != product.name
     if product_in.name is not None:
         product.name = product_in.name
     
@@ -126,6 +133,8 @@ def update_product(
     db.add(product)
     db.commit()
     db.refresh(product)
+    if renamed:
+        product_saved(product)
     
     return product
 
@@ -155,30 +164,34 @@ def delete_product(
     
     db.delete(product)
     db.commit()
+    product_deleted(current_user.id, product_id)
     
     return {"success": True, "message": "Product deleted successfully"}
 
-@router.post("/upload-image", response_model=Dict[str, Any])
+@router.post(
+    "/upload-image",
+    response_model=Dict[str, Any],
+    openapi_extra=upload_request_body(),
+)
 async def upload_product_image(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    request: Request,
     current_user: User = Depends(get_current_active_user),
 ) -> Any:
     """
-    Upload a product image.
-    In a real implementation, this would save the file to a storage service.
+    Upload a product image (multipart field `file`, JPEG, PNG, GIF or WebP).
+    Set the returned `image_url` on the product. Uploading the same image
+    again returns the same URL without storing it twice. Resized WebP
+    variants are listed in `image_variants`.
     """
-    # In a real implementation, we would:
-    # 1. Validate the file (type, size, etc.)
-    # 2. Save the file to a storage service (e.g., AWS S3)
-    # 3. Return the URL of the saved file
-    
-    # For this example, we'll just return a mock URL
-    file_extension = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
-    mock_url = f"https://example.com/products/{current_user.id}_{file.filename}"
-    
+    upload = await receive_upload(request, settings.MEDIA_MAX_IMAGE_SIZE)
+    image_renderer.schedule(upload.file.key)
+
     return {
         "success": True,
         "message": "Image uploaded successfully",
-        "image_url": mock_url,
-    }
\ No newline at end of file
+        "image_url": upload.file.url,
+        "image_variants": image_variants(upload.file.url),
+        "sha256": upload.file.sha256,
+        "size": upload.file.size,
+        "content_type": upload.file.content_type,
+    }
@@ -1,16 +1,25 @@
-from typing import Any, Dict, List, Optional
-import time
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Header
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError, DBAPIError, DisconnectionError
 
-from app.api.deps import get_db, get_current_active_user
+from app.api.deps import get_db, get_current_active_user, get_current_entitlements
+from app.api.projections import ProjectionResponse, fieldset, row_dicts, schema_columns
+from app.api.uploads import receive_upload, upload_request_body
 from app.core.config import settings
+from app.core.retry import CircuitOpenError
+from app.db.session import db_retry_policy, get_async_db
 from app.models.user import User
 from app.models.avatar import Avatar
-from app.models.subscription import Subscription, SubscriptionType
 from app.schemas.avatar import Avatar as AvatarSchema, AvatarCreate, AvatarUpdate
+from app.schemas.job import Job as JobSchema
+from app.services.avatar_creation import AVATAR_FROM_PHOTO, count_avatars
+from app.services.dashboard import invalidate_dashboard
+from app.services.entitlements import Entitlements
+from app.services.images import image_renderer
+from app.services.jobs import enqueue, find_by_idempotency_key
 
 router = APIRouter()
 
@@ -20,18 +29,20 @@ def get_user_avatars(
     current_user: User = Depends(get_current_active_user),
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[Tuple[str, ...]] = Depends(fieldset(AvatarSchema)),
 ) -> Any:
     """
     Get all avatars created by the current user.
+    Pass `fields` (e.g. `id,name,image_variants`) to get only those fields.
     """
-    avatars = (
-        db.query(Avatar)
+    rows = (
+        db.query(*schema_columns(Avatar, AvatarSchema, fields))
         .filter(Avatar.user_id == current_user.id)
         .offset(skip)
         .limit(limit)
         .all()
     )
-    return avatars
+    return ProjectionResponse(row_dicts(rows, AvatarSchema, fields))
 
 @router.post("/avatars", response_model=AvatarSchema)
 def create_avatar(
@@ -39,6 +50,7 @@ def create_avatar(
     db: Session = Depends(get_db),
     avatar_in: AvatarCreate,
     current_user: User = Depends(get_current_active_user),
+    entitlements: Entitlements = Depends(get_current_entitlements),
 ) -> Any:
     """
     Create a new custom avatar.
@@ -47,18 +59,8 @@ def create_avatar(
         # Check if user has reached their avatar limit
         avatar_count = db.query(Avatar).filter(Avatar.user_id == current_user.id).count()
         
-        # Get user's subscription to determine limits
-        subscription = (
-            db.query(Subscription)
-            .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-            .first()
-        )
-        
-        # Set limits based on subscription
-        if subscription and subscription.type == SubscriptionType.PREMIUM:
-            max_avatars = 10  # Premium users can have more avatars
-        else:
-            max_avatars = 3  # Basic users have limited avatars
+        # Limits depend on the subscription tier (premium users can have more avatars)
+        max_avatars = entitlements.max_avatars
         
         if avatar_count >= max_avatars:
             raise HTTPException(
@@ -81,26 +83,22 @@ def create_avatar(
             user_id=current_user.id,
         )
         
-        max_retries = 3
-        retry_delay = 1  # seconds
-        
-        for attempt in range(max_retries):
-            try:
-                db.add(avatar)
-                db.commit()
-                db.refresh(avatar)
-                return avatar
-            except (OperationalError, DBAPIError, DisconnectionError) as e:
-                if attempt < max_retries - 1:
-                    db.rollback()  # Important: rollback the transaction
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    # If all retries fail, raise a user-friendly error
-                    raise HTTPException(
-                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                        detail="Database connection error, please try again",
-                    ) from e
+        def save_avatar() -> None:
+            db.add(avatar)
+            db.commit()
+
+        try:
+            # Roll back between attempts so the session is usable again
+            db_retry_policy.call(save_avatar, on_retry=lambda e: db.rollback())
+        except (CircuitOpenError, OperationalError, DBAPIError, DisconnectionError) as e:
+            # If all retries fail, raise a user-friendly error
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database connection error, please try again",
+            ) from e
+        invalidate_dashboard(current_user.id)
+        db.refresh(avatar)
+        return avatar
     except Exception as e:
         # Catch any other unexpected errors
         db.rollback()
@@ -187,6 +185,7 @@ def update_avatar(
     
     db.add(avatar)
     db.commit()
+    invalidate_dashboard(current_user.id)
     db.refresh(avatar)
     
     return avatar
@@ -217,40 +216,74 @@ def delete_avatar(
     
     db.delete(avatar)
     db.commit()
+    invalidate_dashboard(current_user.id)
     
     return {"success": True, "message": "Avatar deleted successfully"}
 
-@router.post("/upload-photo", response_model=Dict[str, Any])
+@router.post(
+    "/upload-photo",
+    response_model=Dict[str, Any],
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra=upload_request_body(name="Name of the new avatar"),
+)
 async def upload_photo_for_avatar(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=200),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_active_user),
+    entitlements: Entitlements = Depends(get_current_entitlements),
 ) -> Any:
     """
-    Upload a photo to create a custom avatar.
-    In a real implementation, this would integrate with AKOOL API to create a custom avatar.
+    Upload a photo (multipart field `file`, JPEG, PNG, GIF or WebP) to create a
+    custom avatar.
+    The avatar is created by a background job: poll `GET /api/jobs/{job["id"]}`,
+    or listen on `/api/jobs/ws` for a `{"type": "job"}` frame when it finishes.
+    Repeating the request with the same `Idempotency-Key` header returns the
+    original job instead of creating another avatar.
     """
     # Check if user has an active subscription
-    subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
-    
-    if not subscription:
+    if not entitlements.has_subscription:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Subscription required to create custom avatars from photos",
         )
-    
-    # In a real implementation, we would:
-    # 1. Save the uploaded file
-    # 2. Call the AKOOL API to create a custom avatar
-    # 3. Store the avatar details in the database
-    
-    # For this example, we'll just return a mock response
+
+    if idempotency_key:
+        job = await find_by_idempotency_key(db, current_user.id, idempotency_key)
+        if job is not None:
+            return {
+                "success": True,
+                "message": "Photo already uploaded. Avatar creation in progress.",
+                "job": JobSchema.model_validate(job),
+            }
+
+    max_avatars = entitlements.max_avatars
+    if await count_avatars(db, current_user.id) >= max_avatars:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"You have reached your limit of {max_avatars} avatars. Upgrade your subscription to create more.",
+        )
+    # Release the connection while the photo is received
+    await db.commit()
+
+    upload = await receive_upload(request, settings.MEDIA_MAX_IMAGE_SIZE)
+    image_renderer.schedule(upload.file.key)
+    job, _ = await enqueue(
+        db,
+        current_user.id,
+        AVATAR_FROM_PHOTO,
+        {
+            "photo_key": upload.file.key,
+            "filename": upload.filename or upload.file.key.rsplit("/", 1)[-1],
+            "content_type": upload.file.content_type,
+            "name": upload.form.get("name") or "My Avatar",
+            "max_avatars": max_avatars,
+        },
+        idempotency_key=idempotency_key,
+    )
+
     return {
         "success": True,
         "message": "Photo uploaded successfully. Avatar creation in progress.",
-        "estimated_time": "5 minutes",
-    }
\ No newline at end of file
+        "job": JobSchema.model_validate(job),
+    }
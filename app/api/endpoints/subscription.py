@@ -2,81 +2,24 @@ from typing import Any, Dict, List
 from datetime import datetime, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_db, get_current_active_user
+from app.api.deps import get_db, get_current_active_user, get_current_entitlements
+from app.api.projections import ProjectionResponse, row_dicts, schema_columns
+from app.core.principal import invalidate_principal
 from app.models.user import User
-from app.models.subscription import Subscription, SubscriptionType
+from app.models.subscription import Subscription
 from app.schemas.subscription import (
     Subscription as SubscriptionSchema,
     SubscriptionCreate,
     SubscriptionUpdate,
 )
+from app.services.catalog import catalog_store
+from app.services.entitlements import Entitlements, is_expired
 
 router = APIRouter()
 
-# Mock subscription plans
-SUBSCRIPTION_PLANS = [
-    {
-        "id": 1,
-        "name": "Basic Plan",
-        "type": SubscriptionType.BASIC,
-        "price": 9.99,
-        "billing_period": 1,  # monthly
-        "features": [
-            "Access to AKOOL avatars",
-            "Video recording with avatars",
-            "Basic customization options",
-            "Up to 3 custom avatars",
-        ],
-    },
-    {
-        "id": 2,
-        "name": "Premium Plan",
-        "type": SubscriptionType.PREMIUM,
-        "price": 29.99,
-        "billing_period": 1,  # monthly
-        "features": [
-            "Access to all avatars (AKOOL and Soul Machines)",
-            "Live interaction with avatars",
-            "Advanced customization options",
-            "Object recognition and memory features",
-            "Up to 10 custom avatars",
-            "Priority support",
-        ],
-    },
-    {
-        "id": 3,
-        "name": "Basic Annual Plan",
-        "type": SubscriptionType.BASIC,
-        "price": 99.99,
-        "billing_period": 12,  # annual
-        "features": [
-            "Access to AKOOL avatars",
-            "Video recording with avatars",
-            "Basic customization options",
-            "Up to 3 custom avatars",
-            "Save 16% compared to monthly",
-        ],
-    },
-    {
-        "id": 4,
-        "name": "Premium Annual Plan",
-        "type": SubscriptionType.PREMIUM,
-        "price": 299.99,
-        "billing_period": 12,  # annual
-        "features": [
-            "Access to all avatars (AKOOL and Soul Machines)",
-            "Live interaction with avatars",
-            "Advanced customization options",
-            "Object recognition and memory features",
-            "Up to 10 custom avatars",
-            "Priority support",
-            "Save 16% compared to monthly",
-        ],
-    },
-]
-
 @router.get("/plans", response_model=List[Dict[str, Any]])
 def get_subscription_plans(
     current_user: User = Depends(get_current_active_user),
@@ -84,21 +27,17 @@ def get_subscription_plans(
     """
     Get all available subscription plans.
     """
-    return SUBSCRIPTION_PLANS
+    return list(catalog_store.catalog.subscription_plans)
 
 @router.get("/current", response_model=SubscriptionSchema)
 def get_current_subscription(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    entitlements: Entitlements = Depends(get_current_entitlements),
 ) -> Any:
     """
     Get the current active subscription for the user.
     """
-    subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
+    subscription = entitlements.subscription
     
     if not subscription:
         raise HTTPException(
@@ -118,16 +57,21 @@ def get_subscription_history(
     """
     Get subscription history for the user.
     """
-    subscriptions = (
-        db.query(Subscription)
+    rows = (
+        db.query(*schema_columns(Subscription, SubscriptionSchema))
         .filter(Subscription.user_id == current_user.id)
         .order_by(Subscription.created_at.desc())
         .offset(skip)
         .limit(limit)
         .all()
     )
+    items = row_dicts(rows, SubscriptionSchema)
+    # A lapsed subscription stays active in its row until the next subscribe or cancel
+    for item in items:
+        if item["is_active"] and is_expired(item):
+            item["is_active"] = False
     
-    return subscriptions
+    return ProjectionResponse(items)
 
 @router.post("/subscribe", response_model=SubscriptionSchema)
 def create_subscription(
@@ -141,7 +85,7 @@ def create_subscription(
     Subscribe to a plan.
     """
     # Find the plan
-    plan = next((p for p in SUBSCRIPTION_PLANS if p["id"] == plan_id), None)
+    plan = catalog_store.catalog.subscription_plan(plan_id)
     
     if not plan:
         raise HTTPException(
@@ -149,17 +93,10 @@ def create_subscription(
             detail="Subscription plan not found",
         )
     
-    # Check if user already has an active subscription
-    active_subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
-    
-    if active_subscription:
-        # Deactivate the current subscription
-        active_subscription.is_active = False
-        db.add(active_subscription)
+    # Deactivate the current subscription, if any
+    db.query(Subscription).filter(
+        Subscription.user_id == current_user.id, Subscription.is_active == True
+    ).update({"is_active": False}, synchronize_session=False)
     
     # In a real implementation, we would process the payment here
     # For this example, we'll just create the subscription
@@ -182,7 +119,16 @@ def create_subscription(
     )
     
     db.add(subscription)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # uq_subscription_user_id_active: a concurrent request activated another subscription first
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another subscription change is in progress",
+        )
+    invalidate_principal(current_user.id)
     db.refresh(subscription)
     
     return subscription
@@ -195,23 +141,20 @@ def cancel_subscription(
     """
     Cancel the current subscription.
     """
-    subscription = (
-        db.query(Subscription)
-        .filter(Subscription.user_id == current_user.id, Subscription.is_active == True)
-        .first()
-    )
+    # In a real implementation, we would handle the cancellation with the payment provider
+    # For this example, we'll just mark the subscription as inactive
+    cancelled = db.query(Subscription).filter(
+        Subscription.user_id == current_user.id, Subscription.is_active == True
+    ).update({"is_active": False}, synchronize_session=False)
     
-    if not subscription:
+    if not cancelled:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No active subscription found",
         )
     
-    # In a real implementation, we would handle the cancellation with the payment provider
-    # For this example, we'll just mark the subscription as inactive
-    
-    subscription.is_active = False
-    db.add(subscription)
     db.commit()
+    invalidate_principal(current_user.id)
     
     return {"success": True, "message": "Subscription cancelled successfully"}
\ No newline at end of file
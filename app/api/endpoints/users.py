@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_db, get_current_active_user, get_current_active_superuser
+from app.core.principal import invalidate_principal
 from app.core.security import get_password_hash, verify_password
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserCreate, UserUpdate
@@ -58,6 +59,7 @@ def update_user_me(
         user.camera_mode = user_in.camera_mode
     
     db.commit()
+    invalidate_principal(user.id)
     db.refresh(user)
     return user
 
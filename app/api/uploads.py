@@ -0,0 +1,203 @@
+"""
+Streaming multipart uploads and the media file server.
+
+FastAPI only calls an endpoint taking `UploadFile` after the whole request body
+has been spooled to a temporary file. Upload endpoints take the Request instead
+and call receive_upload(), which feeds the body to the multipart parser as it
+arrives and writes the file part straight into storage (app/services/storage.py).
+Limits are enforced while the client is still sending, and the endpoint's
+dependencies (authentication, subscription checks) run before any of the body
+is read.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.staticfiles import StaticFiles
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import Response
+from starlette.types import Scope
+
+from app.services.images import image_renderer
+from app.services.storage import PendingUpload, StoredFile, UploadError, UploadTooLarge, format_size
+
+MAX_FIELD_SIZE = 64 * 1024  # bytes, for each form field besides the file
+MAX_PARTS = 16
+
+
+@dataclass
+class Upload:
+    file: StoredFile
+    filename: str
+    form: Dict[str, str]
+
+
+class _UploadParser:
+    """
+    Multipart callbacks collecting small fields in memory and one file part.
+    The parser's callbacks are synchronous, so file data is queued and written
+    after each chunk has been parsed.
+    """
+
+    def __init__(self, file_field: str, max_size: int):
+        self.file_field = file_field
+        self.max_size = max_size
+        self.fields: Dict[str, str] = {}
+        self.file: Optional[PendingUpload] = None
+        self.filename = ""
+        self.pending_data: List[bytes] = []
+        self._parts = 0
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._name = ""
+        self._data = bytearray()
+        self._in_file = False
+
+    def callbacks(self) -> Dict[str, Any]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self) -> None:
+        self._parts += 1
+        if self._parts > MAX_PARTS:
+            raise UploadError("Too many form fields")
+        self._disposition = b""
+        self._data = bytearray()
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise UploadError('The Content-Disposition header field "name" must be provided')
+        self._name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" not in options:
+            return
+        if self._name != self.file_field or self.file is not None:
+            raise UploadError(f"Upload a single file in the '{self.file_field}' field")
+        self.filename = options[b"filename"].decode("utf-8", errors="replace")
+        self.file = PendingUpload(self.max_size)
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self.pending_data.append(data[start:end])
+            return
+        if len(self._data) + end - start > MAX_FIELD_SIZE:
+            raise UploadError(f"The '{self._name}' field is too long")
+        self._data += data[start:end]
+
+    def on_part_end(self) -> None:
+        if not self._in_file:
+            self.fields[self._name] = self._data.decode("utf-8", errors="replace")
+
+
+async def receive_upload(request: Request, max_size: int, file_field: str = "file") -> Upload:
+    """
+    Stream a multipart/form-data request body into storage.
+
+    Raises UploadTooLarge (413) as soon as the file exceeds max_size bytes,
+    UnsupportedMediaType (415) when its first bytes are not an accepted image,
+    and UploadError (400) for malformed bodies.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected a multipart/form-data body",
+        )
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size + MAX_FIELD_SIZE:
+        # Reject without reading a byte of the body
+        raise UploadTooLarge(f"The uploaded file is larger than {format_size(max_size)}")
+
+    upload = _UploadParser(file_field, max_size)
+    parser = MultipartParser(params[b"boundary"], upload.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if upload.pending_data:
+                data, upload.pending_data = upload.pending_data, []
+                await upload.file.write(b"".join(data))
+        parser.finalize()
+        if upload.file is None:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"A file is required in the '{file_field}' field",
+            )
+        stored = await upload.file.commit()
+    except MultipartParseError as e:
+        if upload.file is not None:
+            await upload.file.abort()
+        raise UploadError("Malformed multipart body") from e
+    except BaseException:
+        if upload.file is not None:
+            await upload.file.abort()
+        raise
+    return Upload(file=stored, filename=upload.filename, form=upload.fields)
+
+
+def upload_request_body(file_field: str = "file", **fields: str) -> Dict[str, Any]:
+    """
+    `openapi_extra` documenting an endpoint that calls receive_upload(), since
+    its body is not declared with File() and Form() parameters. `fields` maps
+    optional text fields to their descriptions.
+    """
+    properties: Dict[str, Any] = {file_field: {"type": "string", "format": "binary"}}
+    properties.update({name: {"type": "string", "description": description} for name, description in fields.items()})
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {"type": "object", "properties": properties, "required": [file_field]},
+                },
+            },
+        },
+    }
+
+
+class MediaFiles(StaticFiles):
+    """
+    Serves MEDIA_ROOT. A content-addressed URL always returns the same bytes,
+    so responses may be cached by browsers and CDNs without revalidation.
+    Image variants that have not been rendered yet are rendered on first request.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # Uploads still being received
+        if path.startswith("."):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        try:
+            response = await super().get_response(path, scope)
+        except StarletteHTTPException as e:
+            if e.status_code != status.HTTP_404_NOT_FOUND or scope["method"] not in ("GET", "HEAD"):
+                raise
+            if await image_renderer.render_variant(path.replace(os.sep, "/")) is None:
+                raise
+            response = await super().get_response(path, scope)
+        if response.status_code == status.HTTP_200_OK:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
@@ -0,0 +1,189 @@
+"""
+Small key/value caches with TTL expiry.
+
+TTLCache lives in the worker process (LRU-bounded). RedisCache shares entries
+between workers and is used when REDIS_URL is set and the optional `redis`
+package is installed. Cache errors never fail a request; they are logged and
+treated as misses.
+
+Redis entries are stored as JSON, never pickled, so reading the cache cannot
+run code; values that are not plain JSON are converted by the cache's
+`encode` and `decode` functions.
+
+An in-process cache is invalidated only in the worker that made the change, so
+when several uvicorn workers run without Redis its entries expire after at most
+LOCAL_CACHE_MAX_TTL seconds (unshared_ttl), which bounds how long the other
+workers serve stale data.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from app.core.config import settings
+
+try:
+    import redis
+except ImportError:  # Optional dependency, only needed for multi-worker setups
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+Codec = Callable[[Any], Any]
+
+
+def _unchanged(value: Any) -> Any:
+    return value
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after `ttl` seconds
+    """
+
+    def __init__(self, namespace: str, ttl: float, maxsize: int = 10000):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """
+    Redis-backed cache shared by all workers. Values are stored as the JSON of
+    encode(value) and read back with decode.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float,
+        client: "redis.Redis",
+        encode: Codec = _unchanged,
+        decode: Codec = _unchanged,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._client = client
+        self._encode = encode
+        self._decode = decode
+
+    def _key(self, key: Hashable) -> str:
+        return f"weholo:{self.namespace}:{key}"
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        try:
+            raw = self._client.get(self._key(key))
+        except redis.RedisError as e:
+            logger.warning(f"Cache '{self.namespace}' read failed: {str(e)}")
+            return None
+        if raw is None:
+            return None
+        try:
+            return self._decode(json.loads(raw))
+        except (ValueError, TypeError, KeyError) as e:
+            # E.g. an entry written by an older release
+            logger.warning(f"Cache '{self.namespace}' entry is unreadable: {str(e)}")
+            return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        try:
+            raw = json.dumps(self._encode(value), separators=(",", ":"))
+            self._client.set(self._key(key), raw, px=int(self.ttl * 1000))
+        except redis.RedisError as e:
+            logger.warning(f"Cache '{self.namespace}' write failed: {str(e)}")
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            self._client.delete(self._key(key))
+        except redis.RedisError as e:
+            # A failed invalidation leaves a stale entry until its TTL expires
+            logger.error(f"Cache '{self.namespace}' invalidation failed: {str(e)}")
+
+    def clear(self) -> None:
+        try:
+            keys = list(self._client.scan_iter(match=self._key("*")))
+            if keys:
+                self._client.delete(*keys)
+        except redis.RedisError as e:
+            logger.error(f"Cache '{self.namespace}' clear failed: {str(e)}")
+
+
+_redis_client = None
+
+
+def get_redis_client() -> Optional["redis.Redis"]:
+    """
+    Shared Redis client, or None when REDIS_URL is unset or redis is not installed
+    """
+    global _redis_client
+    if not settings.REDIS_URL:
+        return None
+    if redis is None:
+        logger.warning("REDIS_URL is set but the 'redis' package is not installed; using in-process caches")
+        return None
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def unshared_ttl(ttl: float) -> float:
+    """
+    TTL for an in-process cache whose invalidations the other workers never see
+    """
+    if settings.WEB_CONCURRENCY > 1:
+        return min(ttl, settings.LOCAL_CACHE_MAX_TTL)
+    return ttl
+
+
+def create_cache(
+    namespace: str,
+    ttl: float,
+    maxsize: int = 10000,
+    encode: Codec = _unchanged,
+    decode: Codec = _unchanged,
+):
+    """
+    Create a cache backed by Redis when configured, otherwise in-process.
+    `encode` turns a value into plain JSON data and `decode` turns that data
+    back into the value; they are only used with Redis.
+    """
+    client = get_redis_client()
+    if client is not None:
+        return RedisCache(namespace, ttl, client, encode, decode)
+    if settings.WEB_CONCURRENCY > 1 and ttl > settings.LOCAL_CACHE_MAX_TTL:
+        logger.info(
+            f"Cache '{namespace}' is per worker without REDIS_URL; "
+            f"keeping entries {settings.LOCAL_CACHE_MAX_TTL:g}s instead of {ttl:g}s"
+        )
+    return TTLCache(namespace, unshared_ttl(ttl), maxsize)
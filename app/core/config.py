@@ -11,17 +11,111 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api"
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    # uvicorn worker processes per server; also read by uvicorn and scripts/entrypoint.sh
+    WEB_CONCURRENCY: int = 1
+
+    # Password hashing. Changing BCRYPT_ROUNDS rehashes passwords on next login.
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 0  # processes per uvicorn worker; 0 divides the CPUs between WEB_CONCURRENCY workers
+    PASSWORD_HASH_MAX_PENDING: int = 64  # queued hashes on the whole server before answering 429
     
     # Database
     DATABASE_URL: str = "postgresql://weholo:weholo@db:5432/weholo"
+    # Optional override for the async engine; derived from DATABASE_URL when unset
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # Connection validation: "pre_ping", "periodic" or "none"
+    DB_CONNECTION_VALIDATION: str = "pre_ping"
+    DB_VALIDATION_INTERVAL: float = 30.0  # seconds, used by "periodic"
+
+    # Database retries (jittered exponential backoff) and circuit breaker
+    DB_RETRY_MAX_ATTEMPTS: int = 3
+    DB_RETRY_BASE_DELAY: float = 0.1  # seconds
+    DB_RETRY_MAX_DELAY: float = 1.0  # seconds
+    DB_RETRY_DEADLINE: float = 3.0  # seconds, across all attempts of one call
+    DB_BREAKER_FAILURE_THRESHOLD: int = 5
+    DB_BREAKER_RESET_TIMEOUT: float = 15.0  # seconds before a half-open probe
+    REQUEST_DEADLINE: float = 10.0  # seconds of retrying allowed per request
     
+    # Caching. Set REDIS_URL to share caches between workers. Without it each
+    # worker caches on its own and only sees its own invalidations, so with
+    # WEB_CONCURRENCY > 1 entries are kept at most LOCAL_CACHE_MAX_TTL seconds.
+    REDIS_URL: Optional[str] = None
+    LOCAL_CACHE_MAX_TTL: float = 5.0  # seconds
+    PRINCIPAL_CACHE_TTL: float = 60.0  # seconds
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRODUCT_MATCHER_TTL: float = 600.0  # seconds a user's compiled product names stay cached
+    PRODUCT_MATCHER_CACHE_SIZE: int = 1000  # users
+    DASHBOARD_CACHE_TTL: float = 30.0  # seconds
+    DASHBOARD_CACHE_SIZE: int = 10000  # users
+
+    # WebSockets. With REDIS_URL set, frames fan out to sockets on every worker.
+    WS_HEARTBEAT_INTERVAL: float = 20.0  # seconds between "ping" frames
+    WS_IDLE_TIMEOUT: float = 60.0  # seconds without any client frame before closing
+    WS_SEND_QUEUE_SIZE: int = 256  # frames buffered per socket before it counts as too slow
+
+    # Background jobs (python -m app.worker)
+    JOB_WORKER_CONCURRENCY: int = 4  # jobs run at once per worker process
+    JOB_POLL_INTERVAL: float = 1.0  # seconds between polls for due jobs when idle
+    JOB_LEASE_SECONDS: float = 600.0  # a job running longer is timed out and picked up again
+    JOB_MAX_ATTEMPTS: int = 5  # before a failing job is dead-lettered
+    JOB_RETRY_BASE_DELAY: float = 10.0  # seconds, jittered and doubled per attempt
+    JOB_RETRY_MAX_DELAY: float = 600.0  # seconds
+    JOBS_IN_PROCESS: bool = False  # also run a worker inside each API worker (development)
+
+    # Uploaded media, stored by content hash (see app/services/storage.py)
+    MEDIA_ROOT: Path = Path(__file__).resolve().parent.parent.parent / "media"
+    MEDIA_URL: str = "/media"  # path MEDIA_ROOT is served at, or the URL of a CDN in front of it
+    MEDIA_MAX_IMAGE_SIZE: int = 10 * 1024 * 1024  # bytes
+    IMAGE_VARIANT_WORKERS: int = 2  # processes resizing images; 0 means one per CPU
+    IMAGE_VARIANT_QUALITY: int = 80  # WebP/AVIF quality, 1-100
+
+    # Prometheus metrics at /metrics (see app/core/metrics.py)
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROCESS_DIR: Optional[str] = None  # shared by the workers of one server, cleared on start
+    METRICS_FLUSH_INTERVAL: float = 5.0  # seconds between each worker's snapshots in METRICS_MULTIPROCESS_DIR
+
+    # Query profiling (see app/core/profiling.py); needs METRICS_ENABLED
+    SLOW_QUERY_THRESHOLD: float = 0.5  # seconds; slower SQL statements are logged with their route, 0 disables
+    PROFILING_SAMPLE_RATE: float = 0.01  # share of requests whose statements are checked for N+1 patterns
+    N_PLUS_ONE_THRESHOLD: int = 5  # executions of one statement in a request reported as a likely N+1
+    SERVER_TIMING: bool = True  # send a Server-Timing header with each response's database time
+
     # CORS
     BACKEND_CORS_ORIGINS: Union[List[str], List[None]] = ["*"]
     
     # API Keys
     AKOOL_API_KEY: Optional[str] = None
     SOUL_MACHINES_API_KEY: Optional[str] = None
-    
+
+    # Avatar providers. A provider is only called when its API key is set.
+    AKOOL_BASE_URL: str = "https://api.akool.com/v1"
+    AKOOL_MAX_CONCURRENCY: int = 20  # in-flight requests per worker
+    SOUL_MACHINES_BASE_URL: str = "https://api.soulmachines.com/v1"
+    SOUL_MACHINES_MAX_CONCURRENCY: int = 10
+    PROVIDER_MAX_CONNECTIONS: int = 20  # pooled connections per provider
+    PROVIDER_MAX_KEEPALIVE: int = 10  # idle connections kept open per provider
+    PROVIDER_KEEPALIVE_EXPIRY: float = 30.0  # seconds an idle connection is kept
+    PROVIDER_CONNECT_TIMEOUT: float = 3.0  # seconds
+    PROVIDER_READ_TIMEOUT: float = 15.0  # seconds between bytes received
+    PROVIDER_POOL_TIMEOUT: float = 5.0  # seconds waiting for a free connection
+    PROVIDER_RETRY_MAX_ATTEMPTS: int = 3
+    PROVIDER_RETRY_BASE_DELAY: float = 0.2  # seconds
+    PROVIDER_RETRY_MAX_DELAY: float = 2.0  # seconds
+    PROVIDER_RETRY_DEADLINE: float = 8.0  # seconds, across all attempts of one call
+    PROVIDER_BREAKER_FAILURE_THRESHOLD: int = 5
+    PROVIDER_BREAKER_RESET_TIMEOUT: float = 30.0  # seconds before a half-open probe
+
+    # Pre-designed avatars, demo videos, plans and recommendations; edits are picked up without a restart
+    CATALOG_PATH: Path = Path(__file__).resolve().parent.parent / "data" / "catalog.json"
+    CATALOG_RELOAD_INTERVAL: float = 10.0  # seconds between checks for changes; 0 disables reloading
+    RECOMMENDATION_LIMIT: int = 5  # avatars returned by POST /api/bot/recommend at most
+
+    # Gallery of pre-designed avatars
+    GALLERY_REFRESH_INTERVAL: float = 300.0  # seconds between fetches of the AKOOL catalog
+    GALLERY_MAX_PROVIDER_AVATARS: int = 500  # AKOOL avatars listed at most
+    GALLERY_CACHE_MAX_AGE: int = 60  # seconds clients may reuse a gallery response without revalidating
+
     # Project directories
     BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
 
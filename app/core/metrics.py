@@ -0,0 +1,517 @@
+"""
+Prometheus metrics, served in the text exposition format at GET /metrics.
+
+Counters, gauges and histograms are kept in each process's memory. uvicorn's
+workers share one port, so a scrape reaches any one of them; with
+METRICS_MULTIPROCESS_DIR set, the workers share snapshots through that
+directory and whichever is scraped serves the sum (see MetricsExporter).
+Recorded here:
+
+- HTTP: requests by route template and status, latency histograms and requests
+  in flight, by MetricsMiddleware
+- Database: statements and their duration, by engine and operation, from
+  SQLAlchemy cursor events; statements and database time per request, by
+  method and route; and time spent getting a connection from the pool
+- Password hashing (app/core/passwords.py): bcrypt time and queue wait
+
+The same cursor events and middleware feed the slow-query log, the N+1
+detector and the Server-Timing header of app/core/profiling.py.
+
+Values that already exist elsewhere, such as pool sizes, are read when the
+metrics are rendered, with Registry.on_collect().
+"""
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import profiling
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements per request
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        # One count per bucket plus +Inf, not cumulative
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def collect(self) -> Dict[Labels, Any]:
+        """
+        The current value of each label set
+        """
+        with self._lock:
+            children = list(self._children.items())
+        return {values: child.value for values, child in children}
+
+    @staticmethod
+    def combine(a: Any, b: Any) -> Any:
+        return a + b
+
+    def render(self, samples: Dict[Labels, Any]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in samples.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS, registry: Optional["Registry"] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def collect(self) -> Dict[Labels, Any]:
+        with self._lock:
+            children = list(self._children.items())
+        return {values: child.snapshot() for values, child in children}
+
+    @staticmethod
+    def combine(a: Any, b: Any) -> Any:
+        return [x + y for x, y in zip(a[0], b[0])], a[1] + b[1]
+
+    def render(self, samples: Dict[Labels, Any]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labelnames + ("le",)
+        for values, (counts, total) in samples.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(names, values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# Metric name -> samples, as collected by Registry.collect()
+Snapshot = Dict[str, Dict[Labels, Any]]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        """
+        Call `collector` before each collection, e.g. to set gauges from other stats
+        """
+        self._collectors.append(collector)
+
+    def collect(self) -> Snapshot:
+        for collector in self._collectors:
+            collector()
+        return {name: metric.collect() for name, metric in self._metrics.items()}
+
+    def render(self, others: Iterable[Snapshot] = ()) -> str:
+        """
+        This process's metrics in the exposition format, added up with
+        `others`, the snapshots of other processes
+        """
+        merged = self.collect()
+        for snapshot in others:
+            for name, samples in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                into = merged[name]
+                for values, value in samples.items():
+                    into[values] = metric.combine(into[values], value) if values in into else value
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.render(merged[name]))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by method, route and status code", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served")
+
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ("engine", "operation"))
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement latency", ("engine", "operation"))
+DB_QUERIES_PER_REQUEST = Histogram("db_queries_per_request", "SQL statements executed per HTTP request", ("method", "route"), buckets=COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram("db_time_per_request_seconds", "Time spent in SQL statements per HTTP request", ("method", "route"))
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "SQL statements slower than SLOW_QUERY_THRESHOLD", ("engine", "operation"))
+DB_REPEATED_STATEMENTS = Counter("db_repeated_statements_total", "Statements run N_PLUS_ONE_THRESHOLD times or more in one profiled request", ("method", "route"))
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds", "Time to get a connection from the pool, including opening new ones", ("engine",))
+
+_HTTP_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+@dataclass
+class RequestStats:
+    """
+    Database work done while serving the current request
+    """
+    scope: Scope
+    root_path: str
+    queries: int = 0
+    query_time: float = 0.0
+    # Set on the requests sampled for N+1 detection
+    profile: Optional[profiling.QueryProfile] = None
+
+    def route(self) -> str:
+        return route_label(self.scope, self.root_path)
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def route_label(scope: Scope, root_path: str) -> str:
+    """
+    The route template that served a request (e.g. /api/chat/conversations/{conversation_id}),
+    so that label values stay bounded
+    """
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "<unnamed>")
+    mounted = scope.get("root_path", "")
+    if mounted != root_path:
+        # A mounted app such as the media files
+        return mounted[len(root_path):]
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    Records every HTTP request's latency, status and database statements.
+    A plain ASGI middleware, so streamed request and response bodies pass
+    through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in _HTTP_METHODS else "OTHER"
+        root_path = scope.get("root_path", "")
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING:
+                    timing = profiling.server_timing(stats.queries, stats.query_time, time.perf_counter() - started)
+                    message = {**message, "headers": [*message.get("headers", ()), (b"server-timing", timing)]}
+            await send(message)
+
+        stats = RequestStats(scope, root_path)
+        if profiling.should_profile():
+            stats.profile = profiling.QueryProfile()
+        token = _request_stats.set(stats)
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+            route = route_label(scope, root_path)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route).observe(elapsed)
+            DB_QUERIES_PER_REQUEST.labels(method, route).observe(stats.queries)
+            DB_TIME_PER_REQUEST.labels(method, route).observe(stats.query_time)
+            if stats.profile is not None:
+                repeated = stats.profile.report(method, route, stats.queries, stats.query_time)
+                if repeated:
+                    DB_REPEATED_STATEMENTS.labels(method, route).inc(repeated)
+
+
+def _operation(statement: str) -> str:
+    words = statement.split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE") else "OTHER"
+
+
+def instrument_engine(engine: Any, label: str) -> None:
+    """
+    Record the statements run on `engine` (an Engine or AsyncEngine)
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        operation = _operation(statement)
+        DB_QUERIES.labels(label, operation).inc()
+        DB_QUERY_DURATION.labels(label, operation).observe(elapsed)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += elapsed
+            if stats.profile is not None:
+                stats.profile.record(statement, elapsed)
+        if profiling.is_slow(elapsed):
+            DB_SLOW_QUERIES.labels(label, operation).inc()
+            profiling.log_slow_query(statement, elapsed, stats.route() if stats is not None else "<no request>")
+
+
+class _TimedPool:
+    metrics_label = ""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.labels(self.metrics_label).observe(time.perf_counter() - started)
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    """
+    QueuePool recording how long each checkout waited in db_pool_wait_seconds
+    """
+    metrics_label = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool recording how long each checkout waited in db_pool_wait_seconds
+    """
+    metrics_label = "async"
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsExporter:
+    """
+    Renders /metrics. With a directory, each worker process writes a snapshot
+    of its metrics there every METRICS_FLUSH_INTERVAL seconds, and the worker
+    being scraped adds the other workers' snapshots to its own current values.
+    Gauges of processes that have exited are left out; their counters are kept
+    until the directory is cleared, which scripts/entrypoint.sh does on start.
+    """
+
+    def __init__(self, registry: Registry, directory: Optional[str]):
+        self.registry = registry
+        self.directory = Path(directory) if directory else None
+        self._task: Optional[asyncio.Task] = None
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        pid = os.getpid()
+        data = {
+            "pid": pid,
+            "metrics": {
+                name: [[list(values), value] for values, value in samples.items()]
+                for name, samples in self.registry.collect().items()
+            },
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp = self.directory / f".{pid}.{uuid.uuid4().hex}.tmp"
+        temp.write_text(json.dumps(data))
+        os.replace(temp, self.directory / f"{pid}.json")
+
+    def _other_processes(self) -> List[Snapshot]:
+        snapshots = []
+        for path in self.directory.glob("*.json"):
+            if path.stem == str(os.getpid()):
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            alive = _is_alive(data["pid"])
+            snapshots.append({
+                name: {tuple(values): value for values, value in samples}
+                for name, samples in data["metrics"].items()
+                if alive or not isinstance(self.registry.get(name), Gauge)
+            })
+        return snapshots
+
+    def render(self) -> str:
+        if self.directory is None:
+            return self.registry.render()
+        return self.registry.render(self._other_processes())
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                await asyncio.to_thread(self.flush)
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {self.directory}: {str(e)}")
+
+    def start(self) -> None:
+        if self.directory is not None and self._task is None:
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # Keep this worker's final counts in the sum
+        try:
+            await asyncio.to_thread(self.flush)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self.directory}: {str(e)}")
+
+
+metrics_exporter = MetricsExporter(REGISTRY, settings.METRICS_MULTIPROCESS_DIR)
@@ -0,0 +1,133 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are selected with a row-value comparison on an indexed sort key such as
+(updated_at, id), so fetching page N costs the same as page 1, unlike
+OFFSET. Cursors are opaque to clients: URL-safe base64 of the sort key of the
+first/last row on a page.
+
+`after` returns the rows that follow the cursor in the list's order and
+`before` the rows that precede it.
+
+SQLite has no timestamp type: `func.now()` stores text such as
+'2024-05-01 12:00:00', and rows are compared as strings. Cursor timestamps are
+bound in that same format (CursorTimestamp), so a cursor compares equal to the
+row it came from and rows tied on the timestamp are told apart by id.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, String, literal, tuple_
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.types import TypeDecorator
+
+
+class CursorTimestamp(TypeDecorator):
+    """
+    A cursor's timestamp, bound on SQLite as the text CURRENT_TIMESTAMP stores
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(DateTime(timezone=True))
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != "sqlite" or value is None:
+            return value
+        # SQLAlchemy's own SQLite format always adds microseconds, ".000000"
+        # included, which sorts after the stored second it should equal
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key: Sequence[ColumnElement]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(key):
+            raise ValueError("cursor does not match the sort key")
+        values = []
+        for column, value in zip(key, payload):
+            if column.type.python_type is datetime:
+                value = literal(datetime.fromisoformat(value), CursorTimestamp())
+            elif column.type.python_type is int:
+                value = int(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
+
+
+def keyset_page(
+    query: Query,
+    key: Sequence[ColumnElement],
+    *,
+    limit: int,
+    descending: bool = False,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    from_end: bool = False,
+) -> Tuple[List[Any], Optional[str], Optional[str]]:
+    """
+    Fetch one page of `query` ordered by `key`.
+
+    Returns (items, prev_cursor, next_cursor); pass prev_cursor as `before` and
+    next_cursor as `after` to get the neighbouring pages. Without a cursor the
+    first page is returned, or the last one if `from_end` (e.g. the latest
+    messages of a chat).
+    """
+    if before and after:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either 'before' or 'after', not both",
+        )
+
+    row_key = tuple_(*key)
+    forward = [column.desc() if descending else column.asc() for column in key]
+    backward = [column.asc() if descending else column.desc() for column in key]
+
+    if after:
+        values = tuple_(*decode_cursor(after, key))
+        query = query.filter(row_key < values if descending else row_key > values)
+        reverse = False
+    elif before:
+        values = tuple_(*decode_cursor(before, key))
+        query = query.filter(row_key > values if descending else row_key < values)
+        reverse = True
+    else:
+        reverse = from_end
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(*(backward if reverse else forward)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if reverse:
+        rows.reverse()
+
+    if reverse:
+        has_prev, has_next = has_more, bool(before)
+    else:
+        has_prev, has_next = bool(after), has_more
+
+    def cursor_for(row: Any) -> str:
+        return encode_cursor([getattr(row, column.key) for column in key])
+
+    prev_cursor = cursor_for(rows[0]) if rows and has_prev else None
+    next_cursor = cursor_for(rows[-1]) if rows and has_next else None
+    return rows, prev_cursor, next_cursor
@@ -0,0 +1,187 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~250 ms per call at the default cost) and holds
+the GIL while it runs, so hashing inline stalls every other request on the
+worker. PasswordHasher runs hashing and verification in a process pool, which
+also spreads a login burst across cores. The queue is bounded: once
+PASSWORD_HASH_MAX_PENDING operations are waiting, new ones are rejected with
+PasswordHasherBusy (served as 429) instead of queueing without limit.
+
+Each uvicorn worker has its own pool and queue. Unless PASSWORD_HASH_WORKERS is
+set, the server's CPUs are divided between the WEB_CONCURRENCY workers, and
+PASSWORD_HASH_MAX_PENDING is the bound for the whole server, also divided, so
+a login burst neither runs more bcrypt processes than there are cores nor
+queues more than the bound.
+
+Hashes made with a different cost factor than BCRYPT_ROUNDS are flagged for
+rehashing when they are verified, so changing the setting upgrades users
+transparently as they log in.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.core.metrics import REGISTRY, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Pinning min/max rounds to the configured cost makes needs_update() flag any
+# hash made with a different cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+# Worker-process functions; they must stay module-level so they can be pickled
+
+def _hash_password(password: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    return hashed, time.perf_counter() - started
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str], float]:
+    started = time.perf_counter()
+    valid, new_hash = pwd_context.verify_and_update(password, hashed_password)
+    return valid, new_hash, time.perf_counter() - started
+
+
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds", "Time spent in bcrypt per operation", ("operation",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+password_hash_queue_wait = Histogram("password_hash_queue_wait_seconds", "Time bcrypt operations waited for a hashing process")
+password_hash_rejected = Counter("password_hash_rejected_total", "bcrypt operations rejected because the queue was full")
+password_hash_queue_depth = Gauge("password_hash_queue_depth", "bcrypt operations queued or running")
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when the hashing queue is full
+    """
+
+
+class _LatencyStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class PasswordHasher:
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._rehashed = 0
+        # Time spent in bcrypt itself vs. end to end (including queue wait)
+        self._hash_time = _LatencyStats()
+        self._verify_time = _LatencyStats()
+        self._wait_time = _LatencyStats()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # "spawn" avoids forking a process that is running an event loop and threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                password_hash_rejected.inc()
+                raise PasswordHasherBusy()
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+        elapsed = time.perf_counter() - started
+        # Everything not spent hashing was spent queued or in IPC
+        wait = max(0.0, elapsed - result[-1])
+        with self._lock:
+            self._wait_time.observe(wait)
+        password_hash_queue_wait.observe(wait)
+        return result
+
+    async def hash(self, password: str) -> str:
+        hashed, seconds = await self._submit(_hash_password, password)
+        with self._lock:
+            self._hash_time.observe(seconds)
+        password_hash_duration.labels("hash").observe(seconds)
+        return hashed
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password; also return a new hash if the stored one uses outdated parameters
+        """
+        valid, new_hash, seconds = await self._submit(_verify_and_update, password, hashed_password)
+        with self._lock:
+            self._verify_time.observe(seconds)
+            if new_hash:
+                self._rehashed += 1
+        password_hash_duration.labels("verify").observe(seconds)
+        return valid, new_hash
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self._pending,
+                "max_pending": self.max_pending,
+                "rejected": self._rejected,
+                "rehashed": self._rehashed,
+                "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+                "hash": self._hash_time.snapshot(),
+                "verify": self._verify_time.snapshot(),
+                "queue_wait": self._wait_time.snapshot(),
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS or max(1, (os.cpu_count() or 1) // settings.WEB_CONCURRENCY),
+    max_pending=max(1, settings.PASSWORD_HASH_MAX_PENDING // settings.WEB_CONCURRENCY),
+)
+
+REGISTRY.on_collect(lambda: password_hash_queue_depth.set(password_hasher.metrics()["queue_depth"]))
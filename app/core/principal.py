@@ -0,0 +1,170 @@
+"""
+Cached snapshot of an authenticated user (the "principal").
+
+get_current_user used to load the User row on every request, and most handlers
+then also loaded the user's active Subscription. A Principal holds both as plain
+column values, cached by user id, so an authenticated request normally costs no
+queries until the handler needs something else.
+
+Call invalidate_principal(user_id) after committing any change to the user's
+row or subscriptions.
+
+The cache may be shared through Redis, so secrets such as the password hash
+are left out of the snapshot; a User attached from it loads them on access.
+"""
+import enum
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Type
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.cache import create_cache
+from app.core.config import settings
+from app.models.subscription import Subscription, SubscriptionType
+from app.models.user import User
+
+# Columns never cached
+_SECRET_COLUMNS = {"hashed_password"}
+
+
+@dataclass
+class Principal:
+    user: Dict[str, Any]
+    subscription: Optional[Dict[str, Any]] = None
+
+    @property
+    def user_id(self) -> int:
+        return self.user["id"]
+
+    @property
+    def subscription_type(self) -> Optional[SubscriptionType]:
+        return self.subscription["type"] if self.subscription else None
+
+
+def _column_values(obj: Any) -> Dict[str, Any]:
+    return {
+        column.key: getattr(obj, column.key)
+        for column in obj.__table__.columns
+        if column.key not in _SECRET_COLUMNS
+    }
+
+
+def _encode_values(values: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if values is None:
+        return None
+    encoded = {}
+    for key, value in values.items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, enum.Enum):
+            value = value.value
+        encoded[key] = value
+    return encoded
+
+
+def _decode_values(model: Type[Any], values: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if values is None:
+        return None
+    decoded = dict(values)
+    for column in model.__table__.columns:
+        value = decoded.get(column.key)
+        if value is None:
+            continue
+        python_type = column.type.python_type
+        if python_type is datetime:
+            decoded[column.key] = datetime.fromisoformat(value)
+        elif issubclass(python_type, enum.Enum):
+            decoded[column.key] = python_type(value)
+    return decoded
+
+
+def _encode_principal(principal: Principal) -> Dict[str, Any]:
+    return {"user": _encode_values(principal.user), "subscription": _encode_values(principal.subscription)}
+
+
+def _decode_principal(data: Dict[str, Any]) -> Principal:
+    return Principal(
+        user=_decode_values(User, data["user"]),
+        subscription=_decode_values(Subscription, data["subscription"]),
+    )
+
+
+principal_cache = create_cache(
+    "principal",
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    encode=_encode_principal,
+    decode=_decode_principal,
+)
+
+
+def _principal_query(user_id: int):
+    # User and active subscription in one round trip
+    return (
+        select(User, Subscription)
+        .outerjoin(
+            Subscription,
+            and_(Subscription.user_id == User.id, Subscription.is_active == True),
+        )
+        .where(User.id == user_id)
+        .limit(1)
+    )
+
+
+def _cache_principal(user_id: int, row: Any) -> Optional[Principal]:
+    if row is None:
+        return None
+
+    user, subscription = row
+    principal = Principal(
+        user=_column_values(user),
+        subscription=_column_values(subscription) if subscription else None,
+    )
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def cached_principal(user_id: int) -> Optional[Principal]:
+    return principal_cache.get(user_id)
+
+
+def query_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """
+    Load user and active subscription in one query and cache them
+    """
+    return _cache_principal(user_id, db.execute(_principal_query(user_id)).first())
+
+
+async def query_principal_async(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """
+    query_principal for async sessions
+    """
+    return _cache_principal(user_id, (await db.execute(_principal_query(user_id))).first())
+
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """
+    Get the principal from the cache, loading user and active subscription in one query on a miss
+    """
+    principal = cached_principal(user_id)
+    if principal is not None:
+        return principal
+    return query_principal(db, user_id)
+
+
+def attach_user(db: Session, principal: Principal) -> User:
+    """
+    Turn a cached principal into a User bound to `db` without querying.
+    Unloaded attributes, such as hashed_password, and relationships still
+    lazy-load as usual.
+    """
+    user = User(**principal.user)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def invalidate_principal(user_id: int) -> None:
+    principal_cache.delete(user_id)
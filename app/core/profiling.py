@@ -0,0 +1,95 @@
+"""
+Per-request query profiling, fed by the cursor events and the middleware of
+app/core/metrics.py.
+
+- Statements slower than SLOW_QUERY_THRESHOLD seconds are logged with the
+  route that ran them, for every request and background job.
+- A PROFILING_SAMPLE_RATE share of requests is profiled: their statements are
+  tallied by SQL text, and a statement run N_PLUS_ONE_THRESHOLD times or more
+  in one request, typically a lazy load per row of a result, is logged as a
+  likely N+1. The SQL is parameterized, so the tally is a dict update per
+  statement, cheap enough to leave sampling on in production.
+- Responses carry a Server-Timing header with the request's database time and
+  statement count, shown in the browser's network panel.
+"""
+import logging
+import random
+from typing import Dict, List, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Longest SQL text included in a log line
+_MAX_LOGGED_SQL = 1000
+
+
+def _shorten(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > _MAX_LOGGED_SQL:
+        return statement[:_MAX_LOGGED_SQL] + "..."
+    return statement
+
+
+def should_profile() -> bool:
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def is_slow(elapsed: float) -> bool:
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    return 0 < threshold <= elapsed
+
+
+def log_slow_query(statement: str, elapsed: float, route: str) -> None:
+    logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) in {route}: {_shorten(statement)}")
+
+
+class QueryProfile:
+    """
+    The statements of one profiled request, by SQL text
+    """
+
+    def __init__(self):
+        # SQL -> [executions, total seconds]
+        self._statements: Dict[str, List] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        entry = self._statements.get(statement)
+        if entry is None:
+            self._statements[statement] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def repeated(self) -> List[Tuple[str, int, float]]:
+        """
+        Statements run at least N_PLUS_ONE_THRESHOLD times, most frequent first
+        """
+        threshold = settings.N_PLUS_ONE_THRESHOLD
+        found = [(sql, count, total) for sql, (count, total) in self._statements.items() if count >= threshold]
+        return sorted(found, key=lambda item: -item[1])
+
+    def report(self, method: str, route: str, queries: int, query_time: float) -> int:
+        """
+        Log the likely N+1 patterns of the request; returns how many were found
+        """
+        repeated = self.repeated()
+        for sql, count, total in repeated:
+            logger.warning(
+                f"Possible N+1 in {method} {route}: statement run {count} times ({total * 1000:.1f} ms) "
+                f"of {queries} statements ({query_time * 1000:.1f} ms): {_shorten(sql)}"
+            )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"{method} {route} ran {queries} statements ({len(self._statements)} distinct) "
+                f"in {query_time * 1000:.1f} ms"
+            )
+        return len(repeated)
+
+
+def server_timing(queries: int, query_time: float, elapsed: float) -> bytes:
+    """
+    Server-Timing value for the time spent so far: in SQL statements and in total
+    """
+    return f'db;dur={query_time * 1000:.1f};desc="{queries} queries", app;dur={elapsed * 1000:.1f}'.encode()
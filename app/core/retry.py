@@ -0,0 +1,275 @@
+"""
+Retry and circuit breaker policies for transient failures.
+
+A RetryPolicy retries a callable with jittered exponential backoff, bounded by
+both its own deadline and the deadline of the current request. A CircuitBreaker
+fails fast once a dependency (e.g. the database) is known to be down, and lets a
+single probe through after a cool-down to detect recovery.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() value after which the current request should stop retrying
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Bound every retry made in this context (typically one HTTP request) by `seconds`
+    """
+    token = _request_deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose circuit is open
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    CLOSED: calls go through; consecutive failures are counted.
+    OPEN: calls are rejected with CircuitOpenError until `reset_timeout` elapses.
+    HALF_OPEN: one probe call is let through; success closes the circuit,
+    failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _current_state(self) -> CircuitState:
+        # Must be called with the lock held
+        if (
+            self._state == CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def raise_if_open(self) -> None:
+        """
+        Fail fast while OPEN without claiming the half-open probe slot
+        """
+        with self._lock:
+            if self._current_state() == CircuitState.OPEN:
+                raise CircuitOpenError(self.name, self._retry_after())
+
+    def before_call(self) -> None:
+        """
+        Raise CircuitOpenError if the call should not be attempted
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.OPEN:
+                raise CircuitOpenError(self.name, self._retry_after())
+            if state == CircuitState.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            state = self._current_state()
+            if state == CircuitState.HALF_OPEN or (
+                state == CircuitState.CLOSED and self._failures >= self.failure_threshold
+            ):
+                logger.warning(f"Circuit '{self.name}' opened after {self._failures} failures")
+                self._state = CircuitState.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current state, suitable for health endpoints
+        """
+        with self._lock:
+            state = self._current_state()
+            return {
+                "name": self.name,
+                "state": state.value,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "retry_after": round(self._retry_after(), 3) if state == CircuitState.OPEN else 0.0,
+            }
+
+
+class RetryPolicy:
+    """
+    Retry a callable with jittered exponential backoff.
+
+    Only exceptions accepted by `retry_if` are retried (and counted against the
+    breaker); anything else propagates immediately. Retries stop after
+    `max_attempts`, or once the next sleep would overrun either `deadline`
+    (seconds from the first attempt) or the current request deadline.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.1,
+        max_delay: float = 2.0,
+        deadline: Optional[float] = None,
+        retry_if: Callable[[BaseException], bool] = lambda exc: True,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_if = retry_if
+        self.breaker = breaker
+
+    def backoff(self, attempt: int) -> float:
+        """
+        "Full jitter" delay before retry number `attempt` (0-based)
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _next_delay(self, attempt: int, started: float) -> Optional[float]:
+        # Returns None when no further attempt should be made
+        if attempt + 1 >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt)
+        wake_at = time.monotonic() + delay
+        if self.deadline is not None and wake_at > started + self.deadline:
+            return None
+        request_deadline_at = _request_deadline.get()
+        if request_deadline_at is not None and wake_at > request_deadline_at:
+            return None
+        return delay
+
+    def _before_attempt(self) -> None:
+        if self.breaker is not None:
+            self.breaker.before_call()
+
+    def _after_failure(self, exc: BaseException) -> bool:
+        # Returns True if the exception is retryable
+        if not self.retry_if(exc):
+            if self.breaker is not None:
+                # The dependency answered; the error is the caller's problem
+                self.breaker.record_success()
+            return False
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        return True
+
+    def call(
+        self,
+        fn: Callable[..., T],
+        *args: Any,
+        on_retry: Optional[Callable[[BaseException], None]] = None,
+        **kwargs: Any,
+    ) -> T:
+        """
+        Call `fn` from sync code (e.g. a handler running in the threadpool)
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            self._before_attempt()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                if not self._after_failure(exc):
+                    raise
+                delay = self._next_delay(attempt, started)
+                if delay is None:
+                    raise
+                logger.warning(f"Retrying after {type(exc).__name__} (attempt {attempt + 1}/{self.max_attempts})")
+                if on_retry is not None:
+                    on_retry(exc)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
+
+    async def call_async(
+        self,
+        fn: Callable[..., Awaitable[T]],
+        *args: Any,
+        on_retry: Optional[Callable[[BaseException], Any]] = None,
+        **kwargs: Any,
+    ) -> T:
+        """
+        Await `fn` from async code; backoff sleeps yield to the event loop
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            self._before_attempt()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as exc:
+                if not self._after_failure(exc):
+                    raise
+                delay = self._next_delay(attempt, started)
+                if delay is None:
+                    raise
+                logger.warning(f"Retrying after {type(exc).__name__} (attempt {attempt + 1}/{self.max_attempts})")
+                if on_retry is not None:
+                    retry_result = on_retry(exc)
+                    if asyncio.iscoroutine(retry_result):
+                        await retry_result
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
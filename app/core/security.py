@@ -1,19 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Any, Union, Optional
-import time
 
 from jose import jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import OperationalError, DBAPIError, DisconnectionError
 
 from app.core.config import settings
-from app.db.session import get_db
+from app.core.passwords import pwd_context
+from app.core.principal import Principal, attach_user, cached_principal, query_principal, query_principal_async
+from app.core.retry import CircuitOpenError
+from app.db.session import get_db, db_retry_policy
 from app.models.user import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -31,7 +32,8 @@ def create_access_token(subject: Union[str, Any], expires_delta: Optional[timede
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
-    Verify a password against a hash
+    Verify a password against a hash. Blocks for the full bcrypt cost; async
+    handlers should use app.core.passwords.password_hasher instead.
     """
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -41,63 +43,89 @@ def get_password_hash(password: str) -> str:
     """
     return pwd_context.hash(password)
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
+def decode_access_token(token: str) -> int:
     """
-    Get the current user from the token
+    Get the user id from an access token
     """
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+        sub: str = payload.get("sub")
+        if sub is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-    except jwt.JWTError:
+        return int(sub)
+    except (jwt.JWTError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+
+def _require_principal(principal: Optional[Principal]) -> Principal:
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+def get_current_principal(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """
+    Get the cached principal (user and active subscription) for the token
+    """
+    user_id = decode_access_token(token)
+    principal = cached_principal(user_id)
+    if principal is not None:
+        # Cache hits never reach the database, so they must not move the circuit breaker
+        return principal
+
     try:
-        # Add retry logic for database operations
-        max_retries = 3
-        retry_delay = 1  # seconds
-        last_error = None
-        
-        for attempt in range(max_retries):
-            try:
-                user = db.query(User).filter(User.id == user_id).first()
-                if user is None:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="User not found",
-                        headers={"WWW-Authenticate": "Bearer"},
-                    )
-                return user
-            except (OperationalError, DBAPIError, DisconnectionError) as e:
-                last_error = e
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    continue
-        
-        # If we've exhausted all retries, raise the last error
-        if last_error:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Database connection error, please try again",
-            ) from last_error
-    except Exception as e:
-        # Handle any other unexpected errors
+        principal = db_retry_policy.call(
+            query_principal, db, user_id, on_retry=lambda e: db.rollback()
+        )
+    except (CircuitOpenError, OperationalError, DBAPIError, DisconnectionError) as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Authentication error",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection error, please try again",
         ) from e
 
+    return _require_principal(principal)
+
+async def authenticate_token(db: AsyncSession, token: str) -> Principal:
+    """
+    get_current_principal for async code that cannot use dependencies, e.g. WebSockets
+    """
+    user_id = decode_access_token(token)
+    principal = cached_principal(user_id)
+    if principal is not None:
+        return principal
+
+    try:
+        principal = await db_retry_policy.call_async(
+            query_principal_async, db, user_id, on_retry=lambda e: db.rollback()
+        )
+    except (CircuitOpenError, OperationalError, DBAPIError, DisconnectionError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database connection error, please try again",
+        ) from e
+
+    return _require_principal(principal)
+
+def get_current_user(
+    db: Session = Depends(get_db), principal: Principal = Depends(get_current_principal)
+) -> User:
+    """
+    Get the current user from the token
+    """
+    return attach_user(db, principal)
+
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """
     Get the current active user
@@ -1,13 +1,25 @@
+from typing import AsyncGenerator
+import asyncio
+
 from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import DBAPIError, OperationalError, DisconnectionError
 from sqlalchemy.pool import QueuePool
 from icecream import ic
-import time
 import logging
 import re
 
 from app.core.config import settings
+from app.core.metrics import (
+    REGISTRY,
+    Gauge,
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    instrument_engine,
+)
+from app.core.retry import CircuitBreaker, RetryPolicy
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -32,7 +44,25 @@ else:
 
 # Common settings
 pool_timeout = 30
-pool_pre_ping = True  # Enable connection health checks
+
+# Connection validation mode:
+#   pre_ping - validate each connection on pool checkout (one cheap ping per checkout)
+#   periodic - ping in the background every DB_VALIDATION_INTERVAL seconds and
+#              drop the pool when the database stops answering
+#   none     - no validation; stale connections surface as errors and are retried
+VALIDATION_MODES = ("pre_ping", "periodic", "none")
+validation_mode = settings.DB_CONNECTION_VALIDATION
+if validation_mode not in VALIDATION_MODES:
+    raise ValueError(
+        f"DB_CONNECTION_VALIDATION must be one of {', '.join(VALIDATION_MODES)}, got {validation_mode!r}"
+    )
+pool_pre_ping = validation_mode == "pre_ping"
+
+# Queue pools that record checkout wait times (see app/core/metrics.py). An
+# in-memory SQLite database keeps SQLAlchemy's default single-connection pool.
+in_memory_sqlite = is_sqlite and make_url(settings.DATABASE_URL).database in (None, "", ":memory:")
+sync_pool = {} if in_memory_sqlite else {"poolclass": TimedQueuePool}
+async_pool = {} if in_memory_sqlite else {"poolclass": TimedAsyncAdaptedQueuePool}
 
 # Create SQLAlchemy engine with appropriate configuration
 if is_sqlite:
@@ -40,6 +70,7 @@ if is_sqlite:
         settings.DATABASE_URL,
         connect_args=connect_args,
         pool_pre_ping=pool_pre_ping,
+        **sync_pool,
     )
 else:
     engine = create_engine(
@@ -50,6 +81,7 @@ else:
         pool_timeout=pool_timeout,
         pool_recycle=pool_recycle,
         pool_pre_ping=pool_pre_ping,
+        **sync_pool,
     )
 ic(settings.DATABASE_URL)
 
@@ -70,33 +102,139 @@ if not is_sqlite:
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Dependency to get DB session with reconnection logic
+@event.listens_for(SessionLocal, "after_begin")
+def mark_connection_used(session, transaction, connection):
+    # Lets get_db tell requests that reached the database from those that did not
+    session.info["used_connection"] = True
+
+def get_async_database_url() -> str:
+    """
+    Map DATABASE_URL onto its async driver (asyncpg for PostgreSQL, aiosqlite for SQLite)
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+
+    url = make_url(settings.DATABASE_URL)
+    backend = url.get_backend_name()
+    if backend == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    elif backend == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+# Create the async engine used by AsyncSession dependencies
+if is_sqlite:
+    async_engine = create_async_engine(
+        get_async_database_url(),
+        pool_pre_ping=pool_pre_ping,
+        **async_pool,
+    )
+else:
+    async_engine = create_async_engine(
+        get_async_database_url(),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        **async_pool,
+    )
+
+# Statement counts and timings for /metrics
+instrument_engine(engine, "sync")
+instrument_engine(async_engine, "async")
+
+db_pool_connections = Gauge("db_pool_connections", "Pooled database connections by state", ("engine", "state"))
+
+
+def collect_pool_stats() -> None:
+    for label, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        if isinstance(pool, QueuePool):
+            db_pool_connections.labels(label, "checked_out").set(pool.checkedout())
+            db_pool_connections.labels(label, "idle").set(pool.checkedin())
+            db_pool_connections.labels(label, "overflow").set(max(0, pool.overflow()))
+
+
+REGISTRY.on_collect(collect_pool_stats)
+
+# Create AsyncSessionLocal class. Objects stay usable after commit so handlers
+# can serialize them without an implicit (and unawaitable) refresh.
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+def is_transient_db_error(exc: BaseException) -> bool:
+    """
+    True for connection-level failures worth retrying (not e.g. IntegrityError)
+    """
+    if isinstance(exc, (OperationalError, DisconnectionError)):
+        return True
+    return isinstance(exc, DBAPIError) and exc.connection_invalidated
+
+# Shared by every DB retry path; the breaker fails requests fast while the
+# database is known to be down instead of letting each one wait out its retries
+db_breaker = CircuitBreaker(
+    "database",
+    failure_threshold=settings.DB_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.DB_BREAKER_RESET_TIMEOUT,
+)
+db_retry_policy = RetryPolicy(
+    max_attempts=settings.DB_RETRY_MAX_ATTEMPTS,
+    base_delay=settings.DB_RETRY_BASE_DELAY,
+    max_delay=settings.DB_RETRY_MAX_DELAY,
+    deadline=settings.DB_RETRY_DEADLINE,
+    retry_if=is_transient_db_error,
+    breaker=db_breaker,
+)
+
+# Dependency to get DB session. The connection is checked out lazily on the
+# first query; validation happens according to DB_CONNECTION_VALIDATION.
 def get_db():
+    db_breaker.raise_if_open()
     db = SessionLocal()
-    max_retries = 3
-    retry_delay = 1  # seconds
-    
     try:
-        # Test connection with a simple query
-        db.execute(text("SELECT 1"))
         yield db
-    except (OperationalError, DBAPIError, DisconnectionError) as e:
-        logger.error(f"Database connection error: {str(e)}")
-        
-        # Attempt to reconnect
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"Attempting to reconnect (attempt {attempt + 1}/{max_retries})")
-                db.close()
-                time.sleep(retry_delay)
-                db = SessionLocal()
-                db.execute(text("SELECT 1"))
-                logger.info("Successfully reconnected to database")
-                yield db
-                break
-            except Exception as retry_error:
-                logger.error(f"Reconnection attempt {attempt + 1} failed: {str(retry_error)}")
-                if attempt == max_retries - 1:
-                    raise  # Re-raise the exception if all retries fail
+    except Exception as e:
+        # Connection failures in the handler also count towards opening the circuit
+        if is_transient_db_error(e):
+            logger.error(f"Database connection error: {str(e)}")
+            db_breaker.record_failure()
+        elif db.info.get("used_connection"):
+            db_breaker.record_success()
+        raise
+    else:
+        # Only a request that actually used a connection says the database is up
+        if db.info.get("used_connection"):
+            db_breaker.record_success()
     finally:
         db.close()
+
+# Async dependency to get a DB session for `async def` handlers
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def validate_connections() -> bool:
+    """
+    Ping the database once and drop pooled connections if it does not answer
+    """
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.error(f"Background connection validation failed: {str(e)}")
+        db_breaker.record_failure()
+        # Every pooled connection is suspect after a failover; reconnect lazily
+        engine.dispose()
+        return False
+    db_breaker.record_success()
+    return True
+
+async def validate_connections_periodically(interval: float) -> None:
+    """
+    Background loop used when DB_CONNECTION_VALIDATION is "periodic"
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if not await asyncio.to_thread(validate_connections):
+            await async_engine.dispose()
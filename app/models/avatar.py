@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -37,3 +37,8 @@ class Avatar(Base):
 
     # Is this avatar public?
     is_public = Column(Boolean, default=False)
+
+    __table_args__ = (
+        # Per-user listings and the gallery "already selected" lookup
+        Index("ix_avatar_user_id_provider_provider_id", "user_id", "provider", "provider_id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -16,6 +16,11 @@ class Message(Base):
     conversation_id = Column(Integer, ForeignKey("conversation.id"))
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        # Keyset pagination of a conversation's messages
+        Index("ix_message_conversation_id_created_at_id", "conversation_id", "created_at", "id"),
+    )
+
 class Conversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -31,7 +36,15 @@ class Conversation(Base):
 
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set on insert too, so conversations sort and paginate without NULLs
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Metadata
     conversation_metadata = Column(JSON)  # For storing additional information about the conversation
+
+    __table_args__ = (
+        # Keyset pagination of a user's conversations by recency
+        Index("ix_conversation_user_id_updated_at_id", "user_id", "updated_at", "id"),
+        # Cascading deletes of an avatar's conversations
+        Index("ix_conversation_avatar_id", "avatar_id"),
+    )
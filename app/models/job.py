@@ -0,0 +1,49 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, JSON, Enum, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+import enum
+
+from app.models.base import Base
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"  # waiting for a worker (or for run_at, when retrying)
+    RUNNING = "running"  # claimed by a worker until locked_until
+    SUCCEEDED = "succeeded"
+    DEAD = "dead"  # failed permanently or ran out of attempts; kept for inspection
+
+class Job(Base):
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, nullable=False)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    payload = Column(JSON, nullable=False)
+    result = Column(JSON)
+    error = Column(Text)  # last failure
+
+    # Repeated submissions with the same key return the existing job
+    idempotency_key = Column(String)
+
+    # Retries
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    # Lease held by the worker running the job; expired leases are picked up again
+    locked_by = Column(String)
+    locked_until = Column(DateTime(timezone=True))
+
+    # Ownership
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
+    user = relationship("User")
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "idempotency_key", name="uq_job_user_id_idempotency_key"),
+        # Workers claiming the next due job
+        Index("ix_job_status_run_at", "status", "run_at"),
+        # A user's recent jobs
+        Index("ix_job_user_id_created_at", "user_id", "created_at"),
+    )
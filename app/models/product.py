@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, Float
+from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -18,3 +18,7 @@ class Product(Base):
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_product_user_id", "user_id"),
+    )
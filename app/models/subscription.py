@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, Float, Enum
+from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Text, Float, Enum, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -35,3 +35,16 @@ class Subscription(Base):
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Subscription history, newest first
+        Index("ix_subscription_user_id_created_at", "user_id", "created_at"),
+        # At most one active subscription per user; also serves the active lookup
+        Index(
+            "uq_subscription_user_id_active",
+            "user_id",
+            unique=True,
+            postgresql_where=text("is_active"),
+            sqlite_where=text("is_active = 1"),
+        ),
+    )
@@ -2,6 +2,8 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime
 from pydantic import BaseModel, Field
 
+from app.schemas.image import ImageVariantsMixin
+
 # Shared properties
 class AvatarBase(BaseModel):
     name: Optional[str] = None
@@ -36,9 +38,25 @@ class AvatarInDBBase(AvatarBase):
         from_attributes = True
 
 # Additional properties to return via API
-class Avatar(AvatarInDBBase):
+class Avatar(AvatarInDBBase, ImageVariantsMixin):
     pass
 
+# Avatar cards (the dashboard), without the settings JSON
+class AvatarSummary(ImageVariantsMixin):
+    id: int
+    name: str
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    provider: str
+    provider_id: Optional[str] = None
+    is_predesigned: Optional[bool] = False
+    is_public: Optional[bool] = False
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Additional properties stored in DB
 class AvatarInDB(AvatarInDBBase):
     pass
\ No newline at end of file
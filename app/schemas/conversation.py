@@ -61,9 +61,33 @@ class ConversationInDBBase(ConversationBase):
 class Conversation(ConversationInDBBase):
     pass
 
+# Conversation list entries (the dashboard), without the metadata JSON
+class ConversationSummary(BaseModel):
+    id: int
+    title: Optional[str] = None
+    avatar_id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Additional properties to return via API with messages
 class ConversationWithMessages(Conversation):
     messages: List[Message] = []
+    # Cursor for older messages; pass as `before` to the messages endpoint
+    messages_cursor: Optional[str] = None
+
+# Keyset-paginated lists. Pass prev_cursor as `before` and next_cursor as `after`.
+class ConversationPage(BaseModel):
+    items: List[Conversation] = []
+    prev_cursor: Optional[str] = None
+    next_cursor: Optional[str] = None
+
+class MessagePage(BaseModel):
+    items: List[Message] = []
+    prev_cursor: Optional[str] = None
+    next_cursor: Optional[str] = None
 
 # Additional properties stored in DB
 class ConversationInDB(ConversationInDBBase):
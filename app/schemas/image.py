@@ -0,0 +1,14 @@
+from typing import Dict, Optional
+from pydantic import BaseModel, computed_field
+
+from app.services.images import image_variants
+
+# Adds image_variants to schemas with an image_url
+class ImageVariantsMixin(BaseModel):
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[Dict[str, Dict[str, str]]]:
+        """
+        Resized variants of an uploaded image_url, by size then format
+        """
+        return image_variants(self.image_url)
@@ -2,6 +2,8 @@ from typing import Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 
+from app.schemas.image import ImageVariantsMixin
+
 # Shared properties
 class ProductBase(BaseModel):
     name: Optional[str] = None
@@ -29,7 +31,7 @@ class ProductInDBBase(ProductBase):
         from_attributes = True
 
 # Additional properties to return via API
-class Product(ProductInDBBase):
+class Product(ProductInDBBase, ImageVariantsMixin):
     pass
 
 # Additional properties stored in DB
@@ -0,0 +1,79 @@
+"""
+Custom avatars created from uploaded photos, as background jobs.
+
+The upload endpoint stores the photo in media storage (app/services/storage.py)
+and enqueues an "avatar_from_photo" job; a worker sends the photo to AKOOL (when
+configured) and stores the avatar. The user's avatar limit is checked again when
+the job runs, since several uploads may be queued at once.
+"""
+import asyncio
+import os
+from typing import Any, Dict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.avatar import Avatar
+from app.models.job import Job
+from app.services.dashboard import invalidate_dashboard
+from app.services.jobs import PermanentJobError, job_handler
+from app.services.providers import ProviderError, get_provider
+from app.services.storage import media_path, media_url
+
+AVATAR_FROM_PHOTO = "avatar_from_photo"
+
+
+async def count_avatars(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(select(func.count()).select_from(Avatar).where(Avatar.user_id == user_id))
+
+
+def avatar_created(job: Job) -> None:
+    # Reaches the API's cache only through Redis; otherwise DASHBOARD_CACHE_TTL applies
+    invalidate_dashboard(job.user_id)
+
+
+@job_handler(AVATAR_FROM_PHOTO, on_complete=avatar_created)
+async def create_avatar_from_photo(db: AsyncSession, job: Job) -> Dict[str, Any]:
+    payload = job.payload
+    if await count_avatars(db, job.user_id) >= payload["max_avatars"]:
+        raise PermanentJobError(
+            f"You have reached your limit of {payload['max_avatars']} avatars. "
+            "Upgrade your subscription to create more."
+        )
+
+    path = media_path(payload["photo_key"])
+    if not os.path.exists(path):
+        raise PermanentJobError("The uploaded photo is no longer available")
+
+    provider_id = None
+    image_url = media_url(payload["photo_key"])
+    akool = get_provider("AKOOL")
+    if akool is not None:
+        photo = await asyncio.to_thread(path.read_bytes)
+        try:
+            created = await akool.create_avatar(
+                payload["name"], photo, payload["filename"], payload["content_type"]
+            )
+        except ProviderError as e:
+            if not e.transient:
+                raise PermanentJobError(str(e)) from e
+            raise
+        provider_id = created.get("id")
+        image_url = created.get("thumbnail_url") or image_url
+
+    avatar = Avatar(
+        name=payload["name"],
+        image_url=image_url,
+        provider="AKOOL",
+        provider_id=provider_id,
+        behavior_settings={},
+        appearance_settings={},
+        voice_settings={},
+        is_predesigned=False,
+        is_public=False,
+        user_id=job.user_id,
+    )
+    db.add(avatar)
+    # Committed by the worker together with the job's completion
+    await db.flush()
+    return {"avatar_id": avatar.id}
@@ -0,0 +1,211 @@
+"""
+Static catalog data: pre-designed avatars, demo videos, subscription plans and
+the bot's avatar recommendations and intents.
+
+The data lives in one versioned file (CATALOG_PATH, app/data/catalog.json by
+default) instead of lists in each endpoint module. It is loaded into an
+immutable Catalog with id indexes and per-provider and per-category buckets,
+so every lookup is a dict access, and with the recommendation matrix of
+app/services/recommendations.py. Each worker checks the file's modification
+time every CATALOG_RELOAD_INTERVAL seconds and swaps in a new Catalog when it
+changed, so editing the file updates the catalog without a restart or deploy.
+A file that fails validation is logged and the previous catalog kept.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from app.core.config import settings
+from app.models.subscription import SubscriptionType
+from app.services.intents import IntentRouter
+from app.services.recommendations import RECOMMENDATION_FIELDS, AvatarRecommender
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogError(ValueError):
+    """
+    Raised when the catalog file is missing a section or references an unknown id
+    """
+
+
+def _index(items: Iterable[Dict[str, Any]], section: str) -> Dict[int, Dict[str, Any]]:
+    indexed = {}
+    for item in items:
+        if item["id"] in indexed:
+            raise CatalogError(f"Duplicate id {item['id']} in {section}")
+        indexed[item["id"]] = item
+    return indexed
+
+
+def _bucket(items: Iterable[Dict[str, Any]], key: str) -> Dict[str, Tuple[Dict[str, Any], ...]]:
+    buckets = defaultdict(list)
+    for item in items:
+        buckets[item[key]].append(item)
+    return {name: tuple(bucket) for name, bucket in buckets.items()}
+
+
+class Catalog:
+    """
+    One version of the catalog. Never modified once built; reloading the
+    file builds a new one.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        try:
+            self._build(data)
+        except CatalogError:
+            raise
+        except (KeyError, TypeError, ValueError) as e:
+            raise CatalogError(f"Invalid catalog: {e!r}") from e
+
+    def _build(self, data: Dict[str, Any]) -> None:
+        self.version = data["version"]
+        self.avatars: Tuple[Dict[str, Any], ...] = tuple(data["avatars"])
+        self.demo_videos: Tuple[Dict[str, Any], ...] = tuple(data["demo_videos"])
+        self.subscription_plans: Tuple[Dict[str, Any], ...] = tuple(
+            {**plan, "type": SubscriptionType(plan["type"])} for plan in data["subscription_plans"]
+        )
+
+        self._avatars = _index(self.avatars, "avatars")
+        self._demo_videos = _index(self.demo_videos, "demo_videos")
+        self._plans = _index(self.subscription_plans, "subscription_plans")
+        self.avatars_by_provider = MappingProxyType(_bucket(self.avatars, "provider"))
+        self.demo_videos_by_provider = MappingProxyType(_bucket(self.demo_videos, "avatar_provider"))
+
+        recommendations = data["avatar_recommendations"]
+        categories = recommendations["categories"]
+        self.recommendations: Mapping[str, Tuple[Dict[str, Any], ...]] = MappingProxyType({
+            category: tuple(self._recommendation(item) for item in spec["avatars"])
+            for category, spec in categories.items()
+        })
+        default_categories = tuple(recommendations["default_categories"])
+        for category in default_categories:
+            if category not in categories:
+                raise CatalogError(f"Unknown default recommendation category {category!r}")
+        self.recommender = AvatarRecommender(
+            self.avatars,
+            self.recommendations,
+            {category: tuple(spec.get("keywords", ())) for category, spec in categories.items()},
+            default_categories,
+        )
+        self.intent_router = IntentRouter(data["bot"]["intents"], data["bot"]["fallback"])
+
+    def _recommendation(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        avatar = self._avatars.get(item["avatar_id"])
+        if avatar is None:
+            raise CatalogError(f"Recommendation of unknown avatar {item['avatar_id']}")
+        return {**{field: avatar[field] for field in RECOMMENDATION_FIELDS}, "reason": item["reason"]}
+
+    def avatar(self, avatar_id: int) -> Optional[Dict[str, Any]]:
+        return self._avatars.get(avatar_id)
+
+    def demo_video(self, demo_id: int) -> Optional[Dict[str, Any]]:
+        return self._demo_videos.get(demo_id)
+
+    def subscription_plan(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        return self._plans.get(plan_id)
+
+
+def load_catalog(path: str) -> Catalog:
+    with open(path, encoding="utf-8") as f:
+        return Catalog(json.load(f))
+
+
+class CatalogStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._stat = self._file_stat()
+        self.catalog = load_catalog(path)
+        self._listeners: List[Callable[[Catalog], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.failed_reloads = 0
+
+    def _file_stat(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def on_reload(self, listener: Callable[[Catalog], None]) -> None:
+        """
+        Call `listener` with each new catalog, e.g. to rebuild data derived from it
+        """
+        self._listeners.append(listener)
+
+    def _load_if_changed(self) -> Optional[Tuple[Tuple[int, int], Catalog]]:
+        try:
+            stat = self._file_stat()
+        except OSError as e:
+            logger.error(f"Could not reload the catalog from {self.path}, keeping version {self.catalog.version}: {str(e)}")
+            return None
+        if stat == self._stat:
+            return None
+        try:
+            return stat, load_catalog(self.path)
+        except (OSError, ValueError) as e:
+            # Reported once per change of the file, not on every check
+            self._stat = stat
+            self.failed_reloads += 1
+            logger.error(f"Could not reload the catalog from {self.path}, keeping version {self.catalog.version}: {str(e)}")
+            return None
+
+    def _swap(self, stat: Tuple[int, int], catalog: Catalog) -> None:
+        self._stat = stat
+        self.catalog = catalog
+        self.reloads += 1
+        logger.info(f"Loaded catalog version {catalog.version} from {self.path}")
+        for listener in self._listeners:
+            try:
+                listener(catalog)
+            except Exception:
+                logger.exception(f"Catalog reload listener {listener!r} failed")
+
+    def reload(self) -> bool:
+        """
+        Load the file again if it changed since the last load. Returns whether
+        a new catalog was swapped in.
+        """
+        loaded = self._load_if_changed()
+        if loaded is not None:
+            self._swap(*loaded)
+        return loaded is not None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(settings.CATALOG_RELOAD_INTERVAL)
+            # A stat call unless the file changed; listeners then run on the event loop
+            loaded = await asyncio.to_thread(self._load_if_changed)
+            if loaded is not None:
+                self._swap(*loaded)
+
+    def start(self) -> None:
+        if self._task is None and settings.CATALOG_RELOAD_INTERVAL > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        catalog = self.catalog
+        return {
+            "path": self.path,
+            "version": catalog.version,
+            "avatars": len(catalog.avatars),
+            "demo_videos": len(catalog.demo_videos),
+            "subscription_plans": len(catalog.subscription_plans),
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+        }
+
+
+catalog_store = CatalogStore(str(settings.CATALOG_PATH))
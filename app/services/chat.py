@@ -0,0 +1,133 @@
+"""
+Avatar reply generation, shared by the REST and WebSocket chat endpoints.
+
+The WebSocket consumes replies as an async stream of text chunks, so the first
+words reach the client while the rest is still being generated; the REST
+endpoint returns the whole reply at once. Soul Machines avatars are answered by
+their digital person when SOUL_MACHINES_API_KEY is set, streamed as the
+provider generates the reply; other replies are composed locally, as is any
+reply the provider fails to start.
+"""
+import asyncio
+import logging
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.retry import CircuitOpenError
+from app.models.avatar import Avatar
+from app.models.product import Product
+from app.services.product_matcher import ProductMatch, get_product_matcher, get_product_matcher_async
+from app.services.providers import ProviderError, get_provider
+from app.services.providers.soul_machines import SoulMachinesClient
+
+logger = logging.getLogger(__name__)
+
+# A word and the whitespace after it
+_CHUNK_PATTERN = re.compile(r"\S+\s*")
+
+
+def _in_mention_order(products: Sequence[Product], matches: List[ProductMatch]) -> List[Product]:
+    by_id = {product.id: product for product in products}
+    ordered = []
+    for match in matches:
+        product = by_id.pop(match.product_id, None)
+        if product is not None:
+            ordered.append(product)
+    return ordered
+
+
+def find_mentioned_products(
+    db: Session, user_id: int, content: str
+) -> Tuple[List[Product], List[ProductMatch]]:
+    """
+    The user's products mentioned in `content`, in order of first mention, and every match.
+    Products are only loaded when something matched.
+    """
+    matches = get_product_matcher(db, user_id).find(content)
+    if not matches:
+        return [], []
+    ids = {match.product_id for match in matches}
+    products = db.query(Product).filter(Product.id.in_(ids)).all()
+    return _in_mention_order(products, matches), matches
+
+
+async def find_mentioned_products_async(
+    db: AsyncSession, user_id: int, content: str
+) -> Tuple[List[Product], List[ProductMatch]]:
+    matches = (await get_product_matcher_async(db, user_id)).find(content)
+    if not matches:
+        return [], []
+    ids = {match.product_id for match in matches}
+    products = (await db.execute(select(Product).where(Product.id.in_(ids)))).scalars().all()
+    return _in_mention_order(products, matches), matches
+
+
+def compose_reply(content: str, products: Sequence[Any] = ()) -> str:
+    reply = f"I received your message: '{content}'. "
+
+    if len(products) == 1:
+        product = products[0]
+        reply += f"I see you mentioned {product.name}. "
+        if product.description:
+            reply += f"Here's some information about it: {product.description}"
+    elif products:
+        names = [product.name for product in products]
+        reply += f"I see you mentioned {', '.join(names[:-1])} and {names[-1]}. "
+        details = [f"{product.name}: {product.description}" for product in products if product.description]
+        if details:
+            reply += f"Here's some information about them: {'; '.join(details)}"
+    else:
+        reply += "How can I assist you further?"
+
+    return reply
+
+
+async def _soul_machines_reply(
+    client: SoulMachinesClient, avatar: Avatar, content: str, session: Dict[Any, Any]
+) -> AsyncIterator[str]:
+    # One provider conversation per chat session, started on its first message
+    key = (client.name, avatar.provider_id)
+    conversation_id = session.get(key)
+    if conversation_id is None:
+        conversation = await client.create_conversation(avatar.provider_id)
+        conversation_id = (conversation or {}).get("id")
+        if not conversation_id:
+            raise ProviderError(client.name, "Conversation created without an id")
+        session[key] = conversation_id
+    async for chunk in client.stream_message(conversation_id, content):
+        yield chunk
+
+
+async def stream_reply(
+    avatar: Avatar,
+    content: str,
+    products: Sequence[Any] = (),
+    session: Optional[Dict[Any, Any]] = None,
+) -> AsyncIterator[str]:
+    """
+    Yield the avatar's reply to `content` chunk by chunk. Pass the same
+    `session` dict for every message of one chat so provider conversations
+    carry over between messages.
+    """
+    client = get_provider(avatar.provider) if avatar is not None else None
+    if isinstance(client, SoulMachinesClient) and avatar.provider_id:
+        started = False
+        try:
+            async for chunk in _soul_machines_reply(client, avatar, content, session if session is not None else {}):
+                started = True
+                yield chunk
+            return
+        except (ProviderError, CircuitOpenError) as e:
+            if started:
+                # Part of the reply is out already; it cannot be swapped for another
+                raise
+            logger.warning(f"Soul Machines reply failed, answering locally: {str(e)}")
+
+    for chunk in _CHUNK_PATTERN.findall(compose_reply(content, products)):
+        yield chunk
+        # Let other connections run between chunks, as a network stream would
+        await asyncio.sleep(0)
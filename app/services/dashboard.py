@@ -0,0 +1,120 @@
+"""
+Read model of the dashboard (GET /api/dashboard/), the landing page after login.
+
+The user's avatar cards and recent conversations are loaded in one round trip,
+a UNION ALL of two narrow projections that leaves out the avatars' settings
+JSON and the conversations' metadata. The serialized result is cached by user
+id; preferences, subscription and features come from the cached principal and
+entitlements, so a dashboard served from the cache runs no queries.
+
+Call invalidate_dashboard(user_id) after committing any change to the user's
+avatars or conversations, including new messages, which reorder them.
+Other processes see the invalidation only through Redis (REDIS_URL); without
+it their entries expire after LOCAL_CACHE_MAX_TTL (app/core/cache.py).
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy import Boolean, Integer, String, Text, cast, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from app.core.cache import create_cache
+from app.core.config import settings
+from app.models.avatar import Avatar
+from app.models.conversation import Conversation
+from app.schemas.avatar import AvatarSummary
+from app.schemas.conversation import ConversationSummary
+
+dashboard_cache = create_cache(
+    "dashboard",
+    ttl=settings.DASHBOARD_CACHE_TTL,
+    maxsize=settings.DASHBOARD_CACHE_SIZE,
+)
+
+# Conversations listed on the dashboard
+RECENT_CONVERSATIONS = 5
+
+
+def _dashboard_query(user_id: int):
+    # Both branches share one row shape: `kind`, then the columns of either
+    # projection, NULL where the other kind has no such column
+    avatars = select(
+        literal("avatar").label("kind"),
+        Avatar.id,
+        Avatar.name,
+        Avatar.description,
+        Avatar.image_url,
+        Avatar.provider,
+        Avatar.provider_id,
+        Avatar.is_predesigned,
+        Avatar.is_public,
+        cast(null(), Integer).label("avatar_id"),
+        Avatar.created_at,
+        Avatar.updated_at,
+    ).where(Avatar.user_id == user_id)
+
+    # ORDER BY and LIMIT of a UNION member need a subquery on SQLite
+    recent = (
+        select(
+            Conversation.id,
+            Conversation.title,
+            Conversation.avatar_id,
+            Conversation.created_at,
+            Conversation.updated_at,
+        )
+        .where(Conversation.user_id == user_id)
+        .order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+        .limit(RECENT_CONVERSATIONS)
+        .subquery()
+    )
+    conversations = select(
+        literal("conversation").label("kind"),
+        recent.c.id,
+        recent.c.title,
+        cast(null(), Text),
+        cast(null(), String),
+        cast(null(), String),
+        cast(null(), String),
+        cast(null(), Boolean),
+        cast(null(), Boolean),
+        recent.c.avatar_id,
+        recent.c.created_at,
+        recent.c.updated_at,
+    )
+    return union_all(avatars, conversations)
+
+
+def _load(db: Session, user_id: int) -> Dict[str, List[Dict[str, Any]]]:
+    avatars, conversations = [], []
+    for row in db.execute(_dashboard_query(user_id)):
+        if row.kind == "avatar":
+            avatars.append(AvatarSummary.model_validate(row))
+        else:
+            conversations.append(ConversationSummary(
+                id=row.id,
+                title=row.name,
+                avatar_id=row.avatar_id,
+                created_at=row.created_at,
+                updated_at=row.updated_at,
+            ))
+    avatars.sort(key=lambda avatar: avatar.id)
+    conversations.sort(key=lambda conversation: (conversation.updated_at, conversation.id), reverse=True)
+    # Plain JSON values, as the Redis cache stores them
+    return {
+        "avatars": [avatar.model_dump(mode="json") for avatar in avatars],
+        "recent_conversations": [conversation.model_dump(mode="json") for conversation in conversations],
+    }
+
+
+def load_dashboard(db: Session, user_id: int) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    The user's avatar cards and recent conversations, from the cache or one query on a miss
+    """
+    dashboard = dashboard_cache.get(user_id)
+    if dashboard is None:
+        dashboard = _load(db, user_id)
+        dashboard_cache.set(user_id, dashboard)
+    return dashboard
+
+
+def invalidate_dashboard(user_id: int) -> None:
+    dashboard_cache.delete(user_id)
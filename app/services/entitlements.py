@@ -0,0 +1,84 @@
+"""
+Entitlements: what the current user's subscription tier allows.
+
+Resolved from the cached principal (see app/core/principal.py), so gating a
+request on the user's tier costs no queries. A subscription past its end_date
+counts as expired without writing anything; its row keeps is_active until the
+user's next subscribe or cancel deactivates it.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.core.principal import Principal
+from app.models.subscription import SubscriptionType
+
+# Providers whose avatars and demos require a premium subscription
+PREMIUM_PROVIDERS = {"SOUL_MACHINES"}
+
+# Custom avatar limits per tier (None means no subscription)
+MAX_AVATARS = {
+    None: 3,
+    SubscriptionType.BASIC: 3,
+    SubscriptionType.PREMIUM: 10,
+}
+
+
+def _features(tier: Optional[SubscriptionType]) -> Dict[str, bool]:
+    has_subscription = tier is not None
+    is_premium = tier == SubscriptionType.PREMIUM
+    return {
+        "avatar_creation": True,  # Basic feature available to all
+        "avatar_customization": True,  # Basic feature available to all
+        "video_recording": has_subscription,  # Requires any subscription
+        "live_interaction": is_premium,  # Requires premium
+        "object_recognition": is_premium,  # Requires premium
+        "memory": is_premium,  # Requires premium
+    }
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    tier: Optional[SubscriptionType] = None
+    subscription: Optional[Dict[str, Any]] = None
+    features: Dict[str, bool] = field(default_factory=lambda: _features(None))
+
+    @property
+    def has_subscription(self) -> bool:
+        return self.tier is not None
+
+    @property
+    def is_premium(self) -> bool:
+        return self.tier == SubscriptionType.PREMIUM
+
+    @property
+    def max_avatars(self) -> int:
+        return MAX_AVATARS[self.tier]
+
+    def can_access_provider(self, provider: str) -> bool:
+        return provider not in PREMIUM_PROVIDERS or self.is_premium
+
+
+def is_expired(subscription: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    end_date = subscription.get("end_date")
+    if end_date is None:
+        return False
+    if end_date.tzinfo is None:
+        # SQLite returns naive datetimes; they are stored as UTC
+        end_date = end_date.replace(tzinfo=timezone.utc)
+    return end_date <= (now or datetime.now(timezone.utc))
+
+
+def resolve_entitlements(principal: Principal) -> Entitlements:
+    """
+    Resolve the principal's entitlements; a lapsed subscription grants nothing
+    """
+    subscription = principal.subscription
+    if subscription is not None and is_expired(subscription):
+        subscription = None
+
+    if subscription is None:
+        return Entitlements()
+
+    tier = subscription["type"]
+    return Entitlements(tier=tier, subscription=subscription, features=_features(tier))
@@ -0,0 +1,177 @@
+"""
+Gallery of pre-designed avatars: the curated avatars of the catalog file
+(app/services/catalog.py) plus those listed on AKOOL.
+
+The gallery only varies by subscription tier and provider filter, so every
+(tier, provider) list is filtered and serialized once, when the catalog
+changes, together with a strong ETag; a request then costs a dict lookup and
+clients revalidate with If-None-Match for a 304. Avatars are also indexed by id.
+
+When AKOOL is configured, its avatar list is fetched in the background every
+GALLERY_REFRESH_INTERVAL seconds and merged into the catalog, instead of
+being requested per page view.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.retry import CircuitOpenError
+from app.models.subscription import SubscriptionType
+from app.services.catalog import CatalogStore, catalog_store
+from app.services.entitlements import Entitlements
+from app.services.providers import ProviderError, get_provider
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("AKOOL", "SOUL_MACHINES")
+TIERS = (None, SubscriptionType.BASIC, SubscriptionType.PREMIUM)
+
+# Ids of avatars discovered on AKOOL are derived from their provider id, so
+# every API worker assigns the same ones
+_PROVIDER_ID_BASE = 1_000_000
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """
+    A serialized gallery response: the JSON body and its strong ETag
+    """
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, value: Any) -> "CatalogEntry":
+        body = json.dumps(value, separators=(",", ":")).encode()
+        return cls(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+_EMPTY = CatalogEntry.of([])
+
+
+class GalleryCatalog:
+    def __init__(self, store: CatalogStore):
+        self._store = store
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed_at: Optional[float] = None
+        # AKOOL's avatar list as of the last refresh
+        self._listed: List[Dict[str, Any]] = []
+        self._rebuild()
+        store.on_reload(lambda catalog: self._rebuild())
+
+    def _build(self, avatars: Iterable[Dict[str, Any]]) -> None:
+        avatars = list(avatars)
+        by_id = {avatar["id"]: avatar for avatar in avatars}
+        entries = {avatar_id: CatalogEntry.of(avatar) for avatar_id, avatar in by_id.items()}
+        lists: Dict[Tuple[Optional[SubscriptionType], Optional[str]], CatalogEntry] = {}
+        for tier in TIERS:
+            entitlements = Entitlements(tier=tier)
+            visible = [a for a in avatars if entitlements.can_access_provider(a["provider"])]
+            lists[tier, None] = CatalogEntry.of(visible)
+            for provider in PROVIDERS:
+                lists[tier, provider] = CatalogEntry.of([a for a in visible if a["provider"] == provider])
+        # Swapped in together, so readers never see a half-built catalog
+        self._by_id, self._entries, self._lists = by_id, entries, lists
+
+    def get(self, avatar_id: int) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(avatar_id)
+
+    def entry(self, avatar_id: int) -> Optional[CatalogEntry]:
+        return self._entries.get(avatar_id)
+
+    def list_entry(self, entitlements: Entitlements, provider: Optional[str] = None) -> CatalogEntry:
+        """
+        The gallery visible to `entitlements`, optionally for one provider
+        """
+        return self._lists.get((entitlements.tier, provider), _EMPTY)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    async def refresh(self) -> None:
+        """
+        Fetch AKOOL's current avatar list and rebuild the gallery with it
+        """
+        akool = get_provider("AKOOL")
+        if akool is None:
+            return
+        listed: List[Dict[str, Any]] = []
+        page_size = 100
+        while len(listed) < settings.GALLERY_MAX_PROVIDER_AVATARS:
+            page = await akool.get_avatars(limit=page_size, offset=len(listed))
+            listed.extend(page)
+            if len(page) < page_size:
+                break
+        listed = listed[:settings.GALLERY_MAX_PROVIDER_AVATARS]
+
+        self._listed = listed
+        self._rebuild()
+        self.refreshed_at = time.time()
+
+    def _rebuild(self) -> None:
+        """
+        Merge the last AKOOL list into the curated avatars of the catalog file
+        """
+        curated = self._store.catalog.avatars
+        by_provider_id = {(a["provider"], a["provider_id"]): a for a in curated}
+        avatars = {a["id"]: a for a in curated}
+        for item in self._listed:
+            avatar = by_provider_id.get(("AKOOL", item["id"]))
+            if avatar is not None:
+                # The provider's image is current, the curated copy may not be
+                avatars[avatar["id"]] = {**avatar, "image_url": item.get("thumbnail_url") or avatar["image_url"]}
+                continue
+            avatar_id = _PROVIDER_ID_BASE + zlib.crc32(item["id"].encode()) % 1_000_000_000
+            if avatar_id in avatars:
+                logger.warning(f"Skipping AKOOL avatar {item['id']}: its gallery id collides")
+                continue
+            avatars[avatar_id] = {
+                "id": avatar_id,
+                "name": item.get("name") or "AKOOL Avatar",
+                "description": item.get("description"),
+                "image_url": item.get("thumbnail_url"),
+                "provider": "AKOOL",
+                "provider_id": item["id"],
+                "is_predesigned": True,
+                "is_public": True,
+            }
+        self._build(avatars.values())
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except (ProviderError, CircuitOpenError) as e:
+                logger.warning(f"Gallery refresh failed, serving the previous catalog: {str(e)}")
+            except Exception:
+                logger.exception("Gallery refresh failed, serving the previous catalog")
+            await asyncio.sleep(settings.GALLERY_REFRESH_INTERVAL)
+
+    def start(self) -> None:
+        if get_provider("AKOOL") is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "avatars": len(self),
+            "refreshing": self._task is not None,
+            "refreshed_at": self.refreshed_at,
+        }
+
+
+gallery_catalog = GalleryCatalog(catalog_store)
@@ -0,0 +1,195 @@
+"""
+Resized WebP (and AVIF, when Pillow can write it) variants of uploaded images.
+
+A variant's name is derived from its source's content hash, e.g.
+`09/09af...d1df.png` -> `09/09af...d1df-thumb.webp`, so a rendered variant never
+goes stale and is cached on disk and by clients forever. Variants are rendered
+in a process pool, since decoding, resizing and encoding hold the GIL for tens
+of milliseconds per image: right after an upload, and on demand by the media
+server (app/api/uploads.py) when one is requested before it exists.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.services.storage import media_path, media_url
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels, largest first: each size is resized from the previous one
+VARIANT_SIZES: Dict[str, int] = {"medium": 768, "thumb": 256}
+
+_SOURCE_KEY = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{64})\.(jpg|png|gif|webp)$")
+_VARIANT_KEY = re.compile(r"^([0-9a-f]{2})/([0-9a-f]{64})-([a-z]+)\.([a-z]+)$")
+
+
+def _writable_formats() -> List[str]:
+    Image.init()
+    return [fmt for fmt in ("webp", "avif") if fmt.upper() in Image.SAVE]
+
+
+VARIANT_FORMATS = _writable_formats()
+
+
+def variant_key(key: str, size: str, fmt: str) -> str:
+    stem, _ = os.path.splitext(key)
+    return f"{stem}-{size}.{fmt}"
+
+
+def image_variants(image_url: Optional[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    URLs of the variants of an uploaded image, by size and format, or None when
+    the image is not in media storage (e.g. a provider's thumbnail)
+    """
+    prefix = media_url("")
+    if not image_url or not image_url.startswith(prefix):
+        return None
+    key = image_url[len(prefix):]
+    if not _SOURCE_KEY.match(key):
+        return None
+    return {
+        size: {fmt: media_url(variant_key(key, size, fmt)) for fmt in VARIANT_FORMATS}
+        for size in VARIANT_SIZES
+    }
+
+
+# Worker-process function; it must stay module-level so it can be pickled
+
+def _render(source: str, targets: List[Tuple[int, str, str]]) -> None:
+    with Image.open(source) as image:
+        # First frame of animations, upright, in a mode both encoders accept
+        image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        for max_side, fmt, path in targets:
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            temp = f"{path}.{uuid.uuid4().hex}.tmp"
+            image.save(temp, format=fmt.upper(), quality=settings.IMAGE_VARIANT_QUALITY)
+            os.replace(temp, path)
+
+
+class ImageVariantRenderer:
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Renders in progress by source key, so concurrent requests share one
+        self._rendering: Dict[str, "asyncio.Future[None]"] = {}
+        self._background: Set["asyncio.Task[None]"] = set()
+        self._rendered = 0
+        self._failed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # "spawn" avoids forking a process that is running an event loop and threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    async def render(self, key: str) -> None:
+        """
+        Render the missing variants of the media file `key`
+        """
+        future = self._rendering.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(key))
+            self._rendering[key] = future
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+        # A cancelled request must not cancel the render other requests wait on
+        await asyncio.shield(future)
+
+    async def _render(self, key: str) -> None:
+        targets = [
+            (max_side, fmt, str(media_path(variant_key(key, size, fmt))))
+            for size, max_side in VARIANT_SIZES.items()
+            for fmt in VARIANT_FORMATS
+        ]
+        missing = await asyncio.to_thread(lambda: [t for t in targets if not os.path.exists(t[2])])
+        if not missing:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            await loop.run_in_executor(executor, _render, str(media_path(key)), missing)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for its memory use); the next render starts a fresh pool
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            self._failed += 1
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        self._rendered += 1
+
+    def schedule(self, key: str) -> None:
+        """
+        Render the variants of a new upload in the background
+        """
+        task = asyncio.create_task(self._render_logged(key))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _render_logged(self, key: str) -> None:
+        try:
+            await self.render(key)
+        except Exception:
+            logger.exception(f"Rendering variants of {key} failed")
+
+    async def render_variant(self, key: str) -> Optional[Path]:
+        """
+        Path of the variant `key` (as in variant_key()), rendering it first if
+        needed; None when it does not name a variant of an image that can be
+        rendered
+        """
+        match = _VARIANT_KEY.match(key)
+        if not match or match.group(3) not in VARIANT_SIZES or match.group(4) not in VARIANT_FORMATS:
+            return None
+        prefix, digest = match.group(1), match.group(2)
+        sources = await asyncio.to_thread(
+            lambda: [p for p in media_path(prefix).glob(f"{digest}.*") if _SOURCE_KEY.match(f"{prefix}/{p.name}")]
+        )
+        if not sources:
+            return None
+        source = f"{prefix}/{sources[0].name}"
+        try:
+            await self.render(source)
+        except Exception:
+            # e.g. an upload with image magic bytes that Pillow cannot decode
+            logger.warning(f"Rendering variants of {source} failed", exc_info=True)
+            return None
+        return media_path(key)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "formats": VARIANT_FORMATS,
+            "sizes": VARIANT_SIZES,
+            "rendering": len(self._rendering),
+            "rendered": self._rendered,
+            "failed": self._failed,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+image_renderer = ImageVariantRenderer(max_workers=settings.IMAGE_VARIANT_WORKERS or os.cpu_count() or 1)
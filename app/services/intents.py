@@ -0,0 +1,71 @@
+"""
+Intent routing for the beginner bot (POST /api/bot/chat).
+
+The intents, with their keywords, priority, reply and suggestions, are data in
+the catalog file (app/services/catalog.py). When the catalog is loaded their
+keywords are compiled into one index from word to intents, so routing a message
+tokenizes it once (with the tokenizer of app/services/recommendations.py) and
+looks up each word, whatever the number of intents. Keywords match whole words,
+so "hi" does not match "this".
+
+The intent with the highest priority among those matched wins; ties go to the
+intent matching more of the message. The confidence reported with a reply is
+the share of the message's words that matched the chosen intent.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from app.services.recommendations import tokenize
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    priority: int
+    message: str
+    suggestions: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class IntentMatch:
+    intent: Intent
+    confidence: float
+
+    def reply(self) -> Dict[str, Any]:
+        return {
+            "message": self.intent.message,
+            "suggestions": list(self.intent.suggestions),
+            "intent": self.intent.name,
+            "confidence": round(self.confidence, 2),
+        }
+
+
+class IntentRouter:
+    def __init__(self, intents: Sequence[Mapping[str, Any]], fallback: Mapping[str, Any]):
+        self.intents = tuple(
+            Intent(spec["name"], spec["priority"], spec["message"], tuple(spec["suggestions"]))
+            for spec in intents
+        )
+        self.fallback = Intent("fallback", 0, fallback["message"], tuple(fallback["suggestions"]))
+        # Word -> indexes of the intents it belongs to
+        index: Dict[str, List[int]] = {}
+        for i, spec in enumerate(intents):
+            for keyword in spec["keywords"]:
+                words = tokenize(keyword)
+                if len(words) != 1:
+                    raise ValueError(f"Keyword {keyword!r} of intent {spec['name']!r} must be a single word")
+                if i not in index.setdefault(words[0], []):
+                    index[words[0]].append(i)
+        self._index = {word: tuple(intents) for word, intents in index.items()}
+
+    def route(self, text: str) -> IntentMatch:
+        words = tokenize(text)
+        hits: Dict[int, int] = {}
+        for word in words:
+            for i in self._index.get(word, ()):
+                hits[i] = hits.get(i, 0) + 1
+        if not hits:
+            return IntentMatch(self.fallback, 0.0)
+        # Highest priority, then most words matched, then first in the catalog
+        best = max(hits, key=lambda i: (self.intents[i].priority, hits[i], -i))
+        return IntentMatch(self.intents[best], hits[best] / len(words))
@@ -0,0 +1,403 @@
+"""
+Durable background jobs stored in the database.
+
+API handlers enqueue jobs and return at once; worker processes
+(`python -m app.worker`) claim due jobs and run the handler registered for the
+job's type. Claiming is a single UPDATE of the oldest due row (with
+`FOR UPDATE SKIP LOCKED` on PostgreSQL), so any number of workers can share the
+table. A claimed job is leased for JOB_LEASE_SECONDS; if its worker dies, the
+lease expires and another worker picks the job up.
+
+A failed job is retried after a jittered backoff until it has used
+`max_attempts`, then dead-lettered: it stays in the table with status DEAD and
+its last error, and can be requeued. Handlers raise PermanentJobError for
+failures that retrying cannot fix. The handler's database changes are committed
+together with the job's completion, and only while the worker still holds the
+lease.
+
+Owners are notified of finished jobs with a {"type": "job"} frame on their
+WebSockets; with workers in separate processes this needs REDIS_URL.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.retry import RetryPolicy
+from app.db.session import AsyncSessionLocal
+from app.models.job import Job, JobStatus
+from app.schemas.job import Job as JobSchema
+from app.services.realtime import connection_manager
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[AsyncSession, Job], Awaitable[Optional[Dict[str, Any]]]]
+CompletionHook = Callable[[Job], None]
+
+_handlers: Dict[str, JobHandler] = {}
+_completion_hooks: Dict[str, CompletionHook] = {}
+
+# Only its backoff() is used, to space out attempts of a failing job
+_retry_backoff = RetryPolicy(base_delay=settings.JOB_RETRY_BASE_DELAY, max_delay=settings.JOB_RETRY_MAX_DELAY)
+
+# Workers running in this process, woken up when a job is enqueued here
+_local_workers: Set["JobWorker"] = set()
+
+
+class PermanentJobError(Exception):
+    """
+    A failure that retrying cannot fix; the job is dead-lettered at once
+    """
+
+
+def job_handler(job_type: str, on_complete: Optional[CompletionHook] = None) -> Callable[[JobHandler], JobHandler]:
+    """
+    Register the coroutine that runs jobs of `job_type`. It receives the worker's
+    session and the job, and returns the job's result. `on_complete` is called
+    with the finished job once its completion and the handler's changes are
+    committed, e.g. to invalidate caches of what the handler changed.
+    """
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[job_type] = handler
+        if on_complete is not None:
+            _completion_hooks[job_type] = on_complete
+        return handler
+    return register
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def enqueue(
+    db: AsyncSession,
+    user_id: int,
+    job_type: str,
+    payload: Dict[str, Any],
+    idempotency_key: Optional[str] = None,
+    max_attempts: Optional[int] = None,
+) -> Tuple[Job, bool]:
+    """
+    Store a job for the workers and commit. Returns the job and whether it was
+    created; with an idempotency key already used by the user, the existing job
+    is returned instead.
+    """
+    if idempotency_key:
+        existing = await find_by_idempotency_key(db, user_id, idempotency_key)
+        if existing is not None:
+            return existing, False
+
+    try:
+        job = await db.scalar(
+            insert(Job)
+            .values(
+                type=job_type,
+                status=JobStatus.QUEUED,
+                payload=payload,
+                idempotency_key=idempotency_key,
+                attempts=0,
+                max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+                run_at=_now(),
+                user_id=user_id,
+            )
+            .returning(Job)
+        )
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request with the same key won the race
+        await db.rollback()
+        existing = await find_by_idempotency_key(db, user_id, idempotency_key)
+        if existing is None:
+            raise
+        return existing, False
+
+    for worker in _local_workers:
+        worker.wake()
+    return job, True
+
+
+async def find_by_idempotency_key(db: AsyncSession, user_id: int, idempotency_key: str) -> Optional[Job]:
+    return await db.scalar(
+        select(Job).where(Job.user_id == user_id, Job.idempotency_key == idempotency_key)
+    )
+
+
+def _due(now: datetime):
+    return or_(
+        and_(Job.status == JobStatus.QUEUED, Job.run_at <= now),
+        # Abandoned by a worker that died or hung
+        and_(Job.status == JobStatus.RUNNING, Job.locked_until < now),
+    )
+
+
+async def claim_job(db: AsyncSession, worker_id: str, lease: float) -> Optional[Job]:
+    """
+    Lease the next due job to `worker_id` and commit, or return None
+    """
+    now = _now()
+    next_due = (
+        select(Job.id)
+        .where(_due(now))
+        .order_by(Job.run_at, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    job = await db.scalar(
+        update(Job)
+        # Re-checked so that, without row locks (SQLite), two workers cannot claim one job
+        .where(Job.id == next_due, _due(now))
+        .values(
+            status=JobStatus.RUNNING,
+            attempts=Job.attempts + 1,
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease),
+        )
+        .returning(Job)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    await db.commit()
+    return job
+
+
+def _owned(job_id: int, worker_id: str):
+    return update(Job).where(
+        Job.id == job_id,
+        Job.status == JobStatus.RUNNING,
+        Job.locked_by == worker_id,
+    )
+
+
+async def complete_job(db: AsyncSession, job: Job, worker_id: str, result: Optional[Dict[str, Any]]) -> Optional[Job]:
+    """
+    Mark the job succeeded and commit it with the handler's changes. Returns
+    None, discarding the changes, if the lease was lost to another worker.
+    """
+    finished = await db.scalar(
+        _owned(job.id, worker_id)
+        .values(
+            status=JobStatus.SUCCEEDED,
+            result=result,
+            error=None,
+            locked_by=None,
+            locked_until=None,
+            finished_at=_now(),
+        )
+        .returning(Job)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    if finished is None:
+        await db.rollback()
+        return None
+    await db.commit()
+    return finished
+
+
+async def fail_job(db: AsyncSession, job: Job, worker_id: str, error: str, permanent: bool = False) -> Optional[Job]:
+    """
+    Schedule a retry of the job, or dead-letter it when it is out of attempts.
+    The handler's changes are rolled back.
+    """
+    # Read before the rollback expires the job
+    job_id, attempts, max_attempts = job.id, job.attempts, job.max_attempts
+    await db.rollback()
+    if permanent or attempts >= max_attempts:
+        values = dict(status=JobStatus.DEAD, finished_at=_now())
+    else:
+        delay = _retry_backoff.backoff(attempts - 1)
+        values = dict(status=JobStatus.QUEUED, run_at=_now() + timedelta(seconds=delay))
+    failed = await db.scalar(
+        _owned(job_id, worker_id)
+        .values(error=error[:2000], locked_by=None, locked_until=None, **values)
+        .returning(Job)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    await db.commit()
+    return failed
+
+
+async def requeue_job(db: AsyncSession, job_id: int) -> Optional[Job]:
+    """
+    Give a dead job a fresh set of attempts. Returns None if it is not dead.
+    """
+    job = await db.scalar(
+        update(Job)
+        .where(Job.id == job_id, Job.status == JobStatus.DEAD)
+        .values(status=JobStatus.QUEUED, attempts=0, run_at=_now(), finished_at=None)
+        .returning(Job)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    await db.commit()
+    if job is not None:
+        for worker in _local_workers:
+            worker.wake()
+    return job
+
+
+def job_frame(job: Job) -> Dict[str, Any]:
+    return {"type": "job", "job": JobSchema.model_validate(job).model_dump(mode="json")}
+
+
+class JobWorker:
+    """
+    Runs jobs with up to `concurrency` handlers at a time
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.JOB_WORKER_CONCURRENCY,
+        poll_interval: float = settings.JOB_POLL_INTERVAL,
+        lease: float = settings.JOB_LEASE_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self._stats = {"succeeded": 0, "retried": 0, "dead": 0, "lost": 0}
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        _local_workers.add(self)
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+        logger.info(f"Job worker {self.worker_id} started with concurrency {self.concurrency}")
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """
+        Stop claiming jobs and give running ones `timeout` seconds to finish.
+        Jobs cut short are picked up again once their lease expires.
+        """
+        self._stopping = True
+        _local_workers.discard(self)
+        self._wakeup.set()
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self) -> None:
+        while not self._stopping:
+            try:
+                ran = await self.run_once()
+            except Exception as e:
+                # Typically the database is unreachable; try again after a pause
+                logger.error(f"Job worker {self.worker_id} could not claim a job: {str(e)}")
+                ran = False
+            if ran or self._stopping:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> bool:
+        """
+        Claim and run one job. Returns False if none was due.
+        """
+        async with AsyncSessionLocal() as db:
+            job = await claim_job(db, self.worker_id, self.lease)
+            if job is None:
+                return False
+            self._running += 1
+            try:
+                finished = await self._run(db, job)
+            finally:
+                self._running -= 1
+        if finished is not None and finished.status in (JobStatus.SUCCEEDED, JobStatus.DEAD):
+            try:
+                await connection_manager.send_to_user(finished.user_id, job_frame(finished))
+            except Exception as e:
+                logger.warning(f"Could not notify user {finished.user_id} about job {finished.id}: {str(e)}")
+        return True
+
+    async def _run(self, db: AsyncSession, job: Job) -> Optional[Job]:
+        handler = _handlers.get(job.type)
+        if handler is None:
+            return await self._fail(db, job, f"No handler for job type '{job.type}'", permanent=True)
+        if job.attempts > job.max_attempts:
+            # Its lease kept expiring, e.g. because it crashes the worker
+            return await self._fail(db, job, job.error or "Ran out of attempts", permanent=True)
+
+        job_id, job_type = job.id, job.type
+        try:
+            result = await asyncio.wait_for(handler(db, job), timeout=self.lease)
+        except PermanentJobError as e:
+            return await self._fail(db, job, str(e), permanent=True)
+        except asyncio.TimeoutError:
+            return await self._fail(db, job, f"Timed out after {self.lease:.0f}s")
+        except Exception as e:
+            logger.exception(f"Job {job_id} ({job_type}) failed")
+            return await self._fail(db, job, f"{type(e).__name__}: {str(e)}")
+
+        finished = await complete_job(db, job, self.worker_id, result)
+        if finished is None:
+            self._stats["lost"] += 1
+            logger.warning(f"Job {job_id} finished after its lease passed to another worker; result discarded")
+        else:
+            self._stats["succeeded"] += 1
+            hook = _completion_hooks.get(job_type)
+            if hook is not None:
+                try:
+                    hook(finished)
+                except Exception as e:
+                    logger.warning(f"Completion hook of job {job_id} ({job_type}) failed: {str(e)}")
+        return finished
+
+    async def _fail(self, db: AsyncSession, job: Job, error: str, permanent: bool = False) -> Optional[Job]:
+        job_id, job_type, attempts = job.id, job.type, job.attempts
+        failed = await fail_job(db, job, self.worker_id, error, permanent)
+        if failed is None:
+            self._stats["lost"] += 1
+        elif failed.status == JobStatus.DEAD:
+            self._stats["dead"] += 1
+            logger.error(f"Job {job_id} ({job_type}) dead-lettered after {attempts} attempt(s): {error}")
+        else:
+            self._stats["retried"] += 1
+            logger.warning(f"Job {job_id} ({job_type}) failed, retrying at {failed.run_at}: {error}")
+        return failed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "running": self._running,
+            **self._stats,
+        }
+
+
+async def queue_stats(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Jobs per status and the age of the oldest due job
+    """
+    counts = {status.value: 0 for status in JobStatus}
+    for status, count in (await db.execute(select(Job.status, func.count()).group_by(Job.status))).all():
+        counts[status.value] = count
+    oldest = await db.scalar(
+        select(func.min(Job.run_at)).where(Job.status == JobStatus.QUEUED, Job.run_at <= _now())
+    )
+    if oldest is not None and oldest.tzinfo is None:
+        # SQLite returns naive UTC datetimes
+        oldest = oldest.replace(tzinfo=timezone.utc)
+    return {
+        "jobs": counts,
+        "oldest_due_seconds": round((_now() - oldest).total_seconds(), 1) if oldest is not None else 0.0,
+    }
@@ -0,0 +1,224 @@
+"""
+Find a user's products mentioned in a chat message.
+
+Each user's product names are compiled into an Aho–Corasick automaton, so a
+message is scanned once regardless of how many products the user has, and all
+mentions are found with their positions. Matching is case-insensitive and, like
+before, on substrings.
+
+Matchers are cached per user in the worker. The product endpoints update the
+cached matcher in place and bump a version stored in the shared cache, so other
+workers notice the change and reload the names from the database. Edits do not
+rebuild the automaton: added or renamed products are scanned for directly and
+removed ones filtered out, until enough edits pile up to make a rebuild
+worthwhile.
+"""
+import threading
+import uuid
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache, create_cache, get_redis_client, unshared_ttl
+from app.core.config import settings
+from app.models.product import Product
+
+# Edits absorbed before the automaton is rebuilt
+REBUILD_AFTER_EDITS = 64
+
+
+class ProductMatch(NamedTuple):
+    product_id: int
+    name: str
+    start: int  # offsets into the message
+    end: int
+
+
+def _fold(text: str) -> str:
+    # Lowercase character by character so offsets still line up with the original text
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+class ProductMatcher:
+    def __init__(self, products: Iterable[Tuple[int, str]] = (), version: Optional[str] = None):
+        self.version = version
+        self._names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._automaton = None
+        # Edits since the automaton was built
+        self._added: Dict[int, str] = {}
+        self._removed: Set[int] = set()
+        for product_id, name in products:
+            self._names[product_id] = name
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, product_id: int, name: str) -> None:
+        """
+        Add a product or change its name
+        """
+        with self._lock:
+            self._names[product_id] = name
+            if self._automaton is not None:
+                self._removed.add(product_id)
+                self._added[product_id] = _fold(name or "")
+                self._rebuild_if_stale()
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            self._names.pop(product_id, None)
+            if self._automaton is not None:
+                self._added.pop(product_id, None)
+                self._removed.add(product_id)
+                self._rebuild_if_stale()
+
+    def _rebuild_if_stale(self) -> None:
+        if len(self._added) + len(self._removed) > REBUILD_AFTER_EDITS:
+            # Built on the next find()
+            self._automaton = None
+            self._added.clear()
+            self._removed.clear()
+
+    def _build(self):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        lengths: Dict[int, int] = {}
+        for product_id, name in self._names.items():
+            pattern = _fold(name or "")
+            if not pattern:
+                continue
+            node = 0
+            for char in pattern:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto[node][char] = child
+                    goto.append({})
+                    outputs.append([])
+                node = child
+            outputs[node].append(product_id)
+            lengths[product_id] = len(pattern)
+
+        # Failure links, plus a link to the nearest suffix node that ends a pattern
+        fail = [0] * len(goto)
+        output_link = [-1] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                output_link[child] = fail[child] if outputs[fail[child]] else output_link[fail[child]]
+                queue.append(child)
+        return goto, fail, outputs, output_link, lengths
+
+    def find(self, text: str) -> List[ProductMatch]:
+        """
+        All mentions in `text`, ordered by position; overlapping names all match
+        """
+        with self._lock:
+            if self._automaton is None:
+                self._automaton = self._build()
+            goto, fail, outputs, output_link, lengths = self._automaton
+            names = dict(self._names)
+            added = dict(self._added)
+            removed = set(self._removed)
+
+        folded = _fold(text)
+        matches = []
+        node = 0
+        for index, char in enumerate(folded):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            state = node if outputs[node] else output_link[node]
+            while state > 0:
+                for product_id in outputs[state]:
+                    if product_id not in removed:
+                        length = lengths[product_id]
+                        matches.append(ProductMatch(product_id, names[product_id], index + 1 - length, index + 1))
+                state = output_link[state]
+
+        for product_id, pattern in added.items():
+            if not pattern:
+                continue
+            start = folded.find(pattern)
+            while start != -1:
+                matches.append(ProductMatch(product_id, names[product_id], start, start + len(pattern)))
+                start = folded.find(pattern, start + 1)
+
+        matches.sort(key=lambda match: (match.start, -match.end))
+        return matches
+
+
+# Compiled matchers stay in the worker; only the small version tokens are shared.
+# Without Redis the versions are not shared either, so other workers' matchers
+# must expire on their own.
+product_matchers = TTLCache(
+    "product_matcher",
+    ttl=settings.PRODUCT_MATCHER_TTL if get_redis_client() is not None else unshared_ttl(settings.PRODUCT_MATCHER_TTL),
+    maxsize=settings.PRODUCT_MATCHER_CACHE_SIZE,
+)
+_versions = create_cache("product_matcher_version", ttl=24 * 3600)
+
+
+def _cached_matcher(user_id: int) -> Tuple[Optional[ProductMatcher], Optional[str]]:
+    version = _versions.get(user_id)
+    matcher = product_matchers.get(user_id)
+    if matcher is not None and matcher.version == version:
+        return matcher, version
+    return None, version
+
+
+def _names_query(user_id: int):
+    return select(Product.id, Product.name).where(Product.user_id == user_id)
+
+
+def get_product_matcher(db: Session, user_id: int) -> ProductMatcher:
+    matcher, version = _cached_matcher(user_id)
+    if matcher is None:
+        matcher = ProductMatcher(db.execute(_names_query(user_id)).all(), version)
+        product_matchers.set(user_id, matcher)
+    return matcher
+
+
+async def get_product_matcher_async(db: AsyncSession, user_id: int) -> ProductMatcher:
+    matcher, version = _cached_matcher(user_id)
+    if matcher is None:
+        matcher = ProductMatcher((await db.execute(_names_query(user_id))).all(), version)
+        product_matchers.set(user_id, matcher)
+    return matcher
+
+
+def _bump_version(user_id: int) -> Optional[ProductMatcher]:
+    version = uuid.uuid4().hex
+    _versions.set(user_id, version)
+    matcher = product_matchers.get(user_id)
+    if matcher is not None:
+        matcher.version = version
+    return matcher
+
+
+def product_saved(product: Product) -> None:
+    """
+    Call after committing a new or renamed product
+    """
+    matcher = _bump_version(product.user_id)
+    if matcher is not None:
+        matcher.add(product.id, product.name)
+
+
+def product_deleted(user_id: int, product_id: int) -> None:
+    """
+    Call after committing a product deletion
+    """
+    matcher = _bump_version(user_id)
+    if matcher is not None:
+        matcher.remove(product_id)
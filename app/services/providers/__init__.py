@@ -0,0 +1,48 @@
+"""
+Clients for the external avatar providers, one pooled client per provider.
+
+Look clients up by the provider name stored on avatars ("AKOOL",
+"SOUL_MACHINES"). A provider whose API key is not set is not `configured`, and
+callers keep their local behaviour for it.
+"""
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.services.providers.akool import AkoolClient
+from app.services.providers.base import ProviderClient, ProviderError
+from app.services.providers.soul_machines import SoulMachinesClient
+
+akool = AkoolClient(
+    settings.AKOOL_BASE_URL,
+    settings.AKOOL_API_KEY,
+    max_concurrency=settings.AKOOL_MAX_CONCURRENCY,
+)
+soul_machines = SoulMachinesClient(
+    settings.SOUL_MACHINES_BASE_URL,
+    settings.SOUL_MACHINES_API_KEY,
+    max_concurrency=settings.SOUL_MACHINES_MAX_CONCURRENCY,
+)
+
+providers: Dict[str, ProviderClient] = {
+    client.name: client for client in (akool, soul_machines)
+}
+
+
+def get_provider(name: str) -> Optional[ProviderClient]:
+    """
+    The client for provider `name`, or None if it is unknown or not configured
+    """
+    client = providers.get(name)
+    if client is None or not client.configured:
+        return None
+    return client
+
+
+async def close_providers() -> None:
+    for client in providers.values():
+        await client.aclose()
+
+
+def provider_stats() -> Dict[str, Any]:
+    return {name: client.stats() for name, client in providers.items()}
+
@@ -0,0 +1,43 @@
+"""
+AKOOL: avatar gallery and video generation for basic-tier avatars.
+"""
+from typing import Any, Dict, Optional
+
+from app.services.providers.base import ProviderClient
+
+
+class AkoolClient(ProviderClient):
+    name = "AKOOL"
+
+    async def get_avatars(self, limit: int = 10, offset: int = 0) -> Any:
+        """
+        Avatars available on AKOOL
+        """
+        return await self.get("/avatars", params={"limit": limit, "offset": offset})
+
+    async def create_avatar(self, name: str, photo: bytes, filename: str, content_type: str) -> Any:
+        """
+        Create a custom avatar from a photo
+        """
+        return await self.request(
+            "POST",
+            "/avatars",
+            data={"name": name},
+            files={"photo": (filename, photo, content_type)},
+        )
+
+    async def create_video(self, avatar_id: str, text: str, options: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Start generating a video of the avatar speaking `text`
+        """
+        return await self.request(
+            "POST",
+            "/videos",
+            json={"avatar_id": avatar_id, "text": text, "options": options or {}},
+        )
+
+    async def get_video(self, video_id: str) -> Any:
+        """
+        Status (and URL, once ready) of a generated video
+        """
+        return await self.get(f"/videos/{video_id}")
@@ -0,0 +1,291 @@
+"""
+Pooled async HTTP client shared by the avatar providers.
+
+Each provider gets one httpx.AsyncClient per worker, so TLS connections are
+kept alive and reused instead of being opened for every call. On top of the
+connection pool:
+
+- a semaphore caps the requests in flight to the provider; callers wait at most
+  PROVIDER_POOL_TIMEOUT for a slot, then fail fast instead of queueing;
+- connect, read and pool timeouts bound every attempt;
+- transient failures (connection errors, timeouts, 429 and 5xx) are retried
+  with jittered exponential backoff. Requests that are not idempotent are only
+  retried when the provider cannot have processed them (the connection was
+  never made, or the provider answered 429/503);
+- a circuit breaker per provider fails calls fast while the provider is down;
+- identical GETs already in flight are coalesced into one upstream request.
+"""
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.retry import CircuitBreaker, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# Statuses meaning the provider did not process the request
+_NOT_PROCESSED_STATUSES = {429, 503}
+
+# Failures that happen before the request reaches the provider
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class ProviderError(Exception):
+    """
+    A provider call failed. `status_code` is None when no response was received.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        detail: str,
+        status_code: Optional[int] = None,
+        transient: bool = False,
+        sent: bool = True,
+    ):
+        super().__init__(f"{provider}: {detail}")
+        self.provider = provider
+        self.detail = detail
+        self.status_code = status_code
+        # Worth retrying (timeouts, 429, 5xx) as opposed to e.g. a 400 or 401
+        self.transient = transient
+        # False when the provider cannot have acted on the request
+        self.sent = sent
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, ProviderError) and exc.transient
+
+
+def _is_retry_safe(exc: BaseException) -> bool:
+    # For requests that must not be applied twice
+    return isinstance(exc, ProviderError) and exc.transient and not exc.sent
+
+
+class ProviderClient:
+    """
+    Async HTTP client for one provider's REST API
+    """
+
+    name = "provider"
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str],
+        max_concurrency: int = 10,
+        max_connections: int = settings.PROVIDER_MAX_CONNECTIONS,
+        max_keepalive: int = settings.PROVIDER_MAX_KEEPALIVE,
+        keepalive_expiry: float = settings.PROVIDER_KEEPALIVE_EXPIRY,
+        connect_timeout: float = settings.PROVIDER_CONNECT_TIMEOUT,
+        read_timeout: float = settings.PROVIDER_READ_TIMEOUT,
+        pool_timeout: float = settings.PROVIDER_POOL_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.pool_timeout = pool_timeout
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout)
+        self._transport = transport
+        self.breaker = CircuitBreaker(
+            f"provider:{self.name}",
+            failure_threshold=settings.PROVIDER_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.PROVIDER_BREAKER_RESET_TIMEOUT,
+        )
+        # The breaker is driven per attempt in _send, so the policies only decide what to retry
+        retry_options = dict(
+            max_attempts=settings.PROVIDER_RETRY_MAX_ATTEMPTS,
+            base_delay=settings.PROVIDER_RETRY_BASE_DELAY,
+            max_delay=settings.PROVIDER_RETRY_MAX_DELAY,
+            deadline=settings.PROVIDER_RETRY_DEADLINE,
+        )
+        self.retry_policy = RetryPolicy(retry_if=_is_retryable, **retry_options)
+        self.unsafe_retry_policy = RetryPolicy(retry_if=_is_retry_safe, **retry_options)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], asyncio.Task] = {}
+        self._active = 0
+        self._waiting = 0
+        self._stats = {"requests": 0, "retries": 0, "coalesced": 0, "errors": 0, "rejected": 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Pooled connections and the semaphore belong to the loop that created them
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else None,
+                limits=self._limits,
+                timeout=self._timeout,
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            try:
+                await self._client.aclose()
+            except RuntimeError:
+                # Created on an event loop that has since closed
+                pass
+            self._client = None
+            self._loop = None
+
+    @asynccontextmanager
+    async def _slot(self) -> AsyncIterator[httpx.AsyncClient]:
+        client = self._ensure_client()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.pool_timeout)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            raise ProviderError(self.name, "Too many requests in flight", transient=True, sent=False)
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        try:
+            yield client
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    async def _send(self, client: httpx.AsyncClient, request: httpx.Request, stream: bool) -> httpx.Response:
+        # One attempt; raises ProviderError for failures and error responses
+        self.breaker.before_call()
+        self._stats["requests"] += 1
+        try:
+            response = await client.send(request, stream=stream)
+        except httpx.TransportError as e:
+            self.breaker.record_failure()
+            raise ProviderError(
+                self.name,
+                f"{type(e).__name__} on {request.method} {request.url.path}",
+                transient=True,
+                sent=not isinstance(e, _NOT_SENT_ERRORS),
+            ) from e
+
+        if response.status_code < 400:
+            self.breaker.record_success()
+            return response
+
+        if stream:
+            await response.aread()
+            await response.aclose()
+        transient = response.status_code == 429 or response.status_code >= 500
+        if transient:
+            self.breaker.record_failure()
+        else:
+            # The provider answered; the request itself was wrong
+            self.breaker.record_success()
+        raise ProviderError(
+            self.name,
+            f"{request.method} {request.url.path} returned {response.status_code}: {response.text[:200]}",
+            status_code=response.status_code,
+            transient=transient,
+            sent=response.status_code not in _NOT_PROCESSED_STATUSES,
+        )
+
+    def _count_retry(self, exc: BaseException) -> None:
+        self._stats["retries"] += 1
+
+    async def _call(self, method: str, path: str, stream: bool = False, **kwargs: Any) -> httpx.Response:
+        client = self._ensure_client()
+        request = client.build_request(method, path, **kwargs)
+        policy = self.retry_policy if method in ("GET", "HEAD", "PUT", "DELETE") else self.unsafe_retry_policy
+        try:
+            return await policy.call_async(self._send, client, request, stream, on_retry=self._count_retry)
+        except ProviderError:
+            self._stats["errors"] += 1
+            raise
+
+    async def request(self, method: str, path: str, **kwargs: Any) -> Any:
+        """
+        Send a request and return the decoded JSON body
+        """
+        async with self._slot():
+            response = await self._call(method, path, **kwargs)
+        if not response.content:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            raise ProviderError(self.name, f"{method} {path} returned a body that is not JSON")
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        GET `path`, sharing the response with identical GETs already in flight.
+        The result may be shared between callers, so it must not be mutated.
+        """
+        self._ensure_client()
+        key = (path, tuple(sorted((k, str(v)) for k, v in (params or {}).items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.request("GET", path, params=params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._stats["coalesced"] += 1
+        # A caller that gives up does not cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller was cancelled
+            task.exception()
+
+    async def stream_json_lines(self, method: str, path: str, **kwargs: Any) -> AsyncIterator[Any]:
+        """
+        Send a request and yield the response as it arrives: one object per line
+        of an NDJSON body, or the whole body for a plain JSON response. Only
+        establishing the response is retried, never a partly consumed stream.
+        """
+        async with self._slot():
+            response = await self._call(method, path, stream=True, **kwargs)
+            try:
+                if response.headers.get("content-type", "").startswith("application/x-ndjson"):
+                    async for line in response.aiter_lines():
+                        if line.strip():
+                            yield json.loads(line)
+                else:
+                    await response.aread()
+                    yield response.json()
+            except httpx.HTTPError as e:
+                self._stats["errors"] += 1
+                self.breaker.record_failure()
+                raise ProviderError(self.name, f"Stream from {path} broke off: {type(e).__name__}", transient=True) from e
+            finally:
+                await response.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.configured,
+            "base_url": self.base_url,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._active,
+            "waiting": self._waiting,
+            "coalescing": len(self._inflight),
+            **self._stats,
+            "circuit_breaker": self.breaker.snapshot(),
+        }
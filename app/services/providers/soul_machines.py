@@ -0,0 +1,45 @@
+"""
+Soul Machines: digital people with real-time conversation for premium avatars.
+"""
+from typing import Any, AsyncIterator
+
+from app.services.providers.base import ProviderClient
+
+
+class SoulMachinesClient(ProviderClient):
+    name = "SOUL_MACHINES"
+
+    async def get_digital_people(self, limit: int = 10, offset: int = 0) -> Any:
+        """
+        Digital people available on Soul Machines
+        """
+        return await self.get("/digital-people", params={"limit": limit, "offset": offset})
+
+    async def create_conversation(self, digital_person_id: str) -> Any:
+        """
+        Start a conversation with a digital person
+        """
+        return await self.request("POST", "/conversations", json={"digital_person_id": digital_person_id})
+
+    async def send_message(self, conversation_id: str, message: str) -> Any:
+        """
+        Send a message and wait for the digital person's whole reply
+        """
+        return await self.request(
+            "POST",
+            f"/conversations/{conversation_id}/messages",
+            json={"content": message, "type": "text"},
+        )
+
+    async def stream_message(self, conversation_id: str, message: str) -> AsyncIterator[str]:
+        """
+        Send a message and yield the digital person's reply as it is generated
+        """
+        async for part in self.stream_json_lines(
+            "POST",
+            f"/conversations/{conversation_id}/messages",
+            json={"content": message, "type": "text"},
+            headers={"Accept": "application/x-ndjson"},
+        ):
+            if part.get("content"):
+                yield part["content"]
@@ -0,0 +1,342 @@
+"""
+Registry of open WebSockets and fan-out of frames to them.
+
+ConnectionManager tracks sockets per conversation and per user. Frames sent to
+a conversation or user go to the local sockets directly and are published on a
+pub/sub channel, so sockets held by other workers receive them as well. Each
+worker subscribes only to the channels of the sockets it holds.
+
+Every connection has a bounded send queue drained by its own task. A client
+that stops reading is disconnected once its queue is full, instead of
+buffering frames without limit or slowing down the other sockets. Idle
+connections are closed after WS_IDLE_TIMEOUT; the heartbeat sends a "ping"
+frame every WS_HEARTBEAT_INTERVAL and any frame from the client (e.g. "pong")
+counts as activity.
+
+The pub/sub backend is Redis when REDIS_URL is set and the optional `redis`
+package is installed, otherwise in-process (a single worker).
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import WebSocket, status
+
+from app.core.config import settings
+
+try:
+    import redis
+    import redis.asyncio as redis_async
+except ImportError:  # Optional dependency, only needed for multi-worker setups
+    redis = None
+    redis_async = None
+
+logger = logging.getLogger(__name__)
+
+Frame = Dict[str, Any]
+MessageHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class InMemoryPubSub:
+    """
+    Pub/sub within one process; enough when a single worker holds every socket
+    """
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+        self._channels: Set[str] = set()
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._handler = handler
+
+    async def stop(self) -> None:
+        self._handler = None
+        self._channels.clear()
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._channels.discard(channel)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        if self._handler is not None and channel in self._channels:
+            await self._handler(channel, message)
+
+
+class RedisPubSub:
+    """
+    Pub/sub through Redis, so frames reach sockets held by other workers
+    """
+
+    def __init__(self, url: str, prefix: str = "weholo:realtime"):
+        self.url = url
+        self.prefix = prefix
+        self._client: Optional["redis_async.Redis"] = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _channel(self, channel: str) -> str:
+        return f"{self.prefix}:{channel}"
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._client = redis_async.from_url(self.url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._listener = asyncio.create_task(self._listen(handler))
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def subscribe(self, channel: str) -> None:
+        try:
+            await self._pubsub.subscribe(self._channel(channel))
+        except redis.RedisError as e:
+            logger.error(f"Realtime subscribe to '{channel}' failed: {str(e)}")
+
+    async def unsubscribe(self, channel: str) -> None:
+        try:
+            await self._pubsub.unsubscribe(self._channel(channel))
+        except redis.RedisError as e:
+            logger.warning(f"Realtime unsubscribe from '{channel}' failed: {str(e)}")
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        try:
+            await self._client.publish(self._channel(channel), json.dumps(message))
+        except redis.RedisError as e:
+            # Sockets on other workers miss this frame; local ones already have it
+            logger.warning(f"Realtime publish to '{channel}' failed: {str(e)}")
+
+    async def _listen(self, handler: MessageHandler) -> None:
+        prefix = f"{self.prefix}:"
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(0.1)
+                    continue
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                channel = message["channel"].decode()
+                await handler(channel[len(prefix):], json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except redis.RedisError as e:
+                logger.error(f"Realtime listener error: {str(e)}")
+                await asyncio.sleep(1.0)
+            except Exception as e:
+                logger.error(f"Realtime listener failed to deliver a message: {str(e)}")
+
+
+def create_pubsub():
+    """
+    Create a pub/sub backend using Redis when configured, otherwise in-process
+    """
+    if settings.REDIS_URL:
+        if redis_async is not None:
+            return RedisPubSub(settings.REDIS_URL)
+        logger.warning("REDIS_URL is set but the 'redis' package is not installed; realtime fan-out is limited to this worker")
+    return InMemoryPubSub()
+
+
+class Connection:
+    """
+    One accepted WebSocket and its bounded send queue
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, conversation_id: Optional[int], queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._queue: "asyncio.Queue[Frame]" = asyncio.Queue(maxsize=queue_size)
+        self._sender: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def touch(self) -> None:
+        self.last_seen = time.monotonic()
+
+    def send(self, frame: Frame) -> bool:
+        """
+        Queue a frame without waiting. Returns False if the client is too far behind.
+        """
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    async def _send_loop(self) -> None:
+        try:
+            while True:
+                frame = await self._queue.get()
+                await self.websocket.send_json(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone; the receive loop will see the disconnect
+            self.closed = True
+
+    async def close(self, code: int, reason: str = "") -> None:
+        if self.closed and self._sender is None:
+            return
+        self.closed = True
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+        # Drop queued frames now rather than when the socket is collected
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), timeout=1.0)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    def __init__(
+        self,
+        pubsub=None,
+        heartbeat_interval: float = 20.0,
+        idle_timeout: float = 60.0,
+        queue_size: int = 256,
+    ):
+        self.pubsub = pubsub if pubsub is not None else InMemoryPubSub()
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.queue_size = queue_size
+        # Frames published by this worker come back from the backend and are skipped
+        self.worker_id = uuid.uuid4().hex
+        self._connections: Dict[str, Set[Connection]] = defaultdict(set)
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._evicted_idle = 0
+        self._evicted_slow = 0
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # Tasks and backend connections belong to the loop that created them
+        self._loop = loop
+        await self.pubsub.start(self._deliver_remote)
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for connection in {c for group in self._connections.values() for c in group}:
+            await connection.close(status.WS_1001_GOING_AWAY, "Server shutting down")
+        self._connections.clear()
+        await self.pubsub.stop()
+        self._loop = None
+
+    @staticmethod
+    def _channels(connection: Connection):
+        yield f"user:{connection.user_id}"
+        if connection.conversation_id is not None:
+            yield f"conversation:{connection.conversation_id}"
+
+    async def connect(self, websocket: WebSocket, user_id: int, conversation_id: Optional[int] = None) -> Connection:
+        """
+        Accept the socket and register it for the user (and conversation)
+        """
+        await self.start()
+        await websocket.accept()
+        connection = Connection(websocket, user_id, conversation_id, self.queue_size)
+        connection.start()
+        for channel in self._channels(connection):
+            if not self._connections[channel]:
+                await self.pubsub.subscribe(channel)
+            self._connections[channel].add(connection)
+        return connection
+
+    async def disconnect(self, connection: Connection, code: int = status.WS_1000_NORMAL_CLOSURE) -> None:
+        await connection.close(code)
+        for channel in self._channels(connection):
+            group = self._connections.get(channel)
+            if group is None or connection not in group:
+                continue
+            group.discard(connection)
+            if not group:
+                del self._connections[channel]
+                await self.pubsub.unsubscribe(channel)
+
+    async def send_to_conversation(self, conversation_id: int, frame: Frame) -> None:
+        await self._broadcast(f"conversation:{conversation_id}", frame)
+
+    async def send_to_user(self, user_id: int, frame: Frame) -> None:
+        await self._broadcast(f"user:{user_id}", frame)
+
+    async def _broadcast(self, channel: str, frame: Frame) -> None:
+        # Local sockets first, so the sender's own clients are not delayed by the backend
+        await self._deliver_local(channel, frame)
+        await self.pubsub.publish(channel, {"origin": self.worker_id, "frame": frame})
+
+    async def _deliver_remote(self, channel: str, message: Dict[str, Any]) -> None:
+        if message.get("origin") != self.worker_id:
+            await self._deliver_local(channel, message["frame"])
+
+    async def _deliver_local(self, channel: str, frame: Frame) -> None:
+        slow = [c for c in list(self._connections.get(channel, ())) if not c.send(frame)]
+        for connection in slow:
+            if not connection.closed:
+                self._evicted_slow += 1
+                logger.warning(
+                    f"Disconnecting slow WebSocket client of user {connection.user_id} "
+                    f"({connection.queued} frames queued)"
+                )
+            await self.disconnect(connection, status.WS_1013_TRY_AGAIN_LATER)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for connection in {c for group in self._connections.values() for c in group}:
+                if now - connection.last_seen > self.idle_timeout:
+                    self._evicted_idle += 1
+                    await self.disconnect(connection, status.WS_1001_GOING_AWAY)
+                elif not connection.send({"type": "ping"}):
+                    self._evicted_slow += 1
+                    await self.disconnect(connection, status.WS_1013_TRY_AGAIN_LATER)
+
+    def stats(self) -> Dict[str, Any]:
+        connections = {c for group in self._connections.values() for c in group}
+        return {
+            "backend": type(self.pubsub).__name__,
+            "connections": len(connections),
+            "conversations": sum(1 for channel in self._connections if channel.startswith("conversation:")),
+            "users": sum(1 for channel in self._connections if channel.startswith("user:")),
+            "queued_frames": sum(c.queued for c in connections),
+            "evicted_idle": self._evicted_idle,
+            "evicted_slow": self._evicted_slow,
+        }
+
+
+connection_manager = ConnectionManager(
+    pubsub=create_pubsub(),
+    heartbeat_interval=settings.WS_HEARTBEAT_INTERVAL,
+    idle_timeout=settings.WS_IDLE_TIMEOUT,
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+)
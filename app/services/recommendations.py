@@ -0,0 +1,179 @@
+"""
+Avatar recommendations for a free-text description of what the user needs.
+
+Every recommendation in the catalog (an avatar for a category, with its reason)
+and every other catalog avatar is a document: the category's keywords, the
+avatar's name and description and the reason. The documents are turned into an
+L2-normalized TF-IDF matrix once, when the catalog is loaded, so a request only
+tokenizes its text and scores all documents with one matrix-vector product over
+the columns of the query's terms. Text is split into words with a light
+suffix-stripping stemmer, so "teaching" matches "teach" but "helpful" does not
+match "help".
+"""
+import math
+import string
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+
+import numpy as np
+
+from app.services.entitlements import Entitlements
+
+# Fields of an avatar included in a recommendation, next to its "reason"
+RECOMMENDATION_FIELDS = ("id", "name", "description", "image_url", "provider", "provider_id")
+
+# Punctuation and whitespace other than " " -> " ", so str.split() finds the words
+_SEPARATORS = str.maketrans({char: " " for char in string.punctuation + string.whitespace})
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by can could do for from have i in is it looking me my need "
+    "of on or our please some something that the their this to us want we what who will with would you your".split()
+)
+
+# Word -> its term ("" for stop words). Bounded, since the words come from users.
+_TERMS: Dict[str, str] = {}
+_MAX_TERMS = 50_000
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def _term(word: str) -> str:
+    term = "" if word in STOP_WORDS else _stem(word)
+    if len(_TERMS) < _MAX_TERMS:
+        _TERMS[word] = term
+    return term
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Stemmed words of `text`, without stop words
+    """
+    terms = []
+    for word in text.lower().translate(_SEPARATORS).split():
+        term = _TERMS.get(word)
+        if term is None:
+            term = _term(word)
+        if term:
+            terms.append(term)
+    return terms
+
+
+class AvatarRecommender:
+    """
+    Built from one catalog version (see app/services/catalog.py) and never
+    modified afterwards.
+    """
+
+    def __init__(
+        self,
+        avatars: Sequence[Dict[str, Any]],
+        recommendations: Mapping[str, Sequence[Dict[str, Any]]],
+        keywords: Mapping[str, Sequence[str]],
+        default_categories: Sequence[str],
+    ):
+        self._recommendations = recommendations
+        self._default_categories = tuple(default_categories)
+
+        rows: List[Dict[str, Any]] = []
+        documents: List[List[str]] = []
+        for category, items in recommendations.items():
+            context = " ".join([category.replace("_", " "), *keywords.get(category, ())])
+            for item in items:
+                rows.append(item)
+                documents.append(tokenize(f"{context} {item['name']} {item['description'] or ''} {item['reason']}"))
+        recommended = {item["id"] for items in recommendations.values() for item in items}
+        for avatar in avatars:
+            if avatar["id"] not in recommended:
+                reason = avatar["description"] or avatar["name"]
+                rows.append({**{field: avatar[field] for field in RECOMMENDATION_FIELDS}, "reason": reason})
+                documents.append(tokenize(f"{avatar['name']} {reason}"))
+        self._rows = tuple(rows)
+
+        self._terms: Dict[str, int] = {}
+        for document in documents:
+            for term in document:
+                self._terms.setdefault(term, len(self._terms))
+        document_frequency = Counter(term for document in documents for term in set(document))
+        # A term found in every document ranks nothing and gets a weight of 0
+        self._idf = np.zeros(len(self._terms), dtype=np.float32)
+        for term, index in self._terms.items():
+            self._idf[index] = math.log((1 + len(documents)) / (1 + document_frequency[term]))
+
+        matrix = np.zeros((len(documents), len(self._terms)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term, count in Counter(document).items():
+                matrix[row, self._terms[term]] = count * self._idf[self._terms[term]]
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1)
+        # Column-major, since every query reads a few whole columns
+        self._matrix = np.asfortranarray(matrix)
+
+        self._providers = tuple(sorted({row["provider"] for row in rows}))
+        self._provider_codes = np.array([self._providers.index(row["provider"]) for row in rows], dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def scores(self, text: str) -> np.ndarray:
+        """
+        Cosine similarity of `text` to every document
+        """
+        counts = Counter(term for term in tokenize(text) if term in self._terms)
+        if not counts:
+            return np.zeros(len(self._rows), dtype=np.float32)
+        columns = np.fromiter((self._terms[term] for term in counts), dtype=np.intp, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts)) * self._idf[columns]
+        norm = float(np.linalg.norm(weights))
+        if not norm:
+            return np.zeros(len(self._rows), dtype=np.float32)
+        return self._matrix[:, columns] @ (weights / norm)
+
+    def recommend(self, text: str, entitlements: Entitlements, limit: int) -> List[Dict[str, Any]]:
+        """
+        The best `limit` avatars for `text` that `entitlements` gives access to,
+        each once. When no avatar matches at all, those of the default
+        categories instead.
+        """
+        allowed = np.array([entitlements.can_access_provider(p) for p in self._providers], dtype=bool)
+        visible = allowed[self._provider_codes]
+        scores = self.scores(text)
+        matches = scores > 0
+        if not matches.any():
+            return self._defaults(allowed, limit)
+        candidates = np.flatnonzero(matches & visible)
+        # Stable, so ties keep the catalog's order
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return _unique((self._rows[row] for row in ranked), limit)
+
+    def _defaults(self, allowed: np.ndarray, limit: int) -> List[Dict[str, Any]]:
+        items = (
+            item
+            for category in self._default_categories
+            for item in self._recommendations.get(category, ())
+            if allowed[self._providers.index(item["provider"])]
+        )
+        return _unique(items, limit)
+
+
+def _unique(items: Iterable[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """
+    The first `limit` items, skipping avatars already included
+    """
+    seen = set()
+    unique = []
+    for item in items:
+        if len(unique) >= limit:
+            break
+        if item["id"] not in seen:
+            seen.add(item["id"])
+            unique.append(item)
+    return unique
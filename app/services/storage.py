@@ -0,0 +1,160 @@
+"""
+Content-addressed storage for uploaded media.
+
+An upload is written to disk chunk by chunk as it arrives, hashed with SHA-256
+on the way, and moved to `<MEDIA_ROOT>/<sha256[:2]>/<sha256><ext>`. The same
+bytes uploaded twice are stored once and get the same URL. A URL never changes
+what it points to, so it is served with a long-lived immutable Cache-Control
+(see app/api/uploads.py).
+
+Size and type limits are enforced while streaming: an upload is rejected as soon
+as it exceeds its limit, and its type is sniffed from the first bytes rather than
+taken from the client's Content-Type or filename.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+# Magic bytes -> (content type, extension)
+IMAGE_TYPES: Dict[bytes, Tuple[str, str]] = {
+    b"\xff\xd8\xff": ("image/jpeg", ".jpg"),
+    b"\x89PNG\r\n\x1a\n": ("image/png", ".png"),
+    b"GIF87a": ("image/gif", ".gif"),
+    b"GIF89a": ("image/gif", ".gif"),
+}
+_SNIFF_SIZE = 12
+
+
+class UploadError(Exception):
+    status_code = 400
+
+    def __init__(self, detail: str):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UnsupportedMediaType(UploadError):
+    status_code = 415
+
+
+def format_size(size: int) -> str:
+    if size < 1024 * 1024:
+        return f"{size // 1024} KB"
+    return f"{size / (1024 * 1024):g} MB"
+
+
+def sniff_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """
+    (content type, extension) of an image from its first bytes, or None
+    """
+    for magic, kind in IMAGE_TYPES.items():
+        if head.startswith(magic):
+            return kind
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ("image/webp", ".webp")
+    return None
+
+
+@dataclass
+class StoredFile:
+    key: str  # path relative to MEDIA_ROOT
+    sha256: str
+    size: int
+    content_type: str
+    created: bool  # False when identical content was already stored
+
+    @property
+    def url(self) -> str:
+        return media_url(self.key)
+
+
+def media_url(key: str) -> str:
+    return f"{settings.MEDIA_URL.rstrip('/')}/{key}"
+
+
+def media_path(key: str) -> Path:
+    return Path(settings.MEDIA_ROOT) / key
+
+
+class PendingUpload:
+    """
+    An upload being streamed to a temporary file. Feed it with write(), then
+    call commit() to store it under its content hash, or abort() to discard it.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self.kind: Optional[Tuple[str, str]] = None
+        self._head = b""
+        self._sha256 = hashlib.sha256()
+        self._temp_path = Path(settings.MEDIA_ROOT) / ".incoming" / uuid.uuid4().hex
+        self._file = None
+
+    def _append(self, data: bytes) -> None:
+        if self._file is None:
+            self._temp_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self._temp_path, "wb")
+        self._file.write(data)
+
+    async def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadTooLarge(f"The uploaded file is larger than {format_size(self.max_size)}")
+        self._sha256.update(data)
+        if self.kind is None:
+            # Decide the type before anything reaches the disk; until then the
+            # (fewer than _SNIFF_SIZE) bytes received are held in memory
+            self._head += data
+            if len(self._head) < _SNIFF_SIZE:
+                return
+            self._check_type()
+            data, self._head = self._head, b""
+        await asyncio.to_thread(self._append, data)
+
+    def _check_type(self) -> None:
+        self.kind = sniff_image_type(self._head)
+        if self.kind is None:
+            raise UnsupportedMediaType("The uploaded file must be a JPEG, PNG, GIF or WebP image")
+
+    def _move(self, path: Path) -> bool:
+        self._file.close()
+        if path.exists():
+            self._temp_path.unlink(missing_ok=True)
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Atomic, so readers never see a partial file under its final name
+        os.replace(self._temp_path, path)
+        return True
+
+    async def commit(self) -> StoredFile:
+        if self.kind is None:
+            if not self.size:
+                raise UploadError("The uploaded file is empty")
+            self._check_type()
+            await asyncio.to_thread(self._append, self._head)
+        digest = self._sha256.hexdigest()
+        key = f"{digest[:2]}/{digest}{self.kind[1]}"
+        created = await asyncio.to_thread(self._move, media_path(key))
+        return StoredFile(key=key, sha256=digest, size=self.size, content_type=self.kind[0], created=created)
+
+    async def abort(self) -> None:
+        if self._file is not None:
+            await asyncio.to_thread(self._discard)
+
+    def _discard(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        self._temp_path.unlink(missing_ok=True)
@@ -0,0 +1,68 @@
+"""
+Background job worker.
+
+Runs the jobs enqueued by the API (see app/services/jobs.py) outside the
+request path. Start as many worker processes as the job load needs, separately
+from the API:
+
+    python -m app.worker [--concurrency 4]
+
+SIGTERM or SIGINT stop claiming new jobs and let running ones finish.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from app.core.config import settings
+from app.db.session import async_engine
+# Mappers refer to each other by name, so every model must be imported
+from app.models import avatar, conversation, job, product, subscription, user  # noqa: F401
+from app.services import avatar_creation  # noqa: F401  (registers its job handlers)
+from app.services.jobs import JobWorker
+from app.services.providers import close_providers
+from app.services.realtime import connection_manager
+
+logger = logging.getLogger(__name__)
+
+
+async def run(concurrency: int, poll_interval: float) -> None:
+    # Publishes completion frames to sockets held by the API workers (needs REDIS_URL)
+    await connection_manager.start()
+    worker = JobWorker(concurrency=concurrency, poll_interval=poll_interval)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    await worker.start()
+    try:
+        await stop.wait()
+        logger.info("Stopping job worker, waiting for running jobs")
+    finally:
+        await worker.stop()
+        await connection_manager.stop()
+        await close_providers()
+        await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run background jobs")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.JOB_WORKER_CONCURRENCY,
+        help="jobs run at once by this process",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=settings.JOB_POLL_INTERVAL,
+        help="seconds between polls for due jobs when idle",
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.poll_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 from sqlalchemy import text
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
+import asyncio
 import time
+from pathlib import Path
 
 from app.api.endpoints import (
     auth,
@@ -15,11 +19,23 @@ from app.api.endpoints import (
     subscription,
     products,
     bot,
-    health
+    health,
+    jobs
 )
+from app.api.uploads import MediaFiles
 from app.core.config import settings
-from app.db.session import get_db, engine
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, metrics_exporter
+from app.core.passwords import PasswordHasherBusy, password_hasher
+from app.core.retry import CircuitOpenError, request_deadline
+from app.db.session import get_db, engine, async_engine, validate_connections_periodically
 from app.models.base import Base
+from app.services.catalog import catalog_store
+from app.services.gallery import gallery_catalog
+from app.services.images import image_renderer
+from app.services.jobs import JobWorker
+from app.services.providers import ProviderError, close_providers
+from app.services.realtime import connection_manager
+from app.services.storage import UploadError
 
 # Note: Tables are managed by Alembic migrations
 # Run 'alembic upgrade head' to apply migrations
@@ -39,6 +55,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bound the total time any retry policy may spend within one request
+@app.middleware("http")
+async def apply_request_deadline(request: Request, call_next):
+    with request_deadline(settings.REQUEST_DEADLINE):
+        return await call_next(request)
+
+# Added last, so it is outermost and times everything else
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    # Fail fast while a dependency is known to be down
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service temporarily unavailable, please try again"},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    # Shed login/signup load instead of queueing bcrypt work without bound
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many authentication requests, please try again shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(ProviderError)
+async def provider_error_handler(request: Request, exc: ProviderError):
+    # Raised once retries against AKOOL or Soul Machines are exhausted
+    return JSONResponse(
+        status_code=status.HTTP_502_BAD_GATEWAY,
+        content={"detail": f"Avatar provider {exc.provider} is unavailable, please try again"},
+    )
+
+
+@app.exception_handler(UploadError)
+async def upload_error_handler(request: Request, exc: UploadError):
+    # 413/415 are raised while the upload is still streaming in
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+
+@app.exception_handler(OperationalError)
+async def db_unavailable_handler(request: Request, exc: OperationalError):
+    # Raised once DB retries are exhausted
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database connection error, please try again"},
+    )
+
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["authentication"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
@@ -51,6 +121,59 @@ app.include_router(subscription.router, prefix=f"{settings.API_V1_STR}/subscript
 app.include_router(products.router, prefix=f"{settings.API_V1_STR}/products", tags=["products"])
 app.include_router(bot.router, prefix=f"{settings.API_V1_STR}/bot", tags=["bot"])
 app.include_router(health.router, prefix=f"{settings.API_V1_STR}/health", tags=["health"])
+app.include_router(jobs.router, prefix=f"{settings.API_V1_STR}/jobs", tags=["jobs"])
+
+# Prometheus scrape endpoint, outside the API prefix as scrapers expect
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics() -> Response:
+        # Sync, since it may read the other workers' snapshots from disk
+        return Response(metrics_exporter.render(), media_type=METRICS_CONTENT_TYPE)
+
+# Uploaded media, unless MEDIA_URL points at a CDN serving MEDIA_ROOT
+if settings.MEDIA_URL.startswith("/"):
+    Path(settings.MEDIA_ROOT).mkdir(parents=True, exist_ok=True)
+    app.mount(settings.MEDIA_URL, MediaFiles(directory=settings.MEDIA_ROOT), name="media")
+
+
+@app.on_event("startup")
+async def start_connection_validation():
+    if settings.DB_CONNECTION_VALIDATION == "periodic":
+        app.state.validation_task = asyncio.create_task(
+            validate_connections_periodically(settings.DB_VALIDATION_INTERVAL)
+        )
+    # WebSocket heartbeats and cross-worker fan-out
+    await connection_manager.start()
+    # Share this worker's metrics with the others
+    metrics_exporter.start()
+    # Pick up edits of the catalog file without a restart
+    catalog_store.start()
+    # Keep the gallery in step with the AKOOL catalog, off the request path
+    gallery_catalog.start()
+    if settings.JOBS_IN_PROCESS:
+        # Development setup: run background jobs here instead of in `python -m app.worker`
+        app.state.job_worker = JobWorker()
+        await app.state.job_worker.start()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    validation_task = getattr(app.state, "validation_task", None)
+    if validation_task is not None:
+        validation_task.cancel()
+    password_hasher.shutdown()
+    image_renderer.shutdown()
+    job_worker = getattr(app.state, "job_worker", None)
+    if job_worker is not None:
+        await job_worker.stop()
+    await connection_manager.stop()
+    await gallery_catalog.stop()
+    await catalog_store.stop()
+    await metrics_exporter.stop()
+    # Close pooled keep-alive connections to the avatar providers
+    await close_providers()
+    # Close pooled asyncpg/aiosqlite connections cleanly on worker shutdown
+    await async_engine.dispose()
 
 
 @app.get("/")
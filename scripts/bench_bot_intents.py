@@ -0,0 +1,154 @@
+"""
+Benchmark intent routing of POST /api/bot/chat over a corpus of sample
+utterances.
+
+- "before": the previous chain of `elif any(word in text.lower() ...)`
+  substring tests, reproduced here with its keyword lists
+- "after": the catalog's IntentRouter (app/services/intents.py)
+
+Both are timed with the catalog's intents and again with --extra-intents more
+synthetic ones appended, which every message that matches none of the earlier
+intents used to pay for. Also lists the utterances the two route differently,
+which is expected where a substring used to match inside another word ("hi" in
+"this").
+
+Usage:
+    python -m scripts.bench_bot_intents [--rounds 2000] [--extra-intents 100] [--catalog app/data/catalog.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (intent, keywords) in the order the old elif chain tested them
+LEGACY_CHAIN = [
+    ("greeting", ["hello", "hi", "hey", "greetings"]),
+    ("recommend_avatar", ["avatar", "recommend", "suggestion"]),
+    ("business", ["business", "presentation", "meeting", "corporate"]),
+    ("customer_service", ["customer", "service", "support", "help"]),
+    ("education", ["education", "teach", "learn", "tutor"]),
+    ("healthcare", ["health", "medical", "doctor", "healthcare"]),
+    ("subscription", ["subscription", "premium", "plan", "price", "cost"]),
+    ("customize", ["customize", "edit", "modify", "change"]),
+    ("help", ["help", "how", "guide", "tutorial"]),
+]
+
+UTTERANCES = [
+    "Hello",
+    "hi there",
+    "Hey, what can you do?",
+    "Can you recommend an avatar?",
+    "I want a suggestion for my website",
+    "I need to give a business presentation next week",
+    "something for corporate meetings",
+    "We need customer service for our online shop",
+    "can it handle support tickets?",
+    "I want to teach maths to kids",
+    "an avatar for learning languages",
+    "looking for a tutor for university students",
+    "Is there anything for the medical field?",
+    "our clinic needs someone to talk to patients about health",
+    "what does premium cost?",
+    "How much is the annual plan?",
+    "tell me about subscriptions",
+    "How do I customize my avatar?",
+    "can I change the voice?",
+    "I'd like to edit the appearance",
+    "how does this work",
+    "is there a guide or tutorial?",
+    "What is this?",
+    "Which one should I pick for this?",
+    "thanks",
+    "ok",
+    "This is nothing like what I want",
+    "show me something for healthcare training",
+    "I teach nurses about patient safety",
+    "my whole team uses this for sales calls",
+    "Whatever you think is best",
+    "Do you have an avatar that speaks French?",
+    "Can I modify the avatar's outfit for presentations?",
+    "Which plan lets me use Soul Machines?",
+    "the pricing page is confusing",
+    "help me please",
+    "I'm a doctor",
+    "Our school wants to teach with avatars",
+    "I want to change my plan",
+    "good morning!",
+]
+
+
+def legacy_route(text: str, chain=LEGACY_CHAIN) -> str:
+    for intent, words in chain:
+        if any(word in text.lower() for word in words):
+            return intent
+    return "fallback"
+
+
+def extra_intents(count: int):
+    return [
+        {
+            "name": f"topic_{i}",
+            "priority": 5,
+            "keywords": [f"topic{i}{suffix}" for suffix in "abcd"],
+            "message": f"About topic {i}.",
+            "suggestions": [],
+        }
+        for i in range(count)
+    ]
+
+
+def time_calls(route, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for text in UTTERANCES:
+            route(text)
+        samples.append((time.perf_counter() - started) / len(UTTERANCES) * 1_000_000)
+    return samples
+
+
+def run(rounds: int, extra: int, catalog_path: str) -> None:
+    sys.path.insert(0, BASE_DIR)
+
+    from app.services.catalog import load_catalog
+    from app.services.intents import IntentRouter
+
+    with open(catalog_path, encoding="utf-8") as f:
+        bot = json.load(f)["bot"]
+    router = load_catalog(catalog_path).intent_router
+
+    print(f"{len(UTTERANCES)} utterances, {rounds} rounds")
+    for added in sorted({0, extra}):
+        specs = extra_intents(added)
+        chain = LEGACY_CHAIN + [(spec["name"], spec["keywords"]) for spec in specs]
+        extended = IntentRouter(bot["intents"] + specs, bot["fallback"])
+        print(f"{len(extended.intents)} intents:")
+        for name, route in (
+            ("before", lambda text: legacy_route(text, chain)),
+            ("after", lambda text: extended.route(text).intent.name),
+        ):
+            samples = time_calls(route, rounds)
+            print(f"  {name:>6}: mean {statistics.mean(samples):6.2f} us  median {statistics.median(samples):6.2f} us per utterance")
+
+    changed = [(text, legacy_route(text), router.route(text)) for text in UTTERANCES]
+    changed = [(text, old, new) for text, old, new in changed if old != new.intent.name]
+    print(f"\n{len(changed)} utterances routed differently:")
+    for text, old, new in changed:
+        print(f"  {text!r}: {old} -> {new.intent.name} (confidence {new.confidence:.2f})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--extra-intents", type=int, default=100, help="synthetic intents appended to the catalog's")
+    parser.add_argument("--catalog", default=os.path.join(BASE_DIR, "app", "data", "catalog.json"))
+    args = parser.parse_args()
+    run(args.rounds, args.extra_intents, args.catalog)
+
+
+if __name__ == "__main__":
+    main()
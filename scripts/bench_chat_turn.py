@@ -0,0 +1,177 @@
+"""
+Benchmark database round-trips and latency of one chat turn
+(POST /api/chat/conversations/{id}/messages).
+
+Compares the current create_message with the previous implementation, which
+committed and refreshed each message separately and loaded the avatar and all
+of the user's products with their own queries. The old code is reproduced here
+with func.now() in place of the invalid `db.func.now()` so that it runs.
+
+Round-trips are statements plus commits. On a local SQLite file they are
+nearly free, so --rtt-ms adds a simulated network delay to each one. Point
+DATABASE_URL at PostgreSQL to measure real round-trips instead; the schema must
+already exist there (alembic upgrade head).
+
+Usage:
+    python -m scripts.bench_chat_turn [--turns 200] [--products 500] [--rtt-ms 0.5]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(turns: int, product_count: int, rtt_ms: float, verbose: bool) -> None:
+    sys.path.insert(0, BASE_DIR)
+    logging.disable(logging.INFO)
+
+    from sqlalchemy import event, func
+
+    from app.api.endpoints import chat
+    from app.core.principal import attach_user, load_principal
+    from app.db.session import SessionLocal, engine
+    from app.models.avatar import Avatar
+    from app.models.base import Base
+    from app.models.conversation import Conversation, Message
+    from app.models.product import Product
+    from app.models.user import User
+    from app.schemas.conversation import MessageCreate
+    from app.services.chat import compose_reply
+
+    if engine.url.get_backend_name() == "sqlite":
+        Base.metadata.create_all(engine)
+
+    def legacy_turn(db, conversation_id, current_user, content):
+        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        user_message = Message(content=content, is_user=True, conversation_id=conversation.id)
+        db.add(user_message)
+        db.commit()
+        db.refresh(user_message)
+        avatar = db.query(Avatar).filter(Avatar.id == conversation.avatar_id).first()
+        products = db.query(Product).filter(Product.user_id == current_user.id).all()
+        mentioned = next((p for p in products if p.name.lower() in content.lower()), None)
+        avatar_message = Message(
+            content=compose_reply(content, [mentioned] if mentioned else []),
+            is_user=False,
+            conversation_id=conversation.id,
+        )
+        db.add(avatar_message)
+        conversation.updated_at = func.now()
+        db.add(conversation)
+        db.commit()
+        db.refresh(avatar_message)
+        return avatar_message
+
+    def current_turn(db, conversation_id, current_user, content):
+        return chat.create_message(
+            conversation_id=conversation_id,
+            db=db,
+            message_in=MessageCreate(content=content, conversation_id=conversation_id),
+            current_user=current_user,
+        )
+
+    # One user with an avatar, a conversation and a product catalog
+    db = SessionLocal()
+    user = User(email=f"bench-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-")
+    db.add(user)
+    db.flush()
+    avatar = Avatar(name="Bench", provider="AKOOL", provider_id="bench", user_id=user.id)
+    db.add(avatar)
+    db.flush()
+    conversation = Conversation(title="Bench", user_id=user.id, avatar_id=avatar.id)
+    db.add(conversation)
+    db.add_all(
+        Product(name=f"Product {i:05d}", description=f"Item number {i}", user_id=user.id)
+        for i in range(product_count)
+    )
+    db.commit()
+    user_id, conversation_id = user.id, conversation.id
+    db.close()
+    content = f"Can you tell me about product {product_count // 2:05d}?"
+
+    statements = []
+    commits = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()))
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    @event.listens_for(engine, "commit")
+    def on_commit(conn):
+        commits.append(1)
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    results = []
+    for name, turn in (("before", legacy_turn), ("after", current_turn)):
+        round_trips, statement_counts, commit_counts, samples = [], [], [], []
+        # One extra untimed turn warms up caches (principal, product matcher)
+        for i in range(turns + 1):
+            db = SessionLocal()
+            try:
+                # Per-request setup as in get_current_active_user; cached, so free
+                current_user = attach_user(db, load_principal(db, user_id))
+                statements.clear()
+                commits.clear()
+                started = time.perf_counter()
+                turn(db, conversation_id, current_user, content)
+                elapsed = (time.perf_counter() - started) * 1000
+            finally:
+                db.close()
+            if i == 0:
+                if verbose:
+                    print(f"{name}: statements of the first turn")
+                    for statement in statements:
+                        print(f"  {statement[:140]}")
+                    print()
+                continue
+            statement_counts.append(len(statements))
+            commit_counts.append(len(commits))
+            round_trips.append(len(statements) + len(commits))
+            samples.append(elapsed)
+        results.append((name, round_trips, statement_counts, commit_counts, samples))
+
+    print(f"{'variant':<10} {'round-trips':>12} {'statements':>11} {'commits':>8} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for name, round_trips, statement_counts, commit_counts, samples in results:
+        print(
+            f"{name:<10} {statistics.mean(round_trips):>12.1f} {statistics.mean(statement_counts):>11.1f}"
+            f" {statistics.mean(commit_counts):>8.1f} {percentile(samples, 50):>10.3f} {percentile(samples, 99):>10.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--products", type=int, default=500, help="products in the user's catalog")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network delay per round-trip")
+    parser.add_argument("--verbose", action="store_true", help="print the statements of one turn")
+    args = parser.parse_args()
+
+    tmp_db = None
+    if "DATABASE_URL" not in os.environ:
+        tmp_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        tmp_db.close()
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp_db.name}"
+    try:
+        run(args.turns, args.products, args.rtt_ms, args.verbose)
+    finally:
+        if tmp_db is not None:
+            os.unlink(tmp_db.name)
+
+
+if __name__ == "__main__":
+    main()
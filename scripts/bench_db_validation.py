@@ -0,0 +1,104 @@
+"""
+Benchmark /api/users/me latency under each DB_CONNECTION_VALIDATION mode.
+
+Each mode runs in a fresh subprocess, because the engine reads its settings at
+import time. By default a throwaway SQLite database is used. Point
+DATABASE_URL at PostgreSQL to measure real network round-trips; the schema must
+already exist there (alembic upgrade head).
+
+Usage:
+    python -m scripts.bench_db_validation [--requests 2000] [--modes pre_ping,periodic,none]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_worker(requests: int, warmup: int) -> None:
+    """Run inside the subprocess: sign up a user and time GET /api/users/me."""
+    sys.path.insert(0, BASE_DIR)
+    logging.disable(logging.INFO)
+
+    from fastapi.testclient import TestClient
+
+    import main
+    from app.db.session import engine
+    from app.models.base import Base
+
+    if engine.url.get_backend_name() == "sqlite":
+        Base.metadata.create_all(engine)
+
+    client = TestClient(main.app)
+    response = client.post(
+        "/api/auth/signup",
+        json={"email": f"bench-{uuid.uuid4().hex[:8]}@example.com", "password": "bench-password"},
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    for _ in range(warmup):
+        client.get("/api/users/me", headers=headers)
+
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get("/api/users/me", headers=headers).raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    print(json.dumps({
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--modes", default="pre_ping,periodic,none")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.requests, args.warmup)
+        return
+
+    print(f"{'mode':<10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'mean (ms)':>10}")
+    for mode in args.modes.split(","):
+        env = dict(os.environ, DB_CONNECTION_VALIDATION=mode)
+        tmp_db = None
+        if "DATABASE_URL" not in os.environ:
+            tmp_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+            tmp_db.close()
+            env["DATABASE_URL"] = f"sqlite:///{tmp_db.name}"
+        try:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker",
+                 "--requests", str(args.requests), "--warmup", str(args.warmup)],
+                env=env, cwd=BASE_DIR, check=True, capture_output=True, text=True,
+            ).stdout
+        finally:
+            if tmp_db is not None:
+                os.unlink(tmp_db.name)
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<10} {result['p50_ms']:>10} {result['p99_ms']:>10} {result['mean_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
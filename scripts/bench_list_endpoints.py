@@ -0,0 +1,155 @@
+"""
+Benchmark the read path of the list endpoints on pages of --rows rows.
+
+For GET /api/studio/avatars, /api/products/, /api/chat/conversations and
+/api/subscription/history, times building the response body from the database:
+
+- "before": ORM entities validated through the response schema
+  (`from_attributes`), dumped to JSON-compatible values and encoded with the
+  standard json module, as FastAPI does with a `response_model`
+- "after": the columns of the schema selected as rows, turned into dicts and
+  encoded with orjson (app/api/projections.py)
+
+Both bodies are checked to decode to the same JSON. A throwaway SQLite
+database is used unless DATABASE_URL is set; its tables are created if missing.
+
+Usage:
+    python -m scripts.bench_list_endpoints [--rows 100] [--rounds 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETTINGS = {
+    "personality": "friendly",
+    "gestures": ["wave", "nod", "point"],
+    "expressions": {"smile": 0.8, "surprise": 0.3, "focus": 0.6},
+    "voice": {"pitch": 1.1, "speed": 0.95, "accent": "neutral"},
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed(db, rows: int) -> int:
+    from app.models.avatar import Avatar
+    from app.models.conversation import Conversation
+    from app.models.product import Product
+    from app.models.subscription import Subscription, SubscriptionType
+    from app.models.user import User
+
+    user = User(email=f"bench-{os.getpid()}-{time.time_ns()}@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    avatars = [
+        Avatar(
+            name=f"Avatar {i}",
+            description="A synthetic avatar for benchmarking. " * 4,
+            image_url=f"https://example.com/avatars/{i}.jpg",
+            provider="AKOOL",
+            provider_id=f"bench-{i}",
+            behavior_settings=SETTINGS,
+            appearance_settings=SETTINGS,
+            voice_settings=SETTINGS,
+            user_id=user.id,
+        )
+        for i in range(rows)
+    ]
+    db.add_all(avatars)
+    db.flush()
+    db.add_all(
+        Product(name=f"Product {i}", description="A product. " * 8, price=9.99 + i, user_id=user.id)
+        for i in range(rows)
+    )
+    db.add_all(
+        Conversation(title=f"Conversation {i}", user_id=user.id, avatar_id=avatars[i].id, conversation_metadata={"topic": i})
+        for i in range(rows)
+    )
+    db.add_all(
+        Subscription(type=SubscriptionType.PREMIUM, price=19.99, payment_method="card", is_active=False, user_id=user.id)
+        for _ in range(rows)
+    )
+    db.commit()
+    return user.id
+
+
+def time_calls(build, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        build()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def run(rows: int, rounds: int) -> None:
+    if not os.environ.get("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mktemp(suffix='.db')}"
+    sys.path.insert(0, BASE_DIR)
+
+    from pydantic import TypeAdapter
+    from typing import List
+
+    import main  # noqa: F401  (configures every mapper)
+    from app.api.projections import ProjectionResponse, row_dicts, schema_columns
+    from app.db.session import SessionLocal, engine
+    from app.models.avatar import Avatar
+    from app.models.base import Base
+    from app.models.conversation import Conversation
+    from app.models.product import Product
+    from app.models.subscription import Subscription
+    from app.schemas.avatar import Avatar as AvatarSchema
+    from app.schemas.conversation import Conversation as ConversationSchema
+    from app.schemas.product import Product as ProductSchema
+    from app.schemas.subscription import Subscription as SubscriptionSchema
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        user_id = seed(db, rows)
+
+    print(f"{rows} rows per page, {rounds} rounds (ms per page)")
+    for name, model, schema in (
+        ("avatars", Avatar, AvatarSchema),
+        ("products", Product, ProductSchema),
+        ("conversations", Conversation, ConversationSchema),
+        ("subscriptions", Subscription, SubscriptionSchema),
+    ):
+        adapter = TypeAdapter(List[schema])
+
+        def before():
+            with SessionLocal() as db:
+                entities = db.query(model).filter(model.user_id == user_id).limit(rows).all()
+                content = adapter.dump_python(adapter.validate_python(entities, from_attributes=True), mode="json")
+                return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+        def after():
+            with SessionLocal() as db:
+                found = db.query(*schema_columns(model, schema)).filter(model.user_id == user_id).limit(rows).all()
+                return ProjectionResponse(row_dicts(found, schema)).body
+
+        assert json.loads(before()) == json.loads(after()), f"{name}: bodies differ"
+        print(f"{name}:")
+        for label, build in (("before", before), ("after", after)):
+            samples = time_calls(build, rounds)
+            print(f"  {label:>6}: p50 {statistics.median(samples):6.2f}  p95 {percentile(samples, 95):6.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    run(args.rows, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark the pooled provider client against the fake provider server.
+
+Starts scripts/fake_providers in-process and fires bursts of concurrent
+requests at it:
+
+- "per-call": a new httpx client (and connection) for every request, as the
+  documented examples did with `requests`
+- "pooled": the AKOOL client from app/services/providers with keep-alive
+  connections and its concurrency limit
+- "coalesced": the same burst as identical GETs, shared while in flight
+
+Over loopback there is no TLS handshake, so the per-call overhead measured here
+is a lower bound of what a real provider costs.
+
+Usage:
+    python -m scripts.bench_providers [--requests 500] [--concurrency 50] [--latency-ms 50]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, latency_ms: float):
+    import uvicorn
+
+    from scripts.fake_providers import create_app
+
+    server = uvicorn.Server(uvicorn.Config(create_app(latency_ms), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+async def burst(call, requests: int, concurrency: int):
+    gate = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i):
+        async with gate:
+            started = time.perf_counter()
+            await call(i)
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return samples, time.perf_counter() - started
+
+
+async def run(requests: int, concurrency: int, latency_ms: float) -> None:
+    import httpx
+
+    from app.services.providers.akool import AkoolClient
+
+    port = free_port()
+    server, thread = start_server(port, latency_ms)
+    base_url = f"http://127.0.0.1:{port}/akool/v1"
+    headers = {"Authorization": "Bearer bench"}
+
+    async def upstream_count():
+        async with httpx.AsyncClient() as client:
+            return sum((await client.get(f"http://127.0.0.1:{port}/_stats")).json().values())
+
+    client = AkoolClient(base_url, "bench", max_concurrency=concurrency, max_connections=concurrency)
+
+    async def per_call(i):
+        async with httpx.AsyncClient(headers=headers) as fresh:
+            (await fresh.get(f"{base_url}/avatars", params={"limit": 10, "offset": i})).raise_for_status()
+
+    async def pooled(i):
+        await client.get_avatars(limit=10, offset=i)
+
+    async def coalesced(i):
+        await client.get_avatars(limit=10, offset=0)
+
+    results = []
+    try:
+        for name, call in (("per-call", per_call), ("pooled", pooled), ("coalesced", coalesced)):
+            before = await upstream_count()
+            samples, elapsed = await burst(call, requests, concurrency)
+            upstream = await upstream_count() - before
+            results.append((name, samples, elapsed, upstream))
+    finally:
+        await client.aclose()
+        server.should_exit = True
+        thread.join()
+
+    print(f"{'variant':<10} {'req/s':>8} {'upstream':>9} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    for name, samples, elapsed, upstream in results:
+        print(
+            f"{name:<10} {requests / elapsed:>8.0f} {upstream:>9} "
+            f"{statistics.median(samples):>10.2f} {percentile(samples, 99):>10.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fake provider response time")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BASE_DIR)
+    logging.disable(logging.INFO)
+    asyncio.run(run(args.requests, args.concurrency, args.latency_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark POST /api/bot/recommend's ranking on a large synthetic catalog.
+
+Generates a catalog with --avatars avatars spread over --categories categories
+of --keywords keywords each, then times one recommendation:
+
+- "before": the previous approach generalized to many categories, a substring
+  test of every keyword of every category against the text, followed by a
+  linear de-duplication of the matched categories' avatars
+- "after": AvatarRecommender (app/services/recommendations.py), whose TF-IDF
+  matrix is built once when the catalog is loaded; its build time is reported
+  separately
+
+Usage:
+    python -m scripts.bench_recommendations [--avatars 500] [--categories 200] [--requests 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "account advice agent analytics art banking beauty booking car care chef coach coding construction "
+    "consulting cooking dental design energy engineering estate event fashion finance fitness food game "
+    "garden government hotel insurance interior investment journalism kids language law logistics "
+    "marketing music news nutrition pharmacy photography physics podcast property recruiting retail "
+    "science security software sport startup support tax telecom tourism travel veterinary wedding yoga"
+).split()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def synthetic_catalog(avatar_count: int, category_count: int, keyword_count: int, rng: random.Random):
+    avatars = [
+        {
+            "id": 1000 + i,
+            "name": f"{rng.choice(WORDS).title()} Avatar {i}",
+            "description": "An avatar for " + " and ".join(rng.sample(WORDS, 3)) + ".",
+            "image_url": f"https://example.com/avatars/{i}.jpg",
+            "provider": rng.choice(("AKOOL", "SOUL_MACHINES")),
+            "provider_id": f"bench-{i}",
+        }
+        for i in range(avatar_count)
+    ]
+    keywords = {}
+    recommendations = {}
+    for c in range(category_count):
+        category = f"{rng.choice(WORDS)}_{c}"
+        keywords[category] = tuple(f"{word}{c % 7}" if rng.random() < 0.3 else word for word in rng.sample(WORDS, keyword_count))
+        recommendations[category] = tuple(
+            {**avatar, "reason": f"Recommended for {' '.join(keywords[category][:3])}."}
+            for avatar in rng.sample(avatars, min(5, avatar_count))
+        )
+    return avatars, recommendations, keywords
+
+
+def run(avatar_count: int, category_count: int, keyword_count: int, requests: int, limit: int) -> None:
+    sys.path.insert(0, BASE_DIR)
+
+    from app.models.subscription import SubscriptionType
+    from app.services.entitlements import Entitlements
+    from app.services.recommendations import AvatarRecommender
+
+    rng = random.Random(42)
+    avatars, recommendations, keywords = synthetic_catalog(avatar_count, category_count, keyword_count, rng)
+    defaults = list(recommendations)[:2]
+    entitlements = Entitlements(tier=SubscriptionType.BASIC)
+    texts = [
+        "I need an avatar for " + " ".join(rng.sample(WORDS, 3)) + " with my customers"
+        for _ in range(requests)
+    ]
+
+    def before(text):
+        text = text.lower()
+        categories = [c for c, words in keywords.items() if any(word in text for word in words)] or defaults
+        found = []
+        for category in categories:
+            for avatar in recommendations[category]:
+                if not entitlements.can_access_provider(avatar["provider"]):
+                    continue
+                if not any(r["id"] == avatar["id"] for r in found):
+                    found.append(avatar)
+        return found
+
+    started = time.perf_counter()
+    recommender = AvatarRecommender(avatars, recommendations, keywords, defaults)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    def after(text):
+        return recommender.recommend(text, entitlements, limit)
+
+    print(
+        f"{avatar_count} avatars, {category_count} categories of {keyword_count} keywords: "
+        f"{len(recommender)} documents, matrix built in {build_ms:.1f} ms"
+    )
+    for name, recommend in (("before", before), ("after", after)):
+        samples = []
+        returned = []
+        for text in texts:
+            started = time.perf_counter()
+            result = recommend(text)
+            samples.append((time.perf_counter() - started) * 1_000_000)
+            returned.append(len(result))
+        print(
+            f"{name:>6}: p50 {statistics.median(samples):8.1f} us  p99 {percentile(samples, 99):8.1f} us  "
+            f"avatars returned (mean) {statistics.mean(returned):6.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--avatars", type=int, default=500)
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--keywords", type=int, default=8, help="keywords per category")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=5, help="avatars returned per recommendation")
+    args = parser.parse_args()
+    run(args.avatars, args.categories, args.keywords, args.requests, args.limit)
+
+
+if __name__ == "__main__":
+    main()
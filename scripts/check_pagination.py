@@ -0,0 +1,127 @@
+"""
+Check that cursor pagination visits every row exactly once, in order.
+
+Pages through a user's conversations (newest first) and a conversation's
+messages (chronological) one row at a time, forwards with `next_cursor` as
+`after` and backwards with `prev_cursor` as `before`, and compares the ids seen
+with the full list. The rows are created within the same second, so most of
+them tie on the timestamp of the sort key and are ordered by id alone: the case
+where a cursor that does not compare equal to the stored timestamp skips rows
+or never reaches the end of the list.
+
+By default a throwaway SQLite database is migrated with `alembic upgrade head`.
+Point DATABASE_URL at a scratch PostgreSQL database to check there; the schema
+must already exist (alembic upgrade head) and a test user is created in it.
+
+Usage:
+    python -m scripts.check_pagination
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONVERSATIONS = 4
+MESSAGES = 3
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    tmp_db = None
+    if "DATABASE_URL" not in os.environ:
+        tmp_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        tmp_db.close()
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp_db.name}"
+    try:
+        sys.exit(run(migrate=tmp_db is not None))
+    finally:
+        if tmp_db is not None:
+            os.unlink(tmp_db.name)
+
+
+def run(migrate: bool) -> int:
+    sys.path.insert(0, BASE_DIR)
+
+    if migrate:
+        from alembic import command
+        from alembic.config import Config
+
+        command.upgrade(Config(os.path.join(BASE_DIR, "alembic.ini")), "head")
+    logging.disable(logging.INFO)
+
+    from fastapi.testclient import TestClient
+
+    import main as app_main
+
+    client = TestClient(app_main.app, raise_server_exceptions=False)
+
+    def call(method, path, **kwargs):
+        response = client.request(method, path, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            raise SystemExit(f"{method} {path} failed with {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    response = client.post(
+        "/api/auth/signup",
+        json={"email": f"pages-{uuid.uuid4().hex[:8]}@example.com", "password": "pages-password"},
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    avatar = call("POST", "/api/gallery/select", params={"avatar_id": 1001})
+    conversations = [
+        call("POST", "/api/chat/conversations", json={"avatar_id": avatar["id"], "user_id": 0})
+        for _ in range(CONVERSATIONS)
+    ]
+    conversation = conversations[0]
+    # Each turn stores the user's message and the reply with the same timestamp
+    for i in range(MESSAGES):
+        call(
+            "POST",
+            f"/api/chat/conversations/{conversation['id']}/messages",
+            json={"content": f"Message {i}", "conversation_id": conversation["id"]},
+        )
+
+    lists = [
+        ("conversations", "/api/chat/conversations", {"limit": 100}),
+        ("messages", f"/api/chat/conversations/{conversation['id']}/messages", {"limit": 200}),
+    ]
+
+    failures = 0
+    for name, path, everything in lists:
+        expected = [item["id"] for item in call("GET", path, params=everything)["items"]]
+
+        def walk(page, cursor_name, param):
+            # One page per row; a cursor that keeps returning pages is a loop
+            pages = [page]
+            while page[cursor_name] and len(pages) <= len(expected):
+                page = call("GET", path, params={"limit": 1, param: page[cursor_name]})
+                pages.append(page)
+            return pages
+
+        # Walk from the default page to one end of the list, then back to the other
+        first = call("GET", path, params={"limit": 1})
+        if first["next_cursor"]:
+            forward = walk(first, "next_cursor", "after")
+            backward = walk(forward[-1], "prev_cursor", "before")
+        else:
+            backward = walk(first, "prev_cursor", "before")
+            forward = walk(backward[-1], "next_cursor", "after")
+
+        for direction, pages in (("forward", forward), ("backward", backward[::-1])):
+            seen = [item["id"] for page in pages for item in page["items"]]
+            ok = seen == expected
+            failures += not ok
+            print(f"{'ok' if ok else 'FAIL':<4} {name} {direction}: {seen}" + ("" if ok else f", expected {expected}"))
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    main()
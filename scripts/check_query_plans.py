@@ -0,0 +1,187 @@
+"""
+Check that the per-user queries behind the API are served by indexes.
+
+Drives the endpoints below through the app, captures every SELECT, UPDATE and
+DELETE they issue, and runs EXPLAIN on each one. A full table scan, or a sort
+that an index should have provided, is reported as a failure and the script
+exits non-zero, so a missing index or a query that stops matching its index is
+caught before it reaches production.
+
+By default a throwaway SQLite database is migrated with `alembic upgrade head`.
+Point DATABASE_URL at a scratch PostgreSQL database to check real plans there;
+the schema must already exist (alembic upgrade head) and test users are created
+in it. Sequential scans are disabled while explaining so that tiny tables still
+show whether an index is usable.
+
+Usage:
+    python -m scripts.check_query_plans [--verbose]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECKED_STATEMENTS = ("SELECT", "UPDATE", "DELETE")
+
+
+def sqlite_problems(cursor, statement, parameters, tables):
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    problems = []
+    for row in cursor.fetchall():
+        detail = row[-1]
+        scan = re.match(r"SCAN (\w+)", detail)
+        if scan and scan.group(1) in tables:
+            problems.append(detail)
+        elif detail.startswith("USE TEMP B-TREE FOR ORDER BY"):
+            problems.append(detail)
+    return problems
+
+
+def postgres_problems(cursor, statement, parameters, tables):
+    cursor.execute("SET LOCAL enable_seqscan = off")
+    cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    problems = []
+
+    def walk(node):
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") in tables:
+            problems.append(f"Seq Scan on {node['Relation Name']}")
+        elif node["Node Type"] == "Sort":
+            problems.append(f"Sort on {', '.join(node.get('Sort Key', []))}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print every statement and its verdict")
+    args = parser.parse_args()
+
+    tmp_db = None
+    if "DATABASE_URL" not in os.environ:
+        tmp_db = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        tmp_db.close()
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp_db.name}"
+    try:
+        sys.exit(run(args.verbose, migrate=tmp_db is not None))
+    finally:
+        if tmp_db is not None:
+            os.unlink(tmp_db.name)
+
+
+def run(verbose: bool, migrate: bool) -> int:
+    sys.path.insert(0, BASE_DIR)
+
+    if migrate:
+        from alembic import command
+        from alembic.config import Config
+
+        command.upgrade(Config(os.path.join(BASE_DIR, "alembic.ini")), "head")
+    logging.disable(logging.INFO)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import main as app_main
+    from app.db.session import engine
+    from app.models.base import Base
+
+    tables = set(Base.metadata.tables)
+    explain = sqlite_problems if engine.url.get_backend_name() == "sqlite" else postgres_problems
+
+    captured = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(CHECKED_STATEMENTS):
+            captured.append((statement, parameters))
+
+    @contextmanager
+    def capturing():
+        captured.clear()
+        yield captured
+        captured.clear()
+
+    client = TestClient(app_main.app, raise_server_exceptions=False)
+
+    def call(method, path, **kwargs):
+        response = client.request(method, path, headers=headers, **kwargs)
+        if response.status_code >= 400:
+            raise SystemExit(f"{method} {path} failed with {response.status_code}: {response.text[:200]}")
+        return response.json()
+
+    response = client.post(
+        "/api/auth/signup",
+        json={"email": f"plans-{uuid.uuid4().hex[:8]}@example.com", "password": "plans-password"},
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    # Some data to query; setup statements themselves are not checked
+    avatar = call("POST", "/api/gallery/select", params={"avatar_id": 1001})
+    conversation = call("POST", "/api/chat/conversations", json={"avatar_id": avatar["id"], "user_id": 0})
+    call("POST", "/api/products/", json={"name": "Widget", "description": "A widget", "user_id": 0})
+    spare = call("POST", "/api/gallery/select", params={"avatar_id": 1002})
+    call("POST", "/api/chat/conversations", json={"avatar_id": spare["id"], "user_id": 0})
+
+    endpoints = [
+        ("GET", "/api/users/me", {}),
+        ("GET", "/api/dashboard/", {}),
+        ("GET", "/api/studio/avatars", {}),
+        ("GET", f"/api/studio/avatars/{avatar['id']}", {}),
+        ("POST", "/api/gallery/select", {"params": {"avatar_id": 1001}}),
+        ("GET", "/api/chat/conversations", {}),
+        ("GET", f"/api/chat/conversations/{conversation['id']}", {}),
+        ("GET", f"/api/chat/conversations/{conversation['id']}/messages", {}),
+        ("GET", "/api/products/", {}),
+        ("POST", "/api/subscription/subscribe", {"params": {"plan_id": 2, "payment_method": "card"}}),
+        ("GET", "/api/subscription/current", {}),
+        ("GET", "/api/subscription/history", {}),
+        ("POST", "/api/subscription/subscribe", {"params": {"plan_id": 3, "payment_method": "card"}}),
+        ("POST", "/api/subscription/cancel", {}),
+        ("DELETE", f"/api/studio/avatars/{spare['id']}", {}),
+    ]
+
+    failures = 0
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for method, path, kwargs in endpoints:
+            with capturing() as statements:
+                # The plans matter here, not the response, so errors are only reported
+                status_code = client.request(method, path, headers=headers, **kwargs).status_code
+                checked = list(statements)
+            endpoint_failures = 0
+            for statement, parameters in checked:
+                problems = explain(cursor, statement, parameters, tables)
+                raw.rollback()
+                endpoint_failures += bool(problems)
+                if problems or verbose:
+                    print(f"  {'FAIL' if problems else 'ok':<4} {' '.join(statement.split())}")
+                    for problem in problems:
+                        print(f"       -> {problem}")
+            failures += endpoint_failures
+            verdict = "FAIL" if endpoint_failures else "ok"
+            print(f"{verdict:<4} {method} {path} [{status_code}] {len(checked)} statement(s)")
+    finally:
+        raw.close()
+
+    print(f"\n{failures} statement(s) without a suitable index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,21 @@ alembic upgrade head || {
     alembic upgrade head
 }
 
+# Workers add up their metrics through this directory; counts restart with the server
+export METRICS_MULTIPROCESS_DIR="${METRICS_MULTIPROCESS_DIR:-/tmp/weholo-metrics}"
+rm -rf "$METRICS_MULTIPROCESS_DIR"
+mkdir -p "$METRICS_MULTIPROCESS_DIR"
+
+# Worker processes; the app sizes its per-worker pools and cache TTLs by this
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-4}"
+
+# bcrypt processes per worker, so that all workers together use each core once
+if [ -z "$PASSWORD_HASH_WORKERS" ]; then
+    PASSWORD_HASH_WORKERS=$(( $(nproc) / WEB_CONCURRENCY ))
+    [ "$PASSWORD_HASH_WORKERS" -ge 1 ] || PASSWORD_HASH_WORKERS=1
+fi
+export PASSWORD_HASH_WORKERS
+
 # Start the application with improved settings
 echo "Starting the application..."
-exec uvicorn main:app --host 0.0.0.0 --port 8000 --workers 4 --log-level info
\ No newline at end of file
+exec uvicorn main:app --host 0.0.0.0 --port 8000 --workers "$WEB_CONCURRENCY" --log-level info
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Fake AKOOL and Soul Machines APIs for running the backend offline.
+
+Serves the endpoints the provider clients use (app/services/providers), with
+configurable latency and failure rate so pooling, retries and the circuit
+breakers can be exercised locally. Any Bearer token is accepted. Soul Machines
+replies stream as NDJSON when requested with `Accept: application/x-ndjson`.
+
+Usage:
+    python -m scripts.fake_providers [--port 8900] [--latency-ms 150] [--fail-rate 0.1]
+
+Then start the backend with:
+    AKOOL_BASE_URL=http://127.0.0.1:8900/akool/v1 AKOOL_API_KEY=fake
+    SOUL_MACHINES_BASE_URL=http://127.0.0.1:8900/soulmachines/v1 SOUL_MACHINES_API_KEY=fake
+
+GET /_stats returns the number of requests served per route.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import uuid
+from collections import Counter
+
+from fastapi import Body, FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(latency_ms: float = 0.0, fail_rate: float = 0.0, chunk_delay_ms: float = 20.0) -> FastAPI:
+    app = FastAPI(title="Fake avatar providers")
+    served = Counter()
+    videos = {}
+
+    @app.middleware("http")
+    async def simulate_provider(request: Request, call_next):
+        if request.url.path == "/_stats":
+            return await call_next(request)
+        route = re.sub(r"/[0-9a-f]{32}", "/{id}", request.url.path)
+        served[f"{request.method} {route}"] += 1
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse(status_code=401, content={"detail": "Missing API key"})
+        if latency_ms:
+            # +-50% so concurrent requests do not finish in lockstep
+            await asyncio.sleep(latency_ms / 1000 * random.uniform(0.5, 1.5))
+        if fail_rate and random.random() < fail_rate:
+            return JSONResponse(status_code=503, content={"detail": "Simulated outage"})
+        return await call_next(request)
+
+    @app.get("/_stats")
+    def stats():
+        return dict(served)
+
+    @app.get("/akool/v1/avatars")
+    def akool_avatars(limit: int = 10, offset: int = 0):
+        return [
+            {
+                "id": f"akool-{i}",
+                "name": f"AKOOL Avatar {i}",
+                "thumbnail_url": f"https://example.com/akool/{i}.jpg",
+            }
+            for i in range(offset, offset + limit)
+        ]
+
+    @app.post("/akool/v1/avatars")
+    async def akool_create_avatar(name: str = Form(...), photo: UploadFile = File(...)):
+        if not (photo.content_type or "").startswith("image/"):
+            raise HTTPException(status_code=400, detail="photo must be an image")
+        avatar_id = uuid.uuid4().hex
+        return {
+            "id": f"akool-{avatar_id}",
+            "name": name,
+            "status": "ready",
+            "thumbnail_url": f"https://example.com/akool/{avatar_id}.jpg",
+        }
+
+    @app.post("/akool/v1/videos")
+    def akool_create_video(payload: dict = Body(...)):
+        if not payload.get("avatar_id") or not payload.get("text"):
+            raise HTTPException(status_code=400, detail="avatar_id and text are required")
+        video_id = uuid.uuid4().hex
+        videos[video_id] = payload
+        return {"id": video_id, "status": "processing", "url": None, "estimated_completion_time": 30}
+
+    @app.get("/akool/v1/videos/{video_id}")
+    def akool_video(video_id: str):
+        if video_id not in videos:
+            raise HTTPException(status_code=404, detail="Video not found")
+        return {"id": video_id, "status": "completed", "url": f"https://example.com/videos/{video_id}.mp4"}
+
+    @app.get("/soulmachines/v1/digital-people")
+    def soul_machines_people(limit: int = 10, offset: int = 0):
+        return [
+            {"id": f"sm-{i}", "name": f"Digital Person {i}"}
+            for i in range(offset, offset + limit)
+        ]
+
+    @app.post("/soulmachines/v1/conversations")
+    def soul_machines_conversation(payload: dict = Body(...)):
+        if not payload.get("digital_person_id"):
+            raise HTTPException(status_code=400, detail="digital_person_id is required")
+        return {"id": uuid.uuid4().hex, "digital_person_id": payload["digital_person_id"]}
+
+    @app.post("/soulmachines/v1/conversations/{conversation_id}/messages")
+    def soul_machines_message(conversation_id: str, request: Request, payload: dict = Body(...)):
+        reply = f"Digital person here. You said: {payload.get('content', '')}"
+        if "application/x-ndjson" not in request.headers.get("accept", ""):
+            return {"conversation_id": conversation_id, "content": reply}
+
+        async def words():
+            for word in re.findall(r"\S+\s*", reply):
+                yield json.dumps({"content": word}) + "\n"
+                await asyncio.sleep(chunk_delay_ms / 1000)
+
+        return StreamingResponse(words(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="mean delay before each response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20.0, help="delay between streamed reply chunks")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(
+        create_app(args.latency_ms, args.fail_rate, args.chunk_delay_ms),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()